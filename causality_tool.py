@@ -1,10 +1,36 @@
-import sys, getopt, os
+import sys, getopt, os, signal
+
+current = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(current, "src"))
+
 from src import cause_checker as cc
+import ta_structs as ta         #same module objects as used by cause_checker, which imports them from src as well
+import trace_structs as ts
+import verdict_cache as vc
+import workspace as ws
+import zone_graph as zg
+import zone_batch as zb
 import pyuppaal as pyu
 
 ERROR_MESSAGE = "causality_tool.py -d -c <causekind> -s <systemfile> -t <tracefile> -e <eventfile>' (for cause checking)\n"
+ERROR_MESSAGE += "causality_tool.py -d -c <causekind> -s <systemfile> -t <tracefile> --causes <causesfile>' (for checking several sets of events)\n"
 ERROR_MESSAGE += "causality_tool.py -f -c <causekind> -s <systemfile> -t <tracefile> (for cause computation)\n"
-ERROR_MESSAGE += "with <causekind>: \"b\" but-for causality,  \"m\" minimal but-for causality, \"a\" actual causality"
+ERROR_MESSAGE += "causality_tool.py -o -c <causekind> -s <systemfile> -t <tracefile> (for computing a single cause)\n"
+ERROR_MESSAGE += "with <causekind>: \"b\" but-for causality,  \"m\" minimal but-for causality, \"a\" actual causality\n"
+ERROR_MESSAGE += "optional: -p (persistent verdict store), --cache-dir <dir>, --cache-import <file>, --cache-export <file>\n"
+ERROR_MESSAGE += "          -j <number> (worker processes for cause computation and minimality checks)\n"
+ERROR_MESSAGE += "          --speculative (evaluate all conditions of cause checking concurrently)\n"
+ERROR_MESSAGE += "          --workspace <dir> (directory for generated models), --keep-models (keep generated models)\n"
+ERROR_MESSAGE += "          --backend <backend> (verification backend: \"pyuppaal\" (default), \"verifyta\", \"portfolio\" or \"zones\")\n"
+ERROR_MESSAGE += "          --batch (check the candidate causes of cause computation in batches)\n"
+ERROR_MESSAGE += "          --enumeration <enumeration> (enumeration of causes: \"apriori\" (default) or \"marco\")\n"
+ERROR_MESSAGE += "          --max-size <number>, --max-checks <number>, --time-limit <seconds>, --max-causes <number> (budgets of cause computation)\n"
+ERROR_MESSAGE += "          --jsonl <file> (write the causes to <file> as JSON lines as soon as they are found)\n"
+ERROR_MESSAGE += "          --timeout <seconds>, --memory-limit <MiB> (limits of every verification, \"verifyta\", \"portfolio\" and \"zones\" backends)\n"
+ERROR_MESSAGE += "          --unknown <policy> (verifications without verdict: \"fail\" (default), \"retry\" or \"undecided\")\n"
+ERROR_MESSAGE += "          --approximation <stages> (comma-separated approximate verification stages before exact verification: \"over\", \"under\" (E<> and A[] queries only))\n"
+ERROR_MESSAGE += "          --prune-products (generate only the reachable locations of products with counterfactual automata)\n"
+ERROR_MESSAGE += "          --compact-contingency (encode contingency automata with a step counter instead of a copy of the automaton per step)"
 
 def set_verifyta_path_main():
     
@@ -20,19 +46,45 @@ def set_verifyta_path_main():
 
 
 
+# Terminating the run with SIGTERM exits regularly, such that the exit handlers remove the workspace of generated models
+def exit_on_sigterm():
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
 def main(argv):
 
-    set_verifyta_path_main()
-    
+    exit_on_sigterm()
+
     computation = None      #True for cause computation, false for cause checking
+    one_cause = False       #True for computing a single cause only
     cause_str = None
     systemfile = None
     tracefile = None
     eventfile = None
+    causesfile = None
+    persistent = False
+    cache_dir = None
+    cache_import = None
+    cache_export = None
+    jobs = 1
+    speculative = False
+    workspace_dir = None
+    keep_models = False
+    backend = "pyuppaal"
+    batch = False
+    enumeration = "apriori"
+    budget = cc.Budget()
+    timeout = None
+    memory_limit = None
+    unknown_policy = "fail"
+    approximation_stages = []
+    prune_products = False
+    compact_contingency = False
+    jsonl_file = None
     
     #Parsing command line parameter
     try:
-        opts, args = getopt.getopt(argv,"hdfc:s:t:e:",["causenotion=", "sfile=", "tfile=", "efile="])
+        opts, args = getopt.getopt(argv,"hdfopc:s:t:e:j:",["causenotion=", "one", "sfile=", "tfile=", "efile=", "causes=", "persistent", "cache-dir=", "cache-import=", "cache-export=", "jobs=", "speculative", "workspace=", "keep-models", "backend=", "batch", "enumeration=", "max-size=", "max-checks=", "time-limit=", "max-causes=", "jsonl=", "timeout=", "memory-limit=", "unknown=", "approximation=", "prune-products", "compact-contingency"])
     except getopt.GetoptError:
         print (ERROR_MESSAGE)
         sys.exit(2)
@@ -44,6 +96,9 @@ def main(argv):
             computation = True
         elif opt == '-d':
             computation = False 
+        elif opt in ("-o", "--one"):
+            computation = True
+            one_cause = True
         elif opt in ("-c", "--causenotion"):
             cause_str = arg
         elif opt in ("-s", "--sfile"):
@@ -52,9 +107,76 @@ def main(argv):
             tracefile = arg    
         elif opt in ("-e", "--efile"):
             eventfile = arg  
+        elif opt == "--causes":
+            causesfile = arg
+        elif opt in ("-p", "--persistent"):
+            persistent = True
+        elif opt == "--cache-dir":
+            cache_dir = arg
+            persistent = True
+        elif opt == "--cache-import":
+            cache_import = arg
+            persistent = True
+        elif opt == "--cache-export":
+            cache_export = arg
+            persistent = True
+        elif opt in ("-j", "--jobs"):
+            if not arg.isnumeric() or int(arg) < 1:
+                print("Invalid program arguments: Number of jobs must be a positive integer")
+                print (ERROR_MESSAGE)
+                sys.exit(2)
+            jobs = int(arg)
+        elif opt == "--speculative":
+            speculative = True
+        elif opt == "--workspace":
+            workspace_dir = arg
+        elif opt == "--keep-models":
+            keep_models = True
+        elif opt == "--backend":
+            backend = arg
+        elif opt == "--batch":
+            batch = True
+        elif opt == "--enumeration":
+            enumeration = arg
+        elif opt in ("--max-size", "--max-checks", "--max-causes"):
+            if not arg.isnumeric():
+                print("Invalid program arguments: Budget " + opt + " must be a non-negative integer")
+                print (ERROR_MESSAGE)
+                sys.exit(2)
+            setattr(budget, opt[2:].replace("-", "_"), int(arg))
+        elif opt == "--time-limit":
+            try:
+                budget.time_limit = float(arg)
+            except ValueError:
+                print("Invalid program arguments: Time limit must be a number of seconds")
+                print (ERROR_MESSAGE)
+                sys.exit(2)
+        elif opt == "--jsonl":
+            jsonl_file = arg
+        elif opt == "--timeout":
+            try:
+                timeout = float(arg)
+            except ValueError:
+                print("Invalid program arguments: Timeout must be a number of seconds")
+                print (ERROR_MESSAGE)
+                sys.exit(2)
+        elif opt == "--memory-limit":
+            if not arg.isnumeric() or int(arg) < 1:
+                print("Invalid program arguments: Memory limit must be a positive number of MiB")
+                print (ERROR_MESSAGE)
+                sys.exit(2)
+            memory_limit = int(arg) * 1024 * 1024
+        elif opt == "--unknown":
+            unknown_policy = arg
+        elif opt == "--compact-contingency":
+            compact_contingency = True
+        elif opt == "--prune-products":
+            prune_products = True
+        elif opt == "--approximation":
+            approximation_stages = [stage.strip() for stage in arg.split(",") if stage.strip() != ""]
      
     if computation is None: 
-        print("Invalid program arguments: Mode is not specified, give argument \"-d\" for checking a cause or argument \"-f\" for computing causes" )
+        print("Invalid program arguments: Mode is not specified, give argument \"-d\" for checking a cause, argument \"-f\" for computing causes or argument \"-o\" for computing a single cause" )
         print (ERROR_MESSAGE)
         sys.exit(2)
     if cause_str is None:
@@ -85,37 +207,148 @@ def main(argv):
         print (ERROR_MESSAGE)        
         sys.exit(2)
 
+    if backend == "verifyta":
+        ta.set_backend(ta.VerifytaBackend(timeout=timeout, memory_limit=memory_limit))
+    elif backend == "portfolio":
+        # The workers share the processors, such that every worker races fewer configurations
+        ta.set_backend(ta.PortfolioBackend(timeout=timeout, memory_limit=memory_limit, width=len(ta.PORTFOLIO_CONFIGS) // jobs))
+    elif backend == "zones" and batch:
+        if not zb.available():
+            print("Numpy is not installed, candidate causes are checked one by one")
+        ta.set_backend(zb.BatchZoneGraphBackend(timeout))
+    elif backend == "zones":
+        ta.set_backend(zg.ZoneGraphBackend(timeout))
+    elif backend != "pyuppaal":
+        print("Invalid program arguments: Unknown verification backend " + backend)
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+
+    #Limits need control over the verification: pyuppaal runs verifyta itself, the zone graph engine runs in this process
+    if timeout is not None and backend == "pyuppaal":
+        print("Invalid program arguments: A timeout needs the \"verifyta\", \"portfolio\" or \"zones\" backend")
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+    if memory_limit is not None and backend not in ("verifyta", "portfolio"):
+        print("Invalid program arguments: A memory limit needs the \"verifyta\" or \"portfolio\" backend")
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+    if unknown_policy not in ta.UNKNOWN_POLICIES:
+        print("Invalid program arguments: Unknown policy for verifications without verdict " + unknown_policy)
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+    ta.set_unknown_policy(unknown_policy)
+
+    #Approximate verification modes are provided by verifyta, the zone graph engine only verifies exactly
+    if any(stage not in ta.APPROXIMATIONS for stage in approximation_stages):
+        print("Invalid program arguments: Unknown approximation stage in " + ",".join(approximation_stages))
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+    if len(approximation_stages) > 0 and backend not in ta.UPPAAL_BACKENDS:
+        print("Invalid program arguments: Approximation stages need the \"pyuppaal\", \"verifyta\" or \"portfolio\" backend")
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+    ta.set_approximation_stages(approximation_stages)
+    ta.set_product_pruning(prune_products)
+    ta.set_compact_contingency(compact_contingency)
+
+    if enumeration not in cc.ENUMERATIONS:
+        print("Invalid program arguments: Unknown enumeration of causes " + enumeration)
+        print (ERROR_MESSAGE)
+        sys.exit(2)
+
+    #The zone graph backend decides all queries itself and does not need Uppaal
+    if backend != "zones":
+        set_verifyta_path_main()
+
+    #Generated models are written to a scratch directory, which is removed after the run unless they should be kept
+    if workspace_dir is not None or keep_models:
+        ws.set_workspace(ws.Workspace(workspace_dir, keep_models))
+
+    #Verdicts of earlier runs are reused from the persistent verdict store
+    if persistent:
+        if cache_dir is None:
+            cache_dir = vc.default_cache_dir()
+        store = vc.VerdictStore.in_directory(cache_dir)
+        if cache_import is not None:
+            imported = store.import_from(cache_import)
+            print("Imported", imported, "verdicts into the verdict store", store.path)
+        ta.set_verdict_cache(vc.VerdictCache(store=store))
+
 
     #Call respective functionalities
-    if computation:
-        CC = cc.get_cause_computer(system_path, trace_path)
-
-        if cause == 0:
-            print("Computation of but-for causes not available, we compute minimal but-for causes instead")
-            res = CC.compute_But_For_Cause(True)
-        elif cause == 1: 
-            res = CC.compute_But_For_Cause(True)
-        elif cause == 2:
-            res = CC.compute_Actual_Cause(True)
+    #A verification ending without verdict stops the run unless another policy is chosen with "--unknown"
+    status = 0
+    try:
+        if computation and one_cause:
+            CC = cc.get_cause_computer(system_path, trace_path, jobs, batch)
+
+            if cause == 0:
+                print("Computation of but-for causes not available, we compute a minimal but-for cause instead")
+            res = CC.compute_One_Cause(cause == 2, True)
+
+        elif computation:
+            CC = cc.get_cause_computer(system_path, trace_path, jobs, batch, enumeration)
+
+            #Found causes are streamed to the JSONL file, such that they survive an interruption of the computation
+            jsonl = None
+            if jsonl_file is not None:
+                jsonl = open(os.path.join(os.path.dirname(__file__), jsonl_file), "w")
+
+            try:
+                if cause == 0:
+                    print("Computation of but-for causes not available, we compute minimal but-for causes instead")
+                res = CC.compute_Cause(cause == 2, True, budget, jsonl)
+            finally:
+                if jsonl is not None:
+                    jsonl.close()
     
     
-    else:
-        if eventfile is None:
-            print("Invalid program arguments: set of event file missing")
-            print (ERROR_MESSAGE)        
-            sys.exit(2)
+        elif causesfile is not None:
+            causes_path = os.path.join(os.path.dirname(__file__), causesfile)
+
+            BC = cc.get_bulk_checker(system_path, trace_path)
+            res = BC.check_many(ts.parse_causes_from_file(causes_path), cause_str, True)
+
+        else:
+            if eventfile is None:
+                print("Invalid program arguments: set of event file missing")
+                print (ERROR_MESSAGE)        
+                sys.exit(2)
         
-        event_path = os.path.join(os.path.dirname(__file__), eventfile)
+            event_path = os.path.join(os.path.dirname(__file__), eventfile)
+
+            CC = cc.get_cause_checker(system_path, trace_path, event_path, jobs, speculative)
+            if cause == 0:
+                CC.check_But_For_Cause()
+            elif cause == 1: 
+                CC.check_Min_But_For_Cause()
+            elif cause == 2:
+                CC.check_Actual_Cause()
+    except ta.VerificationUnknown as unknown:
+        print("\n" + str(unknown) + ", use \"--timeout\", \"--memory-limit\" or \"--unknown\" to change the handling")
+        status = 1
+    if cc.undecided_checks > 0:
+        print(cc.undecided_checks, "CF-checks ended without verdict and were counted as violated")
+    if cc.untimed_stats["checked"] > 0:
+        print(cc.untimed_report())
+
+    cache = ta.get_verdict_cache()
+    if cache is not None:
+        print(cache.report())
+        if cache.store is not None:
+            if cache_export is not None:
+                cache.store.export_to(cache_export)
+                print("Exported the verdict store to", cache_export)
+            cache.store.close()
 
-        CC = cc.get_cause_checker(system_path, trace_path, event_path)
-        if cause == 0:
-            CC.check_But_For_Cause()
-        elif cause == 1: 
-            CC.check_Min_But_For_Cause()
-        elif cause == 2:
-            CC.check_Actual_Cause()
+    if len(approximation_stages) > 0:
+        print(ta.approximation_report())
+    if isinstance(ta.get_backend(), (ta.VerifytaBackend, zg.ZoneGraphBackend)):
+        print(ta.get_backend().report())
+    if keep_models:
+        print("Generated models were kept in", ws.get_workspace().directory)
 
-    sys.exit()
+    sys.exit(status)
 
         
 if __name__ == "__main__":
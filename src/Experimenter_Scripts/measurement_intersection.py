@@ -0,0 +1,47 @@
+import sys
+import os
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(parent)
+
+import experimenter as exp
+import trace_structs as ts
+import time
+
+# Measures the intersection of the contingency automaton with the counterfactual automaton of the empty cause, as built
+# for every CF-check of actual causality, for growing trace lengths. The transition pairs found by the index on the
+# synchronisation labels are compared with the pairs of the nested loop over all transitions.
+
+trace_lengths = [5, 10, 20, 40, 80]
+repetitions = 3
+
+res = "Trace length | Transitions (contingency x counterfactual) | Pairs | Nested loop (s) | Indexed (s) | Intersection (s)\n"
+
+for n in trace_lengths:
+    system = exp.get_experiment_checking_system(n)
+    trace = exp.get_experiment_comp_trace(n)
+    con_template = system.contingency_automaton([trace]).templates[0]
+    cf_template = trace.cf_automaton(ts.DelayCause([], []), system.all_actions)
+
+    start = time.time()
+    for _ in range(repetitions):
+        nested = [(i, j) for (i, trans1) in enumerate(con_template.transitions) for (j, trans2) in enumerate(cf_template.transitions) if trans1.sync == trans2.sync]
+    time_nested = (time.time() - start) / repetitions
+
+    start = time.time()
+    for _ in range(repetitions):
+        indexed = con_template.intersection_pairs(cf_template)
+    time_indexed = (time.time() - start) / repetitions
+
+    assert indexed == nested, "Indexed intersection differs from the nested loop for trace length " + str(n)
+
+    start = time.time()
+    for _ in range(repetitions):
+        con_template.intersect(cf_template)
+    time_intersect = (time.time() - start) / repetitions
+
+    res += f"{n} | {len(con_template.transitions)} x {len(cf_template.transitions)} | {len(indexed)} | {time_nested:.4f} | {time_indexed:.4f} | {time_intersect:.4f}\n"
+    print(res.splitlines()[-1])
+
+print("\nMeasurements Results: \n\n" + res)
@@ -8,6 +8,20 @@ sys.path.append(current)
 import pyuppaal as pyu
 import trace_structs as ts
 import ta_structs as ta
+import workspace as ws
+import cause_lattice as cl
+import concurrency as conc
+import zone_graph as zg
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import copy
+import weakref
+import io
+import json
+import re
+import time
+from typing import Any, Callable, Iterator, TextIO
 
 # File containing the major part of the cause checking and cause computation algorithms.
 
@@ -25,23 +39,260 @@ def to_cf_query(query: str):
         case _:
             raise Exception("Query contains syntax errors or is not suitable for cause checking!")
 
-def get_cause_computer(system_path: str, trace_path: str) -> CauseComputer:
+def get_cause_computer(system_path: str, trace_path: str, workers: int = 1, batch: bool = False, enumeration: str = "apriori") -> CauseComputer:
     timed_automaton = ta.System(pyu.UModel(system_path))
     trace = ts.parse_trace_from_file(trace_path)
-    return CauseComputer(timed_automaton, trace)
+    return CauseComputer(timed_automaton, trace, workers, batch, enumeration)
 
-def get_cause_checker(system_path: str, trace_path: str, event_path: str) -> CauseChecker:
+def get_cause_checker(system_path: str, trace_path: str, event_path: str, workers: int = 1, speculative: bool = False) -> CauseChecker:
     timed_automaton = ta.System(pyu.UModel(system_path))
     trace = ts.parse_trace_from_file(trace_path)
     events = ts.parse_cause_from_file(event_path)
-    return CauseChecker(timed_automaton, trace, events, True)
+    return CauseChecker(timed_automaton, trace, events, True, workers, speculative)
+
+# Bulk checkers of the run, one per system and trace file (invalidated if the files change), such that the verdicts of the
+# CF-condition inferred for earlier calls of check_many are reused by later ones
+bulk_checkers: dict[tuple, BulkChecker] = {}
+
+def get_bulk_checker(system_path: str, trace_path: str) -> BulkChecker:
+    key = tuple((os.path.realpath(path), os.path.getmtime(path)) for path in (system_path, trace_path))
+    if key not in bulk_checkers:
+        bulk_checkers[key] = BulkChecker(ta.System(pyu.UModel(system_path)), ts.parse_trace_from_file(trace_path))
+    return bulk_checkers[key]
+
+def check_many(system_path: str, trace_path: str, causes: list[ts.DelayCause] | list[ts.TimestampCause], notion: str, print_progress: bool = False) -> list[bool]:
+    return get_bulk_checker(system_path, trace_path).check_many(causes, notion, print_progress)
+
+
+# Worker processes for checking candidate causes in parallel. Workers take over the verdict cache, the workspace and the
+# verification backend of the starting process, the workspace gives every generated model a unique path. The counters of
+# the checks in a worker (see check_counters) and the verdicts they added to the verdict cache are returned together with
+# their results and added to the counters and the verdict cache of the starting process.
+
+worker_system: ta.System = None
+worker_trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace = None
+
+def worker_settings() -> tuple:
+    return (ta.get_verdict_cache(), ws.get_workspace(), ta.get_backend(), ta.get_unknown_policy(), ta.get_approximation_stages(), ta.get_product_pruning(), ta.get_compact_contingency())
+
+def apply_worker_settings(settings: tuple) -> None:
+    verdict_cache, workspace, backend, unknown_policy, approximation_stages, product_pruning, compact_contingency = settings
+    ta.set_verdict_cache(verdict_cache)
+    ws.set_workspace(workspace)
+    ta.set_backend(backend)
+    ta.set_unknown_policy(unknown_policy)
+    ta.set_approximation_stages(approximation_stages)
+    ta.set_product_pruning(product_pruning)
+    ta.set_compact_contingency(compact_contingency)
+
+def init_worker(system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, settings: tuple) -> None:
+    global worker_system, worker_trace
+    apply_worker_settings(settings)
+    worker_system = system
+    worker_trace = trace
+
+def worker_check_CF(cause: ts.DelayCause | ts.TimestampCause, actual: bool) -> tuple[bool, dict[str, Any]]:
+    return counted(lambda: CauseChecker(worker_system, worker_trace, cause).check_CF(actual))
+
+def worker_check_CF_family(causes: list[ts.DelayCause] | list[ts.TimestampCause], actual: bool) -> tuple[list[bool], dict[str, Any]]:
+    return counted(lambda: check_CF_family(worker_system, worker_trace, causes, actual))
+
+# Check in a separate process started by concurrency.race, which may be killed at any time
+def isolated_check_CF(system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, cause: ts.DelayCause | ts.TimestampCause, actual: bool, settings: tuple) -> tuple[bool, dict[str, Any]]:
+    init_worker(system, trace, settings)
+    return worker_check_CF(cause, actual)
+
+# Evaluates one condition of a cause checker in a separate process started by concurrency.race. Returns whether the
+# condition holds (negated for subsets of the MIN-condition) together with the progress output it printed and the counters
+# of its checks.
+def isolated_condition(checker: CauseChecker, condition: str, negate: bool, settings: tuple) -> tuple[bool, str, dict[str, Any]]:
+    apply_worker_settings(settings)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        res, counters = counted(getattr(checker, condition))
+    return res != negate, output.getvalue(), counters
+
+
+# Number of CF-checks of this process that ended without verdict and were counted as violated (unknown policy "undecided")
+undecided_checks = 0
+
+# Counters of the checks in this process, reported at the end of a run
+def check_counters() -> dict[str, int]:
+    counters = {"undecided": undecided_checks}
+    for (name, count) in untimed_stats.items():
+        counters["untimed " + name] = count
+    for (name, count) in ta.approximation_stats.items():
+        counters["approximation " + name] = count
+    return counters
+
+# Result of func together with the increase of the counters while computing it and the verdicts it added to the verdict
+# cache (as "verdicts")
+def counted(func: Callable[[], Any]) -> tuple[Any, dict[str, Any]]:
+    cache = ta.get_verdict_cache()
+    if cache is not None:
+        cache.keep_journal()
+    before = check_counters()
+    res = func()
+    after = check_counters()
+    counters: dict[str, Any] = {name: after[name] - before[name] for name in after}
+    counters["verdicts"] = [] if cache is None else cache.take_journal()
+    return res, counters
+
+# Adds the counters and verdicts returned by a worker process to the counters and the verdict cache of this process
+def add_counters(counters: dict[str, Any]) -> None:
+    global undecided_checks
+    cache = ta.get_verdict_cache()
+    if cache is not None:
+        for (key, verdict) in counters["verdicts"]:
+            cache.remember(key, verdict)
+    undecided_checks += counters["undecided"]
+    for name in untimed_stats:
+        untimed_stats[name] += counters["untimed " + name]
+    for name in ta.approximation_stats:
+        ta.approximation_stats[name] += counters["approximation " + name]
+
+
+# Contingency systems shared by all cause checkers of a system and a trace: built once per encoding (see
+# ta_structs.set_compact_contingency) and frozen, such that all checks, threads and worker processes can reuse them
+
+contingency_systems: weakref.WeakKeyDictionary[ta.System, dict[tuple, tuple]] = weakref.WeakKeyDictionary()
+
+def contingency_system(system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace) -> ta.System:
+    systems = contingency_systems.setdefault(system, {})
+    key = (id(trace), ta.get_compact_contingency())
+    if key not in systems or systems[key][0] is not trace:
+        systems[key] = (trace, system.contingency_automaton([trace]).freeze())
+    return systems[key][1]
+
+
+# Untimed abstraction of a counterfactual system: the graph of the locations of its automaton, whose transitions are taken
+# regardless of guards, invariants and updates. Every run of the system is a path of this graph, hence a query whose formula
+# holds in no reachable location (E<>) or in all of them (A[]) is decided without the model checker. A maximal run either
+# runs through a cycle of the graph or ends in a location, hence E[] is false if no cycle and no possible end of a run is
+# reachable inside the satisfying locations, and A<> is true if neither is reachable inside the others. A run may end in
+# every location except those that can neither stay forever (clock invariant or committed) nor deadlock (a transition
+# without guard, input synchronisation and target invariant). Formulas referring to anything else than locations are left
+# to the model checker.
+
+untimed_stats = {"checked": 0, "decided": 0}
+
+def untimed_verdict(system: ta.System) -> bool | None:
+    untimed_stats["checked"] += 1
+    query = system.queries[0].strip()
+    template = system.templates[0]
+    names = {loc.name: loc.id for loc in template.locations if loc.name is not None}
+    try:
+        satisfying = location_set(zg.parse_expression(query[3:]), "Proc_" + template.name + ".", names, frozenset(loc.id for loc in template.locations))
+    except zg.UnsupportedModel:
+        return None
+    if satisfying is None:
+        return None
+
+    match query[0:3]:
+        case "E<>":
+            res = False if reachable_locations(template).isdisjoint(satisfying) else None
+        case "A[]":
+            res = True if reachable_locations(template) <= satisfying else None
+        case "E[]":
+            res = None if avoidable(system, template, satisfying) else False
+        case "A<>":
+            all_ids = frozenset(loc.id for loc in template.locations)
+            res = None if avoidable(system, template, all_ids - satisfying) else True
+        case _:
+            res = None
+    if res is not None:
+        untimed_stats["decided"] += 1
+    return res
+
+# Ids of the locations satisfying a formula built from locations of the process with boolean connectives, None otherwise
+def location_set(expr: tuple, prefix: str, names: dict[str, int], all_ids: frozenset[int]) -> frozenset[int] | None:
+    kind = expr[0]
+    if kind == "const":
+        return all_ids if expr[1] else frozenset()
+    if kind == "var":
+        if expr[1].startswith(prefix) and expr[1][len(prefix):] in names:
+            return frozenset([names[expr[1][len(prefix):]]])
+        return None
+    if kind == "unary" and expr[1] == "!":
+        operand = location_set(expr[2], prefix, names, all_ids)
+        return None if operand is None else all_ids - operand
+    if kind == "binary" and expr[1] in ("&&", "||"):
+        left = location_set(expr[2], prefix, names, all_ids)
+        right = location_set(expr[3], prefix, names, all_ids)
+        if left is None or right is None:
+            return None
+        return left & right if expr[1] == "&&" else left | right
+    return None
+
+# Breadth-first search on the location ids, ignoring all labels of the transitions
+def reachable_locations(template: ta.Template) -> set[int]:
+    successors: dict[int, list[int]] = {}
+    for trans in template.transitions:
+        successors.setdefault(trans.source, []).append(trans.target)
+    reached = {template.init}
+    queue = deque([template.init])
+    while queue:
+        for target in successors.get(queue.popleft(), []):
+            if target not in reached:
+                reached.add(target)
+                queue.append(target)
+    return reached
+
+# Whether a maximal run of the untimed abstraction may stay inside the given locations: a cycle or a possible end of a run
+# is reachable from the initial location through these locations only
+def avoidable(system: ta.System, template: ta.Template, inside: frozenset[int]) -> bool:
+    if template.init not in inside:
+        return False
+    successors: dict[int, list[int]] = {}
+    for trans in template.transitions:
+        if trans.source in inside and trans.target in inside:
+            successors.setdefault(trans.source, []).append(trans.target)
+    reached = {template.init}
+    queue = deque([template.init])
+    while queue:
+        for target in successors.get(queue.popleft(), []):
+            if target not in reached:
+                reached.add(target)
+                queue.append(target)
+    if not reached.isdisjoint(run_ends(system, template)):
+        return True
+    # Kahn's algorithm: the reached locations contain a cycle iff they cannot all be removed in topological order
+    indegree = dict.fromkeys(reached, 0)
+    for source in reached:
+        for target in successors.get(source, []):
+            indegree[target] += 1
+    queue = deque(loc for loc in reached if indegree[loc] == 0)
+    removed = 0
+    while queue:
+        removed += 1
+        for target in successors.get(queue.popleft(), []):
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                queue.append(target)
+    return removed < len(reached)
+
+# Ids of the locations in which a run may end, by staying there forever or by a deadlock
+def run_ends(system: ta.System, template: ta.Template) -> set[int]:
+    clocks = system.clocks + ta.get_clocks(template.declaration)
+    bounded = {loc.id for loc in template.locations if loc.commited
+               or (loc.inv is not None and any(re.search(r"\b" + re.escape(clock) + r"\b", loc.inv) for clock in clocks))}
+    unbounded_targets = {loc.id for loc in template.locations if loc.inv is None or loc.inv.strip() == ""}
+    handshaker = any(other.name == "Dummy_Handshaker" for other in system.templates)
+    leaving = {trans.source for trans in template.transitions
+               if (trans.guard is None or trans.guard.strip() == "") and trans.target in unbounded_targets
+               and (trans.sync is None or (handshaker and trans.sync.strip().endswith("!")))}
+    return {loc.id for loc in template.locations} - (bounded & leaving)
+
+def untimed_report() -> str:
+    checked, decided = untimed_stats["checked"], untimed_stats["decided"]
+    return f"Untimed abstraction: {decided} of {checked} CF-checks decided without the model checker"
 
 
 # Class checking whether a given set of event is a but-for, minimal but-for or actual cause for a given effect in a trace of a timed automaton.
 
 class CauseChecker:
 
-    def __init__ (self, system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, cause: ts.DelayCause | ts.TimestampCause, print_progress: bool = False):
+    def __init__ (self, system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, cause: ts.DelayCause | ts.TimestampCause, print_progress: bool = False, workers: int = 1, speculative: bool = False):
 
         assert len(system.templates) == 1 or (len(system.templates) == 2 and system.templates[1].name == "Dummy_Handshaker"), "System seems to model a network (to many templates)"
 
@@ -54,6 +305,8 @@ class CauseChecker:
         self.cause = cause
         self.query = self.system.queries[0]
         self.print_progress = print_progress
+        self.workers = workers
+        self.speculative = speculative
 
 
     def print_cause_checker(self):
@@ -103,35 +356,102 @@ class CauseChecker:
             return self.check_SAT_Effect()
 
 
-    def check_CF(self, actual: bool) -> bool:
+    # System intersected with the counterfactual automaton: the system itself or, for actual causality, its contingency
+    # automaton (shared by all checkers of the system and trace)
+    def cf_base(self, actual: bool) -> ta.System:
+        if actual:
+            return contingency_system(self.system, self.trace)
+        return self.system
 
-        cf_trace_template = self.trace.cf_automaton(self.cause, self.system.all_actions)
-        cf_trace_system = ta.System(None, self.system.model_path[:len(self.system.model_path)-4] + "_CF.xml", None, None, [cf_trace_template])
 
-        cf_system = None
-        if actual:
-            cf_system = self.system.contingency_automaton([self.trace]).intersect(cf_trace_system)
-        else:
-            cf_system = self.system.intersect(cf_trace_system)
+    def cf_model_path(self) -> str:
+        return self.system.model_path[:len(self.system.model_path)-4] + "_CF.xml"
+
 
+    # Adds the dummy handshaker and the negated effect query to a product with the counterfactual automaton
+    def complete_cf_system(self, cf_system: ta.System) -> None:
         cf_system.templates.append(self.system.dummy_handshaker)
         cf_system.queries = [to_cf_query(cf_system.queries[0])]
         cf_system.set_standard_system()
 
-        if cf_system.verify():
-            if self.print_progress:
+
+    def cf_system(self, actual: bool) -> ta.System:
+
+        cf_trace_template = self.trace.cf_automaton(self.cause, self.system.all_actions)
+        cf_trace_system = ta.System(None, self.cf_model_path(), None, None, [cf_trace_template])
+
+        cf_system = self.cf_base(actual).intersect(cf_trace_system)
+        self.complete_cf_system(cf_system)
+        return cf_system
+
+
+    # Clock of the counterfactual automaton, its values at the transitions of a run are the delays (or timestamps)
+    def cf_clock(self) -> str:
+        if isinstance(self.trace, ts.TimestampTrace):
+            return "t"
+        return "d"
+
+
+    def check_CF(self, actual: bool) -> bool:
+        cf_system = self.cf_system(actual)
+        res = untimed_verdict(cf_system)
+        if res is None:
+            try:
+                res = cf_system.verify()
+            except ta.VerificationUnknown as unknown:
+                return self.undecided_CF(unknown)
+        self.print_CF(actual, res)
+        return res
+
+
+    # CF-check returning, if CF is satisfied, the counterfactual run avoiding the effect found by the model checker as
+    # witness (None if the verification backend reports no runs or the untimed abstraction decides the check)
+    def check_CF_witness(self, actual: bool) -> tuple[bool, ts.DelayTrace | ts.DelayTraceLasso | None]:
+        cf_system = self.cf_system(actual)
+        res = untimed_verdict(cf_system)
+        if res is not None:
+            self.print_CF(actual, res)
+            return res, None
+        try:
+            res, witness = cf_system.verify_witness(self.cf_clock())
+        except ta.VerificationUnknown as unknown:
+            return self.undecided_CF(unknown), None
+        self.print_CF(actual, res)
+        return res, witness
+
+
+    # CF-check ending without verdict (see ta_structs.VerificationUnknown): with the "undecided" policy, the condition is
+    # reported as undecided and counted as violated, such that no cause is concluded from it, otherwise the check fails
+    def undecided_CF(self, unknown: ta.VerificationUnknown) -> bool:
+        global undecided_checks
+        if ta.get_unknown_policy() != "undecided":
+            raise unknown
+        undecided_checks += 1
+        print("CF-condition undecided (" + unknown.reason + ") for", self.cause, "and counted as violated")
+        return False
+
+
+    # Subset of the cause satisfying CF as well: the events of the cause changed by the witness of its CF-check, the events
+    # the witness leaves unchanged can be fixed without excluding it
+    def witness_cause(self, witness: ts.DelayTrace | ts.DelayTraceLasso) -> ts.DelayCause | ts.TimestampCause:
+        unchanged = self.trace.unchanged_events(witness)
+        if isinstance(self.cause, ts.TimestampCause):
+            return ts.TimestampCause(self.cause.timestamp_events - unchanged.timestamp_events, self.cause.action_events - unchanged.action_events)
+        return ts.DelayCause(self.cause.delay_events - unchanged.delay_events, self.cause.action_events - unchanged.action_events)
+
+
+    def print_CF(self, actual: bool, res: bool) -> None:
+        if self.print_progress:
+            if res:
                 if actual:
                     print("CF-Actual-condition satisfied")
                 else:
                     print("CF-But-For-condition satisfied")
-            return True
-        else:
-            if self.print_progress:
+            else:
                 if actual:
                     print("CF-Actual-condition not satisfied")
                 else:
                     print("CF-But-For-condition not satisfied")
-            return False
 
 
     def check_CF_But_For(self) -> bool:
@@ -142,21 +462,28 @@ class CauseChecker:
         return self.check_CF(True)
 
 
-    def check_MIN(self, actual) -> bool:
+    # With the witness of the CF-check of the cause, a smaller cause witnessed to satisfy CF violates MIN without further checks
+    def check_MIN(self, actual, witness: ts.DelayTrace | ts.DelayTraceLasso | None = None) -> bool:
 
-        for sub_cause in self.cause.get_subsets():
+        if witness is not None:
+            smaller_cause = self.witness_cause(witness)
+            if smaller_cause.size() < self.cause.size():
+                self.print_MIN_violation(actual, smaller_cause)
+                return False
+
+        sub_causes = self.cause.get_subsets()
+        if self.workers > 1 and len(sub_causes) > 1:
+            return self.check_MIN_parallel(actual, sub_causes)
+
+        for sub_cause in sub_causes:
             sub_cause_checker = CauseChecker(self.system, self.trace, sub_cause)
             if actual:
                 if sub_cause_checker.check_CF_Actual():
-                    if self.print_progress:
-                        print ("MIN-condition not satisfied: the following smaller cause satisfies SAT and CF-Actual as well:")
-                        print (sub_cause)
+                    self.print_MIN_violation(actual, sub_cause)
                     return False
             else:
                 if sub_cause_checker.check_CF_But_For():
-                    if self.print_progress:
-                        print ("MIN-condition not satisfied: the following smaller cause satisfies SAT and CF-But-For as well:")
-                        print (sub_cause)
+                    self.print_MIN_violation(actual, sub_cause)
                     return False
 
         if self.print_progress:
@@ -164,6 +491,34 @@ class CauseChecker:
         return True
 
 
+    # Checks all subsets concurrently, the later checks are killed as soon as one subset satisfies CF. As in the sequential
+    # check, the first subset satisfying CF is reported.
+    def check_MIN_parallel(self, actual: bool, sub_causes: list[ts.DelayCause] | list[ts.TimestampCause]) -> bool:
+
+        args_list = [(self.system, self.trace, sub_cause, actual, worker_settings()) for sub_cause in sub_causes]
+        winner, results = conc.race(isolated_check_CF, args_list, lambda result: result[0], self.workers, True)
+        for result in results:
+            if result is not None:
+                add_counters(result[1])
+
+        if winner is not None:
+            self.print_MIN_violation(actual, sub_causes[winner])
+            return False
+
+        if self.print_progress:
+            print("MIN-condition satisfied")
+        return True
+
+
+    def print_MIN_violation(self, actual: bool, sub_cause: ts.DelayCause | ts.TimestampCause) -> None:
+        if self.print_progress:
+            if actual:
+                print ("MIN-condition not satisfied: the following smaller cause satisfies SAT and CF-Actual as well:")
+            else:
+                print ("MIN-condition not satisfied: the following smaller cause satisfies SAT and CF-But-For as well:")
+            print (sub_cause)
+
+
     def check_MIN_But_For(self) -> bool:
         return self.check_MIN(False)
 
@@ -172,13 +527,66 @@ class CauseChecker:
         return self.check_MIN(True)
 
 
+    # Evaluates SAT, CF and (if minimal) MIN with short-circuit evaluation or, in speculative mode, concurrently
+    def check_conditions(self, actual: bool, minimal: bool) -> bool:
+
+        if self.speculative:
+            return self.check_conditions_speculative(actual, minimal)
+
+        if not self.check_SAT():
+            return False
+        if not minimal:
+            return self.check_CF(actual)
+        res, witness = self.check_CF_witness(actual)
+        return res and self.check_MIN(actual, witness)
+
+
+    # Launches the SAT-effect, CF and all subset checks of the MIN-condition at once and kills the remaining checks as soon
+    # as the first failing condition in the order of the sequential evaluation is known. The buffered progress output of the
+    # conditions up to this one is printed in that order, nothing of the cancelled checks.
+    def check_conditions_speculative(self, actual: bool, minimal: bool) -> bool:
+
+        if not self.trace.is_satisfied(self.cause):
+            if self.print_progress:
+                print("SAT-condition not satisfied, trace does not satisfy the cause")
+            return False
+
+        cf_condition = "check_CF_Actual" if actual else "check_CF_But_For"
+        settings = worker_settings()
+        args_list = [(self, "check_SAT_Effect", False, settings), (self, cf_condition, False, settings)]
+        sub_causes = []
+        if minimal:
+            sub_causes = self.cause.get_subsets()
+        for sub_cause in sub_causes:
+            args_list.append((CauseChecker(self.system, self.trace, sub_cause), cf_condition, True, settings))
+
+        winner, results = conc.race(isolated_condition, args_list, lambda result: not result[0], max(self.workers, 3), True)
+        for result in results:
+            if result is not None:
+                add_counters(result[2])
+
+        # All checks before the winner have finished, a failing SAT-effect or CF check ends the output
+        for result in results[:2]:
+            print(result[1], end="")
+            if not result[0]:
+                return False
+
+        if winner is not None:
+            self.print_MIN_violation(actual, sub_causes[winner - 2])
+            return False
+
+        if minimal and self.print_progress:
+            print("MIN-condition satisfied")
+        return True
+
+
     def check_But_For_Cause(self) -> bool:
 
         print ("Checking but-for cause:")
         self.print_cause_checker()
         print ("\nStart cause checking...\n")
 
-        res = self.check_SAT() and self.check_CF_But_For()
+        res = self.check_conditions(False, False)
 
         print("\nCause checking was done for:")
         self.print_cause_checker()
@@ -196,7 +604,7 @@ class CauseChecker:
         self.print_cause_checker()
         print ("\nStart cause checking...\n")
 
-        res = self.check_SAT() and self.check_CF_But_For() and self.check_MIN_But_For()
+        res = self.check_conditions(False, True)
 
         print("\nCause checking was done for:")
         self.print_cause_checker()
@@ -213,7 +621,7 @@ class CauseChecker:
         self.print_cause_checker()
         print ("\nStart cause checking...\n")
 
-        res = self.check_SAT() and self.check_CF_Actual() and self.check_MIN_Actual()
+        res = self.check_conditions(True, True)
 
         print("\nCause checking was done for:")
         self.print_cause_checker()
@@ -227,15 +635,141 @@ class CauseChecker:
 
 
 
-# Class computing minimal but-for or actual causes for a given effect in a trace of a timed automaton.
+# Results of the tasks of worker processes, whose counters are added to the counters of this process
+def worker_results(futures: list) -> list:
+    results = []
+    for future in futures:
+        res, counters = future.result()
+        add_counters(counters)
+        results.append(res)
+    return results
+
+
+# Decides the CF-condition for several candidate causes at once: the counterfactual automata of all candidates form one
+# family of systems (see ta_structs.SystemFamily), which backends supporting families verify in a single run. Members
+# decided by the untimed abstraction are left out of the family.
+
+def check_CF_family(system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, causes: list[ts.DelayCause] | list[ts.TimestampCause], actual: bool) -> list[bool]:
+    checker = CauseChecker(system, trace, causes[0])
+    variants = [trace.cf_automaton(cause, checker.system.all_actions) for cause in causes]
+    family = ta.SystemFamily(checker.cf_base(actual), variants, checker.cf_model_path())
+    checker.complete_cf_system(family.system)
+    verdicts = [untimed_verdict(family.member(k)) for k in range(len(family))]
+    undecided = [k for k in range(len(family)) if verdicts[k] is None]
+    if len(undecided) == 0:
+        return verdicts
+    if len(undecided) < len(family):
+        family = ta.SystemFamily(checker.cf_base(actual), [variants[k] for k in undecided], checker.cf_model_path())
+        checker.complete_cf_system(family.system)
+    try:
+        for (k, verdict) in zip(undecided, ta.verify_family(family)):
+            verdicts[k] = verdict
+        return verdicts
+    except ta.VerificationUnknown:
+        # Only the members without verdict stay undecided
+        if ta.get_unknown_policy() != "undecided":
+            raise
+        return [verdicts[k] if verdicts[k] is not None else CauseChecker(system, trace, causes[k]).check_CF(actual) for k in range(len(causes))]
+
+
+# Oracle deciding the CF-condition for sets of events of the trace, which infers the verdicts implied by monotonicity. The
+# smaller sets of events witnessed to satisfy CF by the counterfactual runs of the checks are passed to the oracle as well.
+
+def cf_oracle(system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, events: cl.EventIndex, actual: bool, print_progress: bool) -> cl.MonotoneOracle:
+
+    def check(mask: int) -> bool:
+        cause = events.cause(mask)
+        if print_progress:
+            print("Checking: ", cause)
+        checker = CauseChecker(system, trace, cause)
+        res, witness = checker.check_CF_witness(actual)
+        if witness is not None:
+            smaller = events.mask(checker.witness_cause(witness))
+            if smaller != mask:
+                if print_progress:
+                    print("Witnessed: ", events.cause(smaller))
+                oracle.add(smaller, True)
+        return res
+
+    oracle = cl.MonotoneOracle(check)
+    return oracle
+
+
+
+# Budgets of an anytime cause computation (None for unlimited): the maximal size of the causes, the maximal number of sets
+# of events checked for CF, a wall-clock time limit in seconds and the number of causes after which to stop.
+
+class Budget:
+
+    def __init__(self, max_size: int | None = None, max_checks: int | None = None, time_limit: float | None = None, max_causes: int | None = None):
+        self.max_size = max_size
+        self.max_checks = max_checks
+        self.time_limit = time_limit
+        self.max_causes = max_causes
+
+    def __repr__(self) -> str:
+        return f"Budget(max_size: {self.max_size}, max_checks: {self.max_checks}, time_limit: {self.time_limit}, max_causes: {self.max_causes})"
+
+    # Part of the candidates that may still be checked, raises BudgetExhausted if none
+    def allowed(self, progress: Progress, candidates: list[int]) -> list[int]:
+        if self.time_limit is not None and progress.elapsed() >= self.time_limit:
+            raise BudgetExhausted("time limit")
+        if self.max_checks is not None:
+            if progress.checked >= self.max_checks:
+                raise BudgetExhausted("maximal number of checks")
+            return candidates[:self.max_checks - progress.checked]
+        return candidates
+
+
+class BudgetExhausted(Exception):
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+# Counters of a running cause computation. Stopped gives the exhausted budget if the computation ended early, the found
+# causes are then minimal but possibly not all of them.
+
+class Progress:
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.effect = True
+        self.causes = 0
+        self.checked = 0
+        self.inferred = 0
+        self.stopped: str | None = None
+
+    def __repr__(self) -> str:
+        return f"Progress(causes: {self.causes}, checked: {self.checked}, inferred: {self.inferred}, elapsed: {self.elapsed():.2f}s, stopped: {self.stopped})"
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    # Line of the JSONL output for a found cause
+    def record(self, cause: ts.DelayCause | ts.TimestampCause) -> dict:
+        return {"cause": str(cause), "causes": self.causes, "checked": self.checked, "inferred": self.inferred, "elapsed": round(self.elapsed(), 3)}
+
+
+# Class computing minimal but-for or actual causes for a given effect in a trace of a timed automaton. All causes are
+# enumerated level by level ("apriori") or, exploiting that CF is monotone in the set of events, with MARCO ("marco").
+
+ENUMERATIONS = ["apriori", "marco"]
 
 class CauseComputer:
 
-    def __init__ (self, system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace):
+    def __init__ (self, system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, workers: int = 1, batch: bool = False, enumeration: str = "apriori"):
         assert len(system.queries) == 1, "System that should be cause checked has more than one query."
+        assert workers >= 1, "At least one worker is needed for computing causes."
+        assert enumeration in ENUMERATIONS, "Unknown enumeration of causes: " + enumeration
 
         self.system = system
         self.trace = trace
+        self.workers = workers
+        self.batch = batch
+        self.enumeration = enumeration
+        self.progress = Progress()
 
 
     def print_cause_computer(self):
@@ -244,7 +778,37 @@ class CauseComputer:
         print ("- Effect formula:", self.system.queries[0])
 
 
-    def compute_Cause(self, actual: bool, print_progress: bool = True) -> list[ts.DelayCause] | list[ts.TimestampCause]:
+    # Verdicts of the CF-condition for the candidates of one level, checked one by one, by the worker processes of the pool or,
+    # in batch mode, as one family of counterfactual systems (one family per worker if a pool is given)
+    def check_candidates(self, candidates: list[ts.DelayCause] | list[ts.TimestampCause], actual: bool, print_progress: bool, pool: ProcessPoolExecutor | None) -> list[bool]:
+
+        if print_progress:
+            for cause in candidates:
+                print("Checking: ", cause)
+
+        if self.batch:
+            if pool is None or len(candidates) == 1:
+                return check_CF_family(self.system, self.trace, candidates, actual)
+            chunk_size = -(-len(candidates) // self.workers)
+            futures = [pool.submit(worker_check_CF_family, candidates[i:i+chunk_size], actual) for i in range(0, len(candidates), chunk_size)]
+            return [verdict for verdicts in worker_results(futures) for verdict in verdicts]
+
+        if pool is None:
+            return [CauseChecker(self.system, self.trace, cause).check_CF(actual) for cause in candidates]
+        futures = [pool.submit(worker_check_CF, cause, actual) for cause in candidates]
+        return worker_results(futures)
+
+
+    def check_SAT_Effect(self) -> bool:
+        if isinstance(self.trace, ts.TimestampTrace):
+            cause_checker_sat = CauseChecker(self.system, self.trace, ts.TimestampCause([],[]))
+        else:
+            cause_checker_sat = CauseChecker(self.system, self.trace, ts.DelayCause([],[]))
+        return cause_checker_sat.check_SAT_Effect()
+
+
+    # Causes are printed as soon as they are found and, if a file is given, written to it as JSON lines
+    def compute_Cause(self, actual: bool, print_progress: bool = True, budget: Budget | None = None, jsonl: TextIO | None = None) -> list[ts.DelayCause] | list[ts.TimestampCause]:
 
         if actual:
             print ("Computaion of actual causes:")
@@ -253,52 +817,196 @@ class CauseComputer:
         self.print_cause_computer()
         print ("\nStart cause computation...\n")
 
-        if isinstance(self.trace, ts.TimestampTrace):
-            cause_checker_sat = CauseChecker(self.system, self.trace, ts.TimestampCause([],[]))
-        else:
-            cause_checker_sat = CauseChecker(self.system, self.trace, ts.DelayCause([],[]))
-
-        if not cause_checker_sat.check_SAT_Effect():
+        res = []
+        for (cause, progress) in self.iter_causes(actual, print_progress, budget):
+            res.append(cause)
+            print("Found cause: ", cause, flush=True)
+            if jsonl is not None:
+                jsonl.write(json.dumps(progress.record(cause)) + "\n")
+                jsonl.flush()
+
+        if not self.progress.effect:
             print("Run does not satisfy the effect, hence there is no cause at all!")
             return []
+        if self.enumeration == "marco":
+            events = cl.EventIndex(self.trace)
+            res.sort(key=lambda cause: (cl.size(events.mask(cause)), events.mask(cause)))
+
+        print("\nCauses were computed for:")
+        self.print_cause_computer()
+        if actual:
+            print("- Causality notion: Actual Causality")
+        else:
+            print("- Causality notion: Minimal But-For Causality")
+        if self.progress.stopped is not None:
+            print("\nComputation stopped early (" + self.progress.stopped + "), there might be further causes")
+        print("\nResults:", res, "\n")
 
-        all_events = self.trace.get_all_events()
+        return res
 
-        res = []
-        work = []
 
-        if isinstance(self.trace, ts.TimestampTrace):
-            work.append(ts.TimestampCause([], []))
+    # Anytime cause computation: yields every minimal cause as soon as it is confirmed, together with the counters of the
+    # computation, until all causes are found or a budget is exhausted. The counters of the last computation stay available
+    # as self.progress.
+    def iter_causes(self, actual: bool, print_progress: bool = False, budget: Budget | None = None) -> Iterator[tuple[ts.DelayCause | ts.TimestampCause, Progress]]:
+
+        if budget is None:
+            budget = Budget()
+        self.progress = Progress()
+
+        if not self.check_SAT_Effect():
+            self.progress.effect = False
+            return
+
+        events = cl.EventIndex(self.trace)
+        if self.enumeration == "marco":
+            causes = self.enumerate_marco(events, actual, print_progress, budget)
+        else:
+            causes = self.enumerate_apriori(events, actual, print_progress, budget)
+
+        try:
+            for cause in causes:
+                self.progress.causes += 1
+                yield cause, copy.copy(self.progress)
+                if budget.max_causes is not None and self.progress.causes >= budget.max_causes:
+                    self.progress.stopped = "maximal number of causes"
+                    return
+        except BudgetExhausted as exhausted:
+            self.progress.stopped = exhausted.reason
+        finally:
+            causes.close()
+
+
+    # Candidates are enumerated level by level as bitmasks over the events of the trace. Causes are yielded after each
+    # check, with workers or batches after each level.
+    def enumerate_apriori(self, events: cl.EventIndex, actual: bool, print_progress: bool, budget: Budget) -> Iterator[ts.DelayCause | ts.TimestampCause]:
+
+        enumerator = cl.AprioriEnumerator(len(events))
+
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.system, self.trace, worker_settings()))
+
+        try:
+            candidates = enumerator.next_level()
+            while len(candidates) > 0:
+                if budget.max_size is not None and enumerator.level > budget.max_size:
+                    raise BudgetExhausted("maximal size of causes")
+                verdicts = []
+                step = 1 if pool is None and not self.batch else len(candidates)
+                while len(verdicts) < len(candidates):
+                    chunk = budget.allowed(self.progress, candidates[len(verdicts):len(verdicts) + step])
+                    chunk_verdicts = self.check_candidates([events.cause(candidate) for candidate in chunk], actual, print_progress, pool)
+                    self.progress.checked += len(chunk)
+                    verdicts += chunk_verdicts
+                    for (candidate, verdict) in zip(chunk, chunk_verdicts):
+                        if verdict:
+                            yield events.cause(candidate)
+                enumerator.add_verdicts(candidates, verdicts)
+                candidates = enumerator.next_level()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+
+    # Seeds are shrunk to minimal causes or grown to maximal non-causes until all sets of events are explored, candidates are
+    # checked one at a time (without workers or batches), shrinking starts from sets of events witnessed to satisfy CF.
+    # With a maximal size, only sets of events of at most that size are explored; the computation counts as stopped by the
+    # budget if larger sets of events are left unexplored.
+    def enumerate_marco(self, events: cl.EventIndex, actual: bool, print_progress: bool, budget: Budget) -> Iterator[ts.DelayCause | ts.TimestampCause]:
+
+        oracle = cf_oracle(self.system, self.trace, events, actual, print_progress)
+        check = oracle.check
+
+        def budgeted_check(mask: int) -> bool:
+            budget.allowed(self.progress, [mask])
+            self.progress.checked += 1
+            return check(mask)
+
+        oracle.check = budgeted_check
+        causes = []
+        non_causes = []
+        for cause in cl.marco(oracle, len(events), non_causes, budget.max_size):
+            self.progress.inferred = oracle.inferred
+            causes.append(cause)
+            yield events.cause(cause)
+        self.progress.inferred = oracle.inferred
+        if print_progress:
+            print("\nMARCO found", len(non_causes), "maximal non-causes,", oracle.checked, "sets of events were checked and", oracle.inferred, "verdicts inferred")
+
+        if budget.max_size is not None:
+            unexplored = cl.ExplorationMap(len(events))
+            for cause in causes:
+                unexplored.block_up(cause)
+            for non_cause in non_causes:
+                unexplored.block_down(non_cause)
+            if unexplored.seed() is not None:
+                raise BudgetExhausted("maximal size of causes")
+
+
+    # Computes a single minimal cause instead of all of them: the set of all events, which satisfies CF if there is any cause
+    # at all, is shrunk by divide and conquer (QuickXplain) with O(k log n) checks of the CF-condition for a cause of k out of
+    # n events. The result is confirmed by the MIN-condition; should it fail (the CF-condition is not monotone for the
+    # system), shrinking continues from the smaller set of events satisfying CF.
+    def compute_One_Cause(self, actual: bool, print_progress: bool = True) -> ts.DelayCause | ts.TimestampCause | None:
+
+        if actual:
+            print ("Computation of one actual cause:")
         else:
-            work.append(ts.DelayCause([], []))
+            print ("Computation of one minimal but-for cause:")
+        self.print_cause_computer()
+        print ("\nStart cause computation...\n")
 
-        for event in all_events.delay_events | all_events.action_events:
-            cur_res = []
-            for cause in list(map(lambda c: c.add_event(event), work)):
-                if any(res_cause.is_subcause(cause) for res_cause in cur_res):
-                    continue
+        if not self.check_SAT_Effect():
+            print("Run does not satisfy the effect, hence there is no cause at all!")
+            return None
+
+        events = cl.EventIndex(self.trace)
+        verdicts: dict[int, bool] = {}
+        # Pairs of a checked set of events and its subset witnessed to satisfy CF by the same counterfactual run, which
+        # satisfies CF for all sets of events in between
+        witnessed: list[tuple[int, int]] = []
+
+        def check(mask: int) -> bool:
+            if mask not in verdicts:
+                if any(cl.is_subset(smaller, mask) and cl.is_subset(mask, larger) for (larger, smaller) in witnessed):
+                    return True
+                cause = events.cause(mask)
                 if print_progress:
                     print("Checking: ", cause)
-                cause_check = CauseChecker(self.system, self.trace, cause)
-                if actual:
-                    if cause_check.check_CF_Actual():
-                        cur_res.append(cause)
-                    else:
-                        work.append(cause)
-                else:
-                    if cause_check.check_CF_But_For():
-                        cur_res.append(cause)
-                    else:
-                        work.append(cause)
-            res += cur_res
-
-        print("\nCauses were computed for:")
+                checker = CauseChecker(self.system, self.trace, cause)
+                verdicts[mask], witness = checker.check_CF_witness(actual)
+                if witness is not None:
+                    smaller = events.mask(checker.witness_cause(witness))
+                    if smaller != mask:
+                        if print_progress:
+                            print("Witnessed: ", events.cause(smaller))
+                        witnessed.append((mask, smaller))
+            return verdicts[mask]
+
+        # Smallest subset witnessed to satisfy CF of a set of events satisfying CF
+        def shrink(mask: int) -> int:
+            return min((smaller for (larger, smaller) in witnessed if larger == mask), key=cl.size, default=mask)
+
+        res = None
+        all_events = (1 << len(events)) - 1
+        if len(events) > 0 and check(all_events):
+            mask = cl.quickxplain(check, 0, cl.members(shrink(all_events)))
+            while not CauseChecker(self.system, self.trace, events.cause(mask), print_progress, self.workers).check_MIN(actual):
+                smaller = next(mask & ~(1 << index) for index in cl.members(mask) if check(mask & ~(1 << index)))
+                mask = cl.quickxplain(check, 0, cl.members(shrink(smaller)))
+            res = events.cause(mask)
+
+        print("\nOne cause was computed for:")
         self.print_cause_computer()
         if actual:
             print("- Causality notion: Actual Causality")
         else:
             print("- Causality notion: Minimal But-For Causality")
-        print("\nResults:", res, "\n")
+        if res is None:
+            print("\nResult: Not even the set of all events satisfies CF, hence there is no cause at all!\n")
+        else:
+            print("\nResult:", res, "(" + str(len(verdicts)) + " sets of events checked for CF)\n")
 
         return res
 
@@ -309,3 +1017,86 @@ class CauseComputer:
 
     def compute_But_For_Cause(self, print_progress: bool = True) -> list[ts.DelayCause] | list[ts.TimestampCause]:
        return self.compute_Cause(False, print_progress)
+
+
+# Class checking many sets of events at once for being but-for ("b"), minimal but-for ("m") or actual ("a") causes. The
+# CF-condition is decided by one monotone oracle per notion of counterfactual (but-for or actual), kept over all calls:
+# supersets of sets satisfying CF satisfy it as well and subsets of sets violating CF violate it, such that only undecided
+# sets are model checked. The MIN-condition holds if no direct subset of the set satisfies CF.
+
+NOTIONS = {"b": "a but-for cause", "m": "a minimal but-for cause", "a": "an actual cause"}
+
+class BulkChecker:
+
+    def __init__ (self, system: ta.System, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace):
+        assert len(system.queries) == 1, "System that should be cause checked has more than one query."
+
+        self.system = system
+        self.trace = trace
+        self.events = cl.EventIndex(trace)
+        self.sat_effect: bool | None = None
+        self.oracles: dict[bool, cl.MonotoneOracle] = {}
+        self.computed = 0
+        self.inferred = 0
+
+
+    def __repr__(self) -> str:
+        return f"BulkChecker(system: {self.system.model_path}, oracles: {self.oracles})"
+
+
+    def oracle(self, actual: bool) -> cl.MonotoneOracle:
+        if actual not in self.oracles:
+            self.oracles[actual] = cf_oracle(self.system, self.trace, self.events, actual, False)
+        return self.oracles[actual]
+
+
+    def check_SAT_Effect(self) -> bool:
+        if self.sat_effect is None:
+            self.sat_effect = CauseComputer(self.system, self.trace).check_SAT_Effect()
+        return self.sat_effect
+
+
+    # Verdicts for the given sets of events in their order. The CF-condition of all sets satisfying SAT is decided first,
+    # then the MIN-condition of the sets satisfying CF, both checking the undecided set first whose verdict decides the most
+    # other undecided sets. The MIN-condition of a set is no longer pursued once one of its direct subsets satisfies CF.
+    def check_many(self, causes: list[ts.DelayCause] | list[ts.TimestampCause], notion: str, print_progress: bool = False) -> list[bool]:
+        assert notion in NOTIONS, "Unknown causality notion: " + notion
+
+        actual = notion == "a"
+        oracle = self.oracle(actual)
+        checked = oracle.checked
+        masks = [self.events.mask(cause) if self.trace.is_satisfied(cause) else None for cause in causes]
+
+        res = [False] * len(causes)
+        computed = 0
+        inferred = 0
+        if any(mask is not None for mask in masks) and self.check_SAT_Effect():
+            candidates = [mask for mask in masks if mask is not None]
+            oracle.decide(candidates)
+            used = set(candidates)
+            minimal = set()
+            if notion != "b":
+                minimal = {mask for mask in candidates if oracle.known(mask)}
+                direct_subsets = {mask: [mask & ~(1 << index) for index in cl.members(mask)] for mask in minimal}
+                minimal = {mask for mask in minimal if not any(oracle.known(subset) for subset in direct_subsets[mask])}
+                query = oracle.next_query([subset for mask in minimal for subset in direct_subsets[mask]])
+                while query is not None:
+                    oracle(query)
+                    minimal = {mask for mask in minimal if not any(oracle.known(subset) for subset in direct_subsets[mask])}
+                    query = oracle.next_query([subset for mask in minimal for subset in direct_subsets[mask]])
+                used |= {subset for subsets in direct_subsets.values() for subset in subsets if oracle.known(subset) is not None}
+            res = [mask is not None and oracle.known(mask) and (notion == "b" or mask in minimal) for mask in masks]
+            computed = oracle.checked - checked
+            inferred = len(used) - computed
+        self.computed += computed
+        self.inferred += inferred
+
+        if print_progress:
+            for (cause, verdict) in zip(causes, res):
+                print(cause, "is" if verdict else "is not", NOTIONS[notion])
+            print("\n" + str(len(causes)), "sets of events checked:", computed, "CF-verdicts computed by model checking,", inferred, "inferred")
+        return res
+
+
+    def report(self) -> str:
+        return "Bulk cause checking: " + str(self.computed) + " CF-verdicts computed by model checking, " + str(self.inferred) + " inferred"
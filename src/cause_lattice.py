@@ -0,0 +1,277 @@
+# Compact representation of sets of events for cause computation. The events of a trace are interned to indices, such that
+# sets of events are integer bitmasks: hashable, ordered, and with subset tests and unions by bit operations. Causes are
+# only converted back to DelayCause/TimestampCause objects for checking and printing.
+
+from __future__ import annotations
+
+import sys
+import os
+from typing import Callable, Iterator
+
+current = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current)
+
+import trace_structs as ts
+
+
+# Events of the trace ordered by their position, delay or timestamp events before action events of the same position
+def event_order(event: ts.DelayEvent | ts.TimestampEvent | ts.ActionEvent) -> tuple[int, bool]:
+    return (event[1], not isinstance(event[0], int))
+
+def members(mask: int) -> list[int]:
+    res = []
+    index = 0
+    while mask:
+        if mask & 1:
+            res.append(index)
+        mask >>= 1
+        index += 1
+    return res
+
+def is_subset(mask: int, other: int) -> bool:
+    return mask & ~other == 0
+
+def size(mask: int) -> int:
+    return mask.bit_count()
+
+
+class EventIndex:
+
+    def __init__(self, trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace):
+        self.timestamps = isinstance(trace, ts.TimestampTrace)
+        # get_all_events returns the events of every kind of trace as a DelayCause
+        all_events = trace.get_all_events()
+        self.events = sorted(all_events.delay_events | all_events.action_events, key=event_order)
+        self.indices = {event: index for (index, event) in enumerate(self.events)}
+
+    def __repr__(self) -> str:
+        return f"EventIndex(events: {self.events})"
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def mask(self, cause: ts.DelayCause | ts.TimestampCause) -> int:
+        if self.timestamps:
+            events = cause.timestamp_events | cause.action_events
+        else:
+            events = cause.delay_events | cause.action_events
+        res = 0
+        for event in events:
+            res |= 1 << self.indices[event]
+        return res
+
+    def cause(self, mask: int) -> ts.DelayCause | ts.TimestampCause:
+        res = ts.TimestampCause([], []) if self.timestamps else ts.DelayCause([], [])
+        for index in members(mask):
+            res = res.add_event(self.events[index])
+        return res
+
+
+# Level-wise (Apriori) enumeration of the minimal causes. The candidates of size n+1 extend the non-causes of size n by an
+# event with a larger index, and a candidate is only generated if all its subsets of size n are non-causes. Hence every
+# set of events is generated at most once and no candidate contains a cause found before, of the same or an earlier
+# level. Only the non-causes of the last level are kept.
+
+class AprioriEnumerator:
+
+    def __init__(self, number_events: int):
+        self.number_events = number_events
+        self.causes: list[int] = []
+        self.non_causes: set[int] = {0}
+        self.level = 0
+        self.checked = 0
+
+    def __repr__(self) -> str:
+        return f"AprioriEnumerator(level: {self.level}, causes: {len(self.causes)}, checked: {self.checked})"
+
+    # Candidates of the next level, empty if the enumeration is finished
+    def next_level(self) -> list[int]:
+        candidates = []
+        for base in sorted(self.non_causes):
+            base_events = members(base)
+            for event in range(base.bit_length(), self.number_events):
+                candidate = base | (1 << event)
+                if all((candidate & ~(1 << index)) in self.non_causes for index in base_events):
+                    candidates.append(candidate)
+        self.level += 1
+        return candidates
+
+    # Results of checking the candidates of the current level for the CF-condition
+    def add_verdicts(self, candidates: list[int], verdicts: list[bool]) -> None:
+        self.non_causes = set()
+        for (candidate, verdict) in zip(candidates, verdicts):
+            if verdict:
+                self.causes.append(candidate)
+            else:
+                self.non_causes.add(candidate)
+        self.checked += len(candidates)
+
+
+# QuickXplain: a minimal set of the candidate events which satisfies the (monotone) condition check together with the
+# background, provided that the background together with all candidates satisfies it. Divide and conquer needs
+# O(k log(n/k)) checks for a result of k out of n candidates. Changed tells whether the background was extended since the
+# last check, otherwise it is known to violate the condition.
+def quickxplain(check: Callable[[int], bool], background: int, candidates: list[int], changed: bool = False) -> int:
+    if changed and check(background):
+        return 0
+    if len(candidates) == 0:
+        return 0
+    if len(candidates) == 1:
+        return 1 << candidates[0]
+    first = candidates[:len(candidates) // 2]
+    second = candidates[len(candidates) // 2:]
+    first_mask = 0
+    for index in first:
+        first_mask |= 1 << index
+    second_res = quickxplain(check, background | first_mask, second, True)
+    first_res = quickxplain(check, background | second_res, first, second_res != 0)
+    return first_res | second_res
+
+
+# Monotone condition on sets of events (supersets of satisfying sets satisfy it, subsets of violating sets violate it):
+# verdicts implied by the minimal satisfying and maximal violating sets known so far are inferred, only undecided sets are
+# passed to check. Further verdicts learned by check (e.g., from a witness) can be added.
+
+class MonotoneOracle:
+
+    def __init__(self, check: Callable[[int], bool]):
+        self.check = check
+        self.satisfying: list[int] = []
+        self.violating: list[int] = []
+        self.checked = 0
+        self.inferred = 0
+
+    def __repr__(self) -> str:
+        return f"MonotoneOracle(checked: {self.checked}, inferred: {self.inferred})"
+
+    def known(self, mask: int) -> bool | None:
+        if any(is_subset(satisfying, mask) for satisfying in self.satisfying):
+            return True
+        if any(is_subset(mask, violating) for violating in self.violating):
+            return False
+        return None
+
+    def add(self, mask: int, verdict: bool) -> None:
+        if self.known(mask) == verdict:
+            return
+        if verdict:
+            self.satisfying = [satisfying for satisfying in self.satisfying if not is_subset(mask, satisfying)] + [mask]
+        else:
+            self.violating = [violating for violating in self.violating if not is_subset(violating, mask)] + [mask]
+
+    # Smallest known satisfying subset of a satisfying set
+    def satisfying_subset(self, mask: int) -> int:
+        return min((satisfying for satisfying in self.satisfying if is_subset(satisfying, mask)), key=size, default=mask)
+
+    def __call__(self, mask: int) -> bool:
+        verdict = self.known(mask)
+        if verdict is not None:
+            self.inferred += 1
+            return verdict
+        verdict = self.check(mask)
+        self.checked += 1
+        self.add(mask, verdict)
+        return verdict
+
+    # Undecided set to check next among the given sets: the one comparable with the most other undecided sets, since its
+    # verdict decides either all its supersets (if satisfied) or all its subsets (if violated)
+    def next_query(self, masks: list[int]) -> int | None:
+        pending = sorted({mask for mask in masks if self.known(mask) is None}, key=lambda mask: (size(mask), mask))
+        if len(pending) == 0:
+            return None
+        return max(pending, key=lambda mask: sum(1 for other in pending if is_subset(mask, other) or is_subset(other, mask)))
+
+    # Verdicts of all given sets, checking only the sets left undecided by the verdicts before
+    def decide(self, masks: list[int]) -> list[bool]:
+        checked = self.checked
+        query = self.next_query(masks)
+        while query is not None:
+            self(query)
+            query = self.next_query(masks)
+        self.inferred += len(set(masks)) - (self.checked - checked)
+        return [self.known(mask) for mask in masks]
+
+
+# Sets of events not yet explored by MARCO: explored are the supersets of found causes and the subsets of found maximal
+# non-causes. Unexplored sets are the models of the clauses "not all events of the cause" and "some event outside the
+# non-cause", which are found by a small DPLL solver. It includes events before excluding them, such that seeds are large.
+# With a maximal size, only seeds of at most that many events are found.
+
+class ExplorationMap:
+
+    def __init__(self, number_events: int, max_size: int | None = None):
+        self.all_events = (1 << number_events) - 1
+        self.max_size = max_size
+        self.blocked_up: list[int] = []
+        self.blocked_down: list[int] = []
+
+    def block_up(self, cause: int) -> None:
+        self.blocked_up.append(cause)
+
+    def block_down(self, non_cause: int) -> None:
+        self.blocked_down.append(self.all_events & ~non_cause)
+
+    def seed(self) -> int | None:
+        return self.solve(0, 0)
+
+    def solve(self, included: int, excluded: int) -> int | None:
+        changed = True
+        while changed:
+            changed = False
+            for cause in self.blocked_up:
+                if cause & excluded:
+                    continue
+                rest = cause & ~included
+                if rest == 0:
+                    return None
+                if rest & (rest - 1) == 0:
+                    excluded |= rest
+                    changed = True
+            for outside in self.blocked_down:
+                if outside & included:
+                    continue
+                rest = outside & ~excluded
+                if rest == 0:
+                    return None
+                if rest & (rest - 1) == 0:
+                    included |= rest
+                    changed = True
+        if self.max_size is not None and size(included) > self.max_size:
+            return None
+
+        free = self.all_events & ~(included | excluded)
+        if free == 0:
+            return included
+        if self.max_size is not None and size(included) == self.max_size:
+            return self.solve(included, excluded | free)
+        event = free & -free
+        res = self.solve(included | event, excluded)
+        if res is None:
+            res = self.solve(included, excluded | event)
+        return res
+
+
+# MARCO: enumerates all minimal causes together with all maximal non-causes. Every unexplored seed satisfying the condition
+# is shrunk to a minimal cause (QuickXplain), every other seed is grown to a maximal non-cause. By the duality of minimal
+# causes and maximal non-causes (the complements of the maximal non-causes are the minimal hitting sets of the minimal
+# causes), the enumeration ends as soon as both are complete. Causes are yielded as soon as they are found, the maximal
+# non-causes are appended to the given list. With a maximal size, only the sets of events of at most that size are
+# explored: all minimal causes of at most that size are found, and the non-causes are maximal among these sets.
+def marco(oracle: MonotoneOracle, number_events: int, non_causes: list[int], max_size: int | None = None) -> Iterator[int]:
+    exploration = ExplorationMap(number_events, max_size)
+    seed = exploration.seed()
+    while seed is not None:
+        if oracle(seed):
+            cause = quickxplain(oracle, 0, members(oracle.satisfying_subset(seed)))
+            exploration.block_up(cause)
+            yield cause
+        else:
+            non_cause = seed
+            for index in range(number_events):
+                if max_size is not None and size(non_cause) >= max_size:
+                    break
+                if not non_cause & (1 << index) and not oracle(non_cause | (1 << index)):
+                    non_cause |= 1 << index
+            non_causes.append(non_cause)
+            exploration.block_down(non_cause)
+        seed = exploration.seed()
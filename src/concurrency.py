@@ -0,0 +1,146 @@
+# Running independent checks concurrently in separate processes, such that the remaining checks (including the model
+# checker processes they spawned) can be killed as soon as one result settles the overall answer.
+
+from __future__ import annotations
+
+import atexit
+import multiprocessing as mp
+from multiprocessing.connection import wait
+import os
+import signal
+import time
+from typing import Any, Callable
+
+# Seconds a cancelled task gets to kill its model checker processes before it is killed itself
+TERMINATION_GRACE = 1.0
+
+
+# Process groups of the model checker processes started by this process, which run in their own process groups (e.g., to
+# be killed on a timeout) and are therefore killed explicitly when this process ends or its task is cancelled
+
+process_groups: set[int] = set()
+
+def register_process_group(pgid: int) -> None:
+    process_groups.add(pgid)
+
+def unregister_process_group(pgid: int) -> None:
+    process_groups.discard(pgid)
+
+def kill_process_groups() -> None:
+    if not hasattr(os, "killpg"):
+        return
+    for pgid in list(process_groups):
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    process_groups.clear()
+
+atexit.register(kill_process_groups)
+
+def terminate(signum: int, frame) -> None:
+    kill_process_groups()
+    os._exit(1)
+
+
+def run_task(conn, func: Callable, args: tuple) -> None:
+    # Own process group, such that killing the task also kills its verifyta processes, the ones in process groups of
+    # their own are killed on termination
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        conn.send((True, func(*args)))
+    except BaseException as e:
+        conn.send((False, e))
+    finally:
+        conn.close()
+
+
+def kill_task(process: mp.Process) -> None:
+    if not process.is_alive():
+        return
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+    else:
+        process.kill()
+
+
+# Kills the given running tasks, giving them the grace period to kill their model checker processes first
+def cancel_tasks(running: dict) -> None:
+    processes = [process for (_, process) in running.values()]
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + TERMINATION_GRACE
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        kill_task(process)
+        process.join()
+    for conn in running:
+        conn.close()
+
+
+# Runs func(*args) for all given argument tuples with at most `workers` processes at a time. As soon as a result satisfies
+# `stop`, all running tasks are killed and its index is returned together with the results known so far, otherwise all
+# results are returned with index None. If ordered, the winner is the first task in the given order whose result satisfies
+# `stop`: a result satisfying it cancels the later tasks only, and it wins once all earlier tasks have finished, such that
+# the winner and the results before it do not depend on the timing of the tasks.
+
+def race(func: Callable, args_list: list[tuple], stop: Callable[[Any], bool], workers: int, ordered: bool = False) -> tuple[int | None, list]:
+
+    assert workers >= 1, "At least one worker is needed for running tasks."
+
+    results: list = [None] * len(args_list)
+    finished = [False] * len(args_list)
+    running: dict = {}
+    next_task = 0
+    winner = None
+    bound = len(args_list)      # tasks after the first known result satisfying stop are no longer needed
+
+    try:
+        while winner is None and (next_task < bound or len(running) > 0):
+
+            while next_task < bound and len(running) < workers:
+                parent_conn, child_conn = mp.Pipe(duplex=False)
+                process = mp.Process(target=run_task, args=(child_conn, func, args_list[next_task]), daemon=True)
+                process.start()
+                child_conn.close()
+                running[parent_conn] = (next_task, process)
+                next_task += 1
+
+            for conn in wait(list(running.keys())):
+                if conn not in running:
+                    continue
+                index, process = running.pop(conn)
+                try:
+                    success, value = conn.recv()
+                except EOFError:
+                    raise Exception("Concurrent check terminated without result (exit code " + str(process.exitcode) + ")")
+                finally:
+                    conn.close()
+                    process.join()
+                if not success:
+                    raise value
+                results[index] = value
+                finished[index] = True
+                if stop(value) and not ordered:
+                    winner = index
+                    break
+                if stop(value) and index < bound:
+                    bound = index
+                    later = {conn: task for (conn, task) in running.items() if task[0] > bound}
+                    for conn in later:
+                        del running[conn]
+                    cancel_tasks(later)
+
+            if ordered and bound < len(args_list) and all(finished[:bound]):
+                winner = bound
+
+    finally:
+        cancel_tasks(running)
+
+    return winner, results
@@ -140,7 +140,7 @@ class Experimenter_Checking:
         self.cause_size = cause_size
 
         self.system = get_experiment_checking_system(self.ta_length)
-        self.system.to_UModel().save()
+        self.system.to_UModel(self.system.model_path).save()
 
         self.event_ids = []
         self.causes = []
@@ -274,7 +274,7 @@ class Experimenter_Computation:
             self.causes.append(to_cause_comp(trace_length, self.event_ids[i]))
             self.systems.append(get_experiment_compute_system(self.ta_length, self.trace_length, to_cause_check(self.trace_length, self.event_ids[i])))
 
-        self.systems[0].to_UModel().save()
+        self.systems[0].to_UModel(self.systems[0].model_path).save()
 
 
     def experiment_BF_Cause(self) -> float:
@@ -11,11 +11,34 @@ current = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(current)
 
 import trace_structs as ts
+import verdict_cache as vc
+import workspace as ws
+import concurrency as conc
+import zone_graph as zg
 import pyuppaal as pyu
 import xml.etree.ElementTree as ET
 from pyuppaal.iTools import UFactory as ufac
+import errno
+import functools
 import itertools
 import re
+import queue
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# prlimit of util-linux, which starts verifyta with its memory limit
+PRLIMIT = shutil.which("prlimit")
 
 # Functions used for the intersection of automata
 
@@ -72,6 +95,43 @@ def add_spaces(queries: list[str], templates: list[Template]) -> list[str]:
     return inter_queries
 
 
+# Verdict cache consulted before a generated system is written and verified, can be replaced or disabled (None)
+
+verdict_cache: vc.VerdictCache | None = vc.VerdictCache()
+
+def set_verdict_cache(cache: vc.VerdictCache | None) -> None:
+    global verdict_cache
+    verdict_cache = cache
+
+def get_verdict_cache() -> vc.VerdictCache | None:
+    return verdict_cache
+
+
+# Products of systems (System.intersect) contain only the location pairs reachable from the initial pair if enabled
+
+product_pruning = False
+
+def set_product_pruning(prune: bool) -> None:
+    global product_pruning
+    product_pruning = prune
+
+def get_product_pruning() -> bool:
+    return product_pruning
+
+
+# Contingency automata (System.contingency_automaton) are encoded compactly, with a step counter instead of one copy of the
+# template per position of the trace, if enabled
+
+compact_contingency = False
+
+def set_compact_contingency(compact: bool) -> None:
+    global compact_contingency
+    compact_contingency = compact
+
+def get_compact_contingency() -> bool:
+    return compact_contingency
+
+
 # Dummy handshaker for allowing action transitions in a single template
 
 def dummy_handshaker(alphabet: list [str]) -> Template:
@@ -131,6 +191,16 @@ class Location:
     def __repr__(self):
         return f"Location(id: {self.id}, pos: {self.position}, name: {self. name}, inv: {self.inv}, commited: {self.commited})"
 
+    # Frozen locations (see System.freeze) can no longer be changed
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self.__dict__.get("frozen", False):
+            raise AttributeError("Frozen location " + str(self.id) + " cannot be changed")
+        object.__setattr__(self, name, value)
+
+    def freeze(self) -> Location:
+        self.frozen = True
+        return self
+
     def to_ET(self):
         return ufac.location(self.id, self.position.x, self.position.y, self.inv, self.name, self.commited)
 
@@ -198,9 +268,29 @@ class Transition:
             self.assignment = assignment
             self.nail = nail 
 
+        self.compiled_labels: dict[tuple, tuple[ts.ClockGuard, ts.ClockUpdate]] = {}
+
     def __repr__(self):
         return f"Transition(source: {self.source}, target: {self.target}, pos: {self.position}, guard: {self.guard}, sync: {self.sync}, assignment: {self.assignment}, nail: {self.nail})"
 
+    # Frozen transitions (see System.freeze) can no longer be changed
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self.__dict__.get("frozen", False):
+            raise AttributeError("Frozen transition " + str(self.source) + " -> " + str(self.target) + " cannot be changed")
+        object.__setattr__(self, name, value)
+
+    def freeze(self) -> Transition:
+        self.frozen = True
+        return self
+
+    # Guard and update of the transition compiled for the order of the clocks of a configuration, kept by the transition
+    # for every replay of a run through it (see Template.fire_first)
+    def compiled(self, clocks: tuple[str, ...]) -> tuple[ts.ClockGuard, ts.ClockUpdate]:
+        key = (self.guard, self.assignment, clocks)
+        if key not in self.compiled_labels:
+            self.compiled_labels[key] = (ts.ClockGuard(self.guard, clocks), ts.ClockUpdate(self.assignment, clocks))
+        return self.compiled_labels[key]
+
     def to_ET(self):
         if self.position is not None:
             return ufac.transition(self.source, self.target, self.position.x, self.position.y, self.guard, self.sync, self.assignment, self.nail)
@@ -264,6 +354,29 @@ class Template:
     def __repr__(self):
         return f"Template: \n name: {self.name}, init: {self.init}\n locations: {self.locations} \n transitions: {self.transitions}\n declaration: {self.declaration})"
 
+    # Frozen templates (see System.freeze) can no longer be changed
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self.__dict__.get("frozen", False):
+            raise AttributeError("Frozen template " + str(self.name) + " cannot be changed")
+        object.__setattr__(self, name, value)
+
+    def freeze(self) -> Template:
+        self.locations = tuple(location.freeze() for location in self.locations)
+        self.transitions = tuple(transition.freeze() for transition in self.transitions)
+        self.frozen_index = self.index()
+        self.frozen = True
+        return self
+
+    # Locations by id and transitions by source location, computed once by frozen templates for all their products. The
+    # dictionaries may be shared and must not be changed.
+    def index(self) -> tuple[dict[int, Location], dict[int, list[Transition]]]:
+        if "frozen_index" in self.__dict__:
+            return self.frozen_index
+        outgoing: dict[int, list[Transition]] = {}
+        for trans in self.transitions:
+            outgoing.setdefault(trans.source, []).append(trans)
+        return {loc.id: loc for loc in self.locations}, outgoing
+
     def get_location_ids(self) -> list[int]:
         location_ids = []
         for loc in self.locations:
@@ -273,16 +386,19 @@ class Template:
     def to_ET(self):
         return ufac.template(self.name, [loc.to_ET() for loc in self.locations], self.init, [trans.to_ET() for trans in self.transitions], self.parameter, self.declaration)
 
+    # Indices of the transition pairs synchronised in the intersection with other, in the order of the intersected transitions.
+    # The transitions of other are indexed by their synchronisation, such that only matching pairs are enumerated.
+    def intersection_pairs(self, other: Template) -> list[tuple[int, int]]:
+        by_sync: dict[str | None, list[int]] = {}
+        for (j, trans) in enumerate(other.transitions):
+            by_sync.setdefault(trans.sync, []).append(j)
+        return [(i, j) for (i, trans) in enumerate(self.transitions) for j in by_sync.get(trans.sync, [])]
+
     # Function intersecting two templates
     def intersect(self, other: Template) -> Template:
         inter_locs = list(map (lambda l: l[0].intersect(l[1]), itertools.product(self.locations, other.locations)))
         
-        inter_trans: list[Transition] = []
-        trans_prod = itertools.product(self.transitions, other.transitions)
-        for (trans1, trans2) in trans_prod:
-            trans_cand = trans1.intersect(trans2)
-            if trans_cand is not None:
-                inter_trans.append(trans_cand)
+        inter_trans: list[Transition] = [self.transitions[i].intersect(other.transitions[j]) for (i, j) in self.intersection_pairs(other)]
 
 
         inter_name = self.name + "_INTER" 
@@ -292,16 +408,63 @@ class Template:
         inter_declaration = str_connect(self.declaration, other.declaration, "\n")
 
         return Template(None, inter_name, inter_locs, inter_init, inter_trans, None, inter_declaration)
-    
-    def execute_transition(self, configuration: ts.Configuration, action: str): 
-        
-        for transition in self.transitions:
-            if transition.source == configuration.location and transition.sync == action and configuration.satisfies(transition.guard):
+
+    # Intersection restricted to the location pairs reachable from the initial pair by synchronised transitions (regardless
+    # of guards and invariants), found by breadth-first search; locations and transitions are in the order they are found
+    def intersect_reachable(self, other: Template) -> Template:
+        (locations, outgoing) = self.index()
+        other_locations = {loc.id: loc for loc in other.locations}
+        other_outgoing: dict[tuple[int, str | None], list[Transition]] = {}
+        for trans in other.transitions:
+            other_outgoing.setdefault((trans.source, trans.sync), []).append(trans)
+
+        inter_locs = [locations[self.init].intersect(other_locations[other.init])]
+        inter_trans: list[Transition] = []
+        reached = {(self.init, other.init)}
+        frontier = deque([(self.init, other.init)])
+        while frontier:
+            (source, other_source) = frontier.popleft()
+            for trans1 in outgoing.get(source, []):
+                for trans2 in other_outgoing.get((other_source, trans1.sync), []):
+                    inter_trans.append(trans1.intersect(trans2))
+                    target = (trans1.target, trans2.target)
+                    if target not in reached:
+                        reached.add(target)
+                        inter_locs.append(locations[target[0]].intersect(other_locations[target[1]]))
+                        frontier.append(target)
+
+        inter_declaration = str_connect(self.declaration, other.declaration, "\n")
+
+        return Template(None, self.name + "_INTER", inter_locs, cantor_pair(self.init, other.init), inter_trans, None, inter_declaration)
+
+    def execute_transition(self, configuration: ts.Configuration, action: str):
+        self.fire_first(configuration, [t for t in self.transitions if t.source == configuration.location and t.sync == action])
+
+    # Takes the first of the given transitions whose guard the configuration satisfies
+    def fire_first(self, configuration: ts.Configuration, transitions: list[Transition]) -> None:
+        for transition in transitions:
+            (guard, update) = transition.compiled(configuration.clocks)
+            if guard.holds(configuration.values):
                 configuration.location = transition.target
-                configuration.update_clocks(transition.assignment)
+                update.apply(configuration.values)
                 return
 
         raise Exception("Found no executable transition for this configuration")
+
+    # Configurations of the run of the template with the given delays and actions after each of its steps, computed in one
+    # pass with the transitions indexed by source location and action
+    def replay(self, delays: list[int], actions: list[str | None], clocks: list[str]) -> list[ts.Configuration]:
+        outgoing: dict[tuple[int, str | None], list[Transition]] = {}
+        for transition in self.transitions:
+            outgoing.setdefault((transition.source, transition.sync), []).append(transition)
+
+        configurations = []
+        configuration = ts.Configuration(self.init, clocks)
+        for i in range(len(delays)):
+            configuration.delay(delays[i])
+            self.fire_first(configuration, outgoing.get((configuration.location, actions[i]), []))
+            configurations.append(configuration.copy())
+        return configurations
     
 
     def contingency_automaton_lasso(self, trace: ts.DelayTraceLasso, clocks: list[str], actions: list[str], node_dist: int = 300) -> Template:
@@ -341,18 +504,9 @@ class Template:
 
 
         # add contingency transitions
-        configuration = ts.Configuration(self.init, clocks)  
+        configurations = self.replay(trace.delays_pre + trace.delays_lasso, trace.actions_pre + trace.actions_lasso, clocks)
         for i in range(trace.length_pre + trace.length_lasso):
-            
-            if i < trace.length_pre:
-                delay = trace.delays_pre[i]
-                action = trace.actions_pre[i]
-            else: 
-                delay = trace.delays_lasso[i - trace.length_pre]
-                action = trace.actions_lasso[i - trace.length_pre]
-
-            configuration.delay(delay)
-            self.execute_transition(configuration, action)
+            configuration = configurations[i]
 
             new_target = cantor_pair(configuration.location, i + 1)
             if i + 1 == trace.length_pre + trace.length_lasso:
@@ -414,10 +568,9 @@ class Template:
                 new_trans = Transition(None, new_source, new_target, new_pos, transition.guard, transition.sync, transition.assignment, transition.nail)
                 transitions_con.append(new_trans) 
                 
-        configuration = ts.Configuration(self.init, clocks)  
+        configurations = self.replay(trace.delays, trace.actions, clocks)
         for i in range(len(trace.delays)):
-            configuration.delay(trace.delays[i])
-            self.execute_transition(configuration, trace.actions[i])
+            configuration = configurations[i]
 
             new_target = cantor_pair(configuration.location, i + 1)
 
@@ -431,6 +584,59 @@ class Template:
 
 
         return Template(None, name_con, locations_con, init_con, transitions_con, self.parameter, self.declaration)
+
+
+    # Contingency automaton with a single copy of the template: the position in the trace is kept in the bounded variable
+    # con_step and the configurations of the actual run after each position in constant arrays (location ids and clock
+    # values), such that one contingency transition per location, location of the actual run and action suffices
+    def contingency_automaton_compact(self, given_trace: ts.DelayTrace | ts.DelayTraceLasso | ts.TimestampTrace, clocks: list[str], actions: list[str]) -> Template:
+
+        if isinstance(given_trace, ts.TimestampTrace):
+            given_trace = given_trace.to_delay()
+
+        if isinstance(given_trace, ts.DelayTraceLasso):
+            delays = given_trace.delays_pre + given_trace.delays_lasso
+            trace_actions = given_trace.actions_pre + given_trace.actions_lasso
+            last_step = len(delays) - 1
+            loop_step = given_trace.length_pre
+        else:
+            delays = given_trace.delays
+            trace_actions = given_trace.actions
+            last_step = len(delays)
+            loop_step = len(delays)
+
+        # configurations reached by the contingency transitions at each position, none at the end of a finite trace
+        con_locations = []
+        con_clocks: dict[str, list[int]] = {clock: [] for clock in clocks}
+        for configuration in self.replay(delays, trace_actions, clocks):
+            con_locations.append(configuration.location)
+            # the values of the replayed configurations are in the order of clocks
+            for (clock, value) in zip(clocks, configuration.values):
+                con_clocks[clock].append(value)
+        while len(con_locations) <= last_step:
+            con_locations.append(-1)
+            for clock in clocks:
+                con_clocks[clock].append(0)
+
+        declaration_con = "int[0," + str(last_step) + "] con_step = 0;\n"
+        declaration_con += "const int con_location[" + str(last_step + 1) + "] = {" + ", ".join(map(str, con_locations)) + "};"
+        for clock in clocks:
+            declaration_con += "\nconst int con_" + clock + "[" + str(last_step + 1) + "] = {" + ", ".join(map(str, con_clocks[clock])) + "};"
+
+        next_step = "con_step := (con_step < " + str(last_step) + " ? con_step + 1 : " + str(loop_step) + ")"
+        setter = ",\n".join([clock + " := con_" + clock + "[con_step]" for clock in clocks] + [next_step])
+
+        locations_con = [Location(None, loc.id, loc.position, loc.inv, loc.name, loc.commited) for loc in self.locations]
+
+        transitions_con = [Transition(None, trans.source, trans.target, trans.position, trans.guard, trans.sync, str_connect(trans.assignment, next_step, ",\n"), trans.nail)
+                           for trans in self.transitions]
+        targets = [location for location in dict.fromkeys(con_locations) if location != -1]
+        for loc in self.locations:
+            for target in targets:
+                for action in actions + [None]:
+                    transitions_con.append(Transition(None, loc.id, target, loc.position, "con_location[con_step] == " + str(target), action, setter))
+
+        return Template(None, self.name + "_CON", locations_con, self.init, transitions_con, self.parameter, str_connect(self.declaration, declaration_con, "\n"))
     
 
     def sat_check(self) -> None:
@@ -468,6 +674,21 @@ class System:
         self.clocks = get_clocks(self.declaration)
 
 
+    # Frozen systems can be shared between checks: the lists of templates (with their locations and transitions) and queries
+    # become tuples, and neither the system nor its templates, locations and transitions can be changed
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self.__dict__.get("frozen", False):
+            raise AttributeError("Frozen system " + str(self.model_path) + " cannot be changed")
+        object.__setattr__(self, name, value)
+
+    def freeze(self) -> System:
+        self.templates = tuple(template.freeze() for template in self.templates)
+        self.queries = tuple(self.queries)
+        self.product_queries = {}
+        self.frozen = True
+        return self
+
+
     def set_standard_system(self):
 
         res = "//System Declarations:\n\n"
@@ -484,8 +705,8 @@ class System:
         self.system = res
 
 
-    def to_UModel(self):
-        
+    def to_ET(self) -> ET.Element:
+
         root = ET.Element("nta")
         
         if self.declaration is not None: 
@@ -501,36 +722,115 @@ class System:
             sys_elem.text = self.system
             root.append(sys_elem)
 
-        elem_tree = ET.ElementTree(root)
+        return root
+
+
+    # Writes the system to the given path or, by default, to a unique path in the workspace of the current run
+    def to_UModel(self, model_path: str = None):
+
+        if model_path is None:
+            model_path = ws.get_workspace().model_path(self.model_path)
+
+        elem_tree = ET.ElementTree(self.to_ET())
 
-        with open(self.model_path, 'w', encoding='utf-8') as f:
+        with open(model_path, 'w', encoding='utf-8') as f:
             elem_tree.write(
-                self.model_path, encoding="utf-8", xml_declaration=True)
+                model_path, encoding="utf-8", xml_declaration=True)
 
-        umodel = pyu.UModel(self.model_path)
+        umodel = pyu.UModel(model_path)
 
         umodel.set_queries(self.queries)
         return umodel
     
+    # Canonical key of the generated model, its queries and the verifying backend, independent of the path the model is
+    # written to
+    def model_hash(self, verify_options: str = None) -> str:
+        return vc.model_hash(ET.tostring(self.to_ET(), encoding="unicode"), self.queries, verify_options, backend.identity())
+
     def verify(self, trace_path: str = None, verify_options: str = None) -> bool:
-        verify_str = self.to_UModel().verify(trace_path, verify_options)
-        # print(verify_str)  # Uncomment for printing the model checking result 
-        if "Formula is satisfied" in verify_str:
-            return True
-        elif "Formula is NOT satisfied" in verify_str:
-            return False
+
+        # Verification with diagnostic trace output has side effects and is therefore never cached
+        key = None
+        if verdict_cache is not None and trace_path is None:
+            key = self.model_hash(verify_options)
+            cached = verdict_cache.get(key)
+            if cached is not None:
+                return cached
+
+        if trace_path is None:
+            verdicts = self.verify_staged(lambda options: verify_retrying(lambda retry_options: backend.verify(self, None, retry_options), options),
+                                          lambda verdicts: verdicts[0] if len(verdicts) > 0 else None, verify_options)
         else:
+            verdicts = verify_retrying(lambda options: backend.verify(self, trace_path, options), verify_options)
+        if len(verdicts) == 0:
             raise Exception("System verification failed, no result was returned")
+        res = verdicts[0]
+
+        if key is not None:
+            verdict_cache.put(key, res)
+        return res
+
+    # Verdict of the first query together with a witness: if the query is existential (E<> or E[]) and satisfied, the run
+    # found by the model checker with the values of the given clock at its transitions (see witness_trace). Backends that
+    # do not report runs, as well as cached verdicts, come without witness.
+    def verify_witness(self, clock: str) -> tuple[bool, ts.DelayTrace | ts.DelayTraceLasso | None]:
+
+        verify_run = getattr(backend, "verify_witness", None)
+        if verify_run is None:
+            return self.verify(), None
+
+        key = None
+        if verdict_cache is not None:
+            key = self.model_hash()
+            cached = verdict_cache.get(key)
+            if cached is not None:
+                return cached, None
+
+        res, run = self.verify_staged(lambda options: verify_retrying(lambda retry_options: verify_run(self, clock, retry_options), options),
+                                      lambda result: result[0], None)
+
+        if key is not None:
+            verdict_cache.put(key, res)
+        return res, witness_trace(run)
               
 
-    def intersect(self, other: System) -> System:
+    # Result of verify(options) for the first query, decided by the approximation stages before exact verification if
+    # possible (see APPROXIMATIONS); verdict extracts the verdict of the first query from a result
+    def verify_staged(self, verify: Callable[[str | None], Any], verdict: Callable[[Any], bool | None], verify_options: str | None) -> Any:
+        quantifier = self.queries[0].strip()[0:3]
+        stages = [stage for stage in approximation_stages if quantifier in STAGE_QUANTIFIERS[stage]]
+        if len(stages) < len(approximation_stages) and backend.name in UPPAAL_BACKENDS:
+            approximation_stats["skipped"] += 1
+        if len(stages) > 0 and backend.name in UPPAAL_BACKENDS:
+            approximation_stats["staged"] += 1
+            for stage in stages:
+                try:
+                    result = verify(str_connect(verify_options, APPROXIMATIONS[stage], " "))
+                except VerificationUnknown:
+                    continue
+                if is_conclusive(stage, quantifier, verdict(result)):
+                    approximation_stats["settled"] += 1
+                    return result
+        return verify(verify_options)
+
+    # Product with other, restricted to the reachable location pairs if prune is set (by default if product pruning is
+    # enabled), in which case the queries only refer to the remaining locations
+    def intersect(self, other: System, prune: bool | None = None) -> System:
 
         assert len(self.templates) == len(other.templates), "Systems that are tried to intersect do not have the same number of templates." 
 
+        if prune is None:
+            prune = product_pruning
+
         inter_model_path = self.model_path[:len(self.model_path)-4] + "_INTER.xml" 
         inter_declaration = str_connect(self.declaration, other.declaration, "\n")
-        inter_templates = list(map(lambda t1, t2: t1.intersect(t2), self.templates, other.templates))
-        inter_queries = self.intersection_queries(other)
+        if prune:
+            inter_templates = list(map(lambda t1, t2: t1.intersect_reachable(t2), self.templates, other.templates))
+            present = [{loc.name for loc in template.locations if loc.name is not None} for template in inter_templates]
+        else:
+            inter_templates = list(map(lambda t1, t2: t1.intersect(t2), self.templates, other.templates))
+            present = None
+        inter_queries = self.intersection_queries(other, present)
         
             
         inter_sys = System(None, inter_model_path, None, inter_declaration, inter_templates, inter_queries, False)
@@ -539,7 +839,7 @@ class System:
         return inter_sys
 
 
-    def intersection_queries(self, other: System) -> list[str]:
+    def intersection_queries(self, other: System, present: list[set[str]] | None = None) -> list[str]:
         
         id_lists = []
         new_template_names = []
@@ -547,10 +847,22 @@ class System:
             id_lists.append(other.templates[i].get_location_ids())
             new_template_names.append(self.templates[i].name + "_INTER")
 
-        return self.query_product(id_lists, new_template_names)
+        return self.query_product(id_lists, new_template_names, present)
+
+
+    # Queries referring to the locations of the product with automata whose location ids are given, for each template; if
+    # the names of the locations present in the product are given, only these are referred to. Frozen systems keep the
+    # queries of their products, since the automata of the CF-checks of different causes mostly share their location ids.
+    def query_product(self, id_lists: list[list[int]], new_template_names: list[str], present: list[set[str]] | None = None) -> list[str]:
 
+        if "product_queries" in self.__dict__:
+            key = (tuple(map(tuple, id_lists)), tuple(new_template_names), None if present is None else tuple(map(frozenset, present)))
+            if key not in self.product_queries:
+                self.product_queries[key] = tuple(self.query_product_uncached(id_lists, new_template_names, present))
+            return list(self.product_queries[key])
+        return self.query_product_uncached(id_lists, new_template_names, present)
 
-    def query_product(self, id_lists: list[list[int]], new_template_names: list[str]) -> list[str]:
+    def query_product_uncached(self, id_lists: list[list[int]], new_template_names: list[str], present: list[set[str]] | None = None) -> list[str]:
 
         query_dict: dict[str, str] = {}
 
@@ -559,10 +871,13 @@ class System:
             
             for loc in self.templates[i].locations:
                 if loc.name is not None:
-                    new_loc_name = "("
-                    for other_id in id_lists[i]:
-                        new_loc_name += "Proc_" + new_template_names[i] + "." + loc.name + "_" + str(other_id) + " or "
-                    new_loc_name = new_loc_name[:len(new_loc_name)-4] + " )"
+                    new_loc_names = [loc.name + "_" + str(other_id) for other_id in id_lists[i]]
+                    if present is not None:
+                        new_loc_names = [name for name in new_loc_names if name in present[i]]
+                    if len(new_loc_names) == 0:
+                        new_loc_name = "(false )"
+                    else:
+                        new_loc_name = "(" + " or ".join("Proc_" + new_template_names[i] + "." + name for name in new_loc_names) + " )"
                     
                     query_dict["Proc_" + temp_name + "." + loc.name + " "] = new_loc_name + " "
 
@@ -576,13 +891,22 @@ class System:
         return inter_queries
         
     
+    # Contingency automaton of the system for the given traces, encoded compactly if enabled (see set_compact_contingency)
     def contingency_automaton(self, traces: list[ts.DelayTrace] | list[ts.DelayTraceLasso] | list[ts.TimestampTrace]) -> System:
         templates_con = []
         for i in range(len(traces)):
-            templates_con.append(self.templates[i].contingency_automaton(traces[i], self.clocks, self.all_actions))
+            if compact_contingency:
+                templates_con.append(self.templates[i].contingency_automaton_compact(traces[i], self.clocks, self.all_actions))
+            else:
+                templates_con.append(self.templates[i].contingency_automaton(traces[i], self.clocks, self.all_actions))
 
         model_path_con = self.model_path[:len(self.model_path)-4] + "_CON.xml" 
-        queries_con = self.contingency_queries(traces)
+        if compact_contingency:
+            queries_con = self.queries
+            for template in self.templates[:len(traces)]:
+                queries_con = [query.replace("Proc_" + template.name + ".", "Proc_" + template.name + "_CON.") for query in queries_con]
+        else:
+            queries_con = self.contingency_queries(traces)
 
             
         sys_con = System(None, model_path_con, None, self.declaration, templates_con, queries_con, False)
@@ -607,3 +931,886 @@ class System:
 
 
         return self.query_product(id_lists, new_template_names)
+
+
+# Family of systems, each the product of one system with a variant of the same template (e.g., the counterfactual automata
+# of several candidate causes). The family is represented by the product with the union of all variants: every member
+# enables a subset of its transitions and contributes its own guards and invariants to the first template.
+
+class SystemFamily:
+
+    def __init__(self, base: System, variants: list[Template], model_path: str):
+
+        assert len(base.templates) == 1, "Families can only be formed for systems with a single template."
+        assert len(variants) > 0, "A family needs at least one member."
+
+        self.base_template = base.templates[0]
+        self.variants = variants
+        self.union = self.union_template(variants)
+        self.variant_transitions = [self.transition_index(variant) for variant in variants]
+
+        # Not pruned, the members are described by the indices of the complete product
+        self.system = base.intersect(System(None, model_path, None, None, [self.union]), False)
+        self.pairs = self.base_template.intersection_pairs(self.union)
+        self.union_keys = [(trans.source, trans.target, trans.sync) for trans in self.union.transitions]
+
+    def __repr__(self) -> str:
+        return f"SystemFamily(members: {len(self)}, system: {self.system.model_path})"
+
+    def __len__(self) -> int:
+        return len(self.variants)
+
+    def transition_index(self, variant: Template) -> dict[tuple, Transition]:
+        index = {(trans.source, trans.target, trans.sync): trans for trans in variant.transitions}
+        assert len(index) == len(variant.transitions), "Variants of a family must not contain parallel transitions with the same action."
+        return index
+
+    # Variant with the transitions of all variants (without guards) and the locations of the first variant (without invariants)
+    def union_template(self, variants: list[Template]) -> Template:
+        first = variants[0]
+        transitions: dict[tuple, Transition] = {}
+        for variant in variants:
+            assert [(loc.id, loc.name, loc.commited) for loc in variant.locations] == [(loc.id, loc.name, loc.commited) for loc in first.locations], "Variants of a family must have the same locations."
+            for trans in variant.transitions:
+                key = (trans.source, trans.target, trans.sync)
+                if key not in transitions:
+                    transitions[key] = Transition(None, trans.source, trans.target, trans.position, None, trans.sync, trans.assignment, trans.nail)
+                assert transitions[key].assignment == trans.assignment, "Variants of a family must agree on the assignments of their transitions."
+        locations = [Location(None, loc.id, loc.position, None, loc.name, loc.commited) for loc in first.locations]
+        return Template(None, first.name, locations, first.init, list(transitions.values()), first.parameter, first.declaration)
+
+    # Transition i and location i of the first template of the family system as seen by member k
+    def is_enabled(self, k: int, i: int) -> bool:
+        return self.union_keys[self.pairs[i][1]] in self.variant_transitions[k]
+
+    def guard(self, k: int, i: int) -> str | None:
+        base_index, union_index = self.pairs[i]
+        variant_trans = self.variant_transitions[k][self.union_keys[union_index]]
+        return str_connect(self.base_template.transitions[base_index].guard, variant_trans.guard, " && ")
+
+    def invariant(self, k: int, i: int) -> str | None:
+        base_index, variant_index = divmod(i, len(self.union.locations))
+        return str_connect(self.base_template.locations[base_index].inv, self.variants[k].locations[variant_index].inv, " && ")
+
+    # Members grouped by the guard of a union transition or the invariant of a union location, in the order of the members
+    def guard_groups(self, union_index: int) -> list[tuple[str | None, frozenset[int]]]:
+        key = self.union_keys[union_index]
+        return group_members([self.variant_transitions[k][key].guard if key in self.variant_transitions[k] else None for k in range(len(self))],
+                             [key in self.variant_transitions[k] for k in range(len(self))])
+
+    def invariant_groups(self, variant_index: int) -> list[tuple[str | None, frozenset[int]]]:
+        return group_members([variant.locations[variant_index].inv for variant in self.variants], [True] * len(self))
+
+    # All members as one system: in a committed initial location, the variable SELECTOR is set to the member whose behaviour
+    # the system follows afterwards. Guards of transitions and locations with different invariants are split by the members
+    # sharing them, and the first query is checked for every member separately (one query per member).
+    def selector_system(self) -> System:
+
+        template = self.system.templates[0]
+        process = "Proc_" + template.name + "."
+        locations_per_variant = len(self.union.locations)
+        next_id = max(loc.id for loc in template.locations) + 1
+
+        locations: list[Location] = []
+        copies: list[list[tuple[Location, frozenset[int]]]] = []
+        query_dict: dict[str, str] = {}
+        for (i, loc) in enumerate(template.locations):
+            base_loc = self.base_template.locations[i // locations_per_variant]
+            loc_copies = []
+            for (j, (inv, members)) in enumerate(self.invariant_groups(i % locations_per_variant)):
+                copy_id = loc.id
+                copy_name = loc.name
+                if j > 0:
+                    copy_id = next_id
+                    next_id += 1
+                    if loc.name is not None:
+                        copy_name = loc.name + "__" + str(j)
+                copy = Location(None, copy_id, loc.position, str_connect(base_loc.inv, inv, " && "), copy_name, loc.commited)
+                locations.append(copy)
+                loc_copies.append((copy, members))
+            copies.append(loc_copies)
+            if loc.name is not None and len(loc_copies) > 1:
+                query_dict[process + loc.name + " "] = "(" + " or ".join(process + copy.name for (copy, members) in loc_copies) + " ) "
+
+        location_index = {loc.id: i for (i, loc) in enumerate(template.locations)}
+        transitions: list[Transition] = []
+        for (i, trans) in enumerate(template.transitions):
+            base_index, union_index = self.pairs[i]
+            base_guard = self.base_template.transitions[base_index].guard
+            for (guard, members) in self.guard_groups(union_index):
+                for (source, source_members) in copies[location_index[trans.source]]:
+                    for (target, target_members) in copies[location_index[trans.target]]:
+                        trans_members = members & source_members & target_members
+                        if len(trans_members) == 0:
+                            continue
+                        trans_guard = str_connect(base_guard, guard, " && ")
+                        if trans_members != source_members:
+                            trans_guard = str_connect(trans_guard, selector_condition(trans_members), " && ")
+                        transitions.append(Transition(None, source.id, target.id, trans.position, trans_guard, trans.sync, trans.assignment, trans.nail))
+
+        init = Location(None, next_id, template.locations[location_index[template.init]].position.add(Position(0, -150)), None, None, True)
+        for (copy, members) in copies[location_index[template.init]]:
+            for k in sorted(members):
+                transitions.append(Transition(None, init.id, copy.id, init.position.cart_middle(copy.position), None, None, SELECTOR + " := " + str(k)))
+
+        selector_template = Template(None, template.name, locations + [init], init.id, transitions, template.parameter, template.declaration)
+        declaration = str_connect(self.system.declaration, "int[-1," + str(len(self) - 1) + "] " + SELECTOR + " = -1;", "\n")
+
+        query = self.system.queries[0]
+        for key in query_dict:
+            query = query.replace(key, query_dict[key])
+        queries = [selector_query(query, k) for k in range(len(self))]
+
+        return System(None, self.system.model_path, self.system.system, declaration, [selector_template] + self.system.templates[1:], queries, False)
+
+    # Member k as a system on its own
+    def member(self, k: int) -> System:
+        template = self.system.templates[0]
+        locations = [Location(None, loc.id, loc.position, self.invariant(k, i), loc.name, loc.commited) for (i, loc) in enumerate(template.locations)]
+        transitions = [Transition(None, trans.source, trans.target, trans.position, self.guard(k, i), trans.sync, trans.assignment, trans.nail)
+                       for (i, trans) in enumerate(template.transitions) if self.is_enabled(k, i)]
+        member_template = Template(None, template.name, locations, template.init, transitions, template.parameter, template.declaration)
+        return System(None, self.system.model_path, self.system.system, self.system.declaration, [member_template] + self.system.templates[1:], self.system.queries, False)
+
+
+# Selector variable and queries of SystemFamily.selector_system
+
+SELECTOR = "family_member"
+
+def group_members(labels: list[str | None], present: list[bool]) -> list[tuple[str | None, frozenset[int]]]:
+    groups: dict[str | None, set[int]] = {}
+    for k in range(len(labels)):
+        if present[k]:
+            groups.setdefault(labels[k], set()).add(k)
+    return [(label, frozenset(members)) for (label, members) in groups.items()]
+
+def selector_condition(members: frozenset[int]) -> str:
+    conditions = []
+    ordered = sorted(members)
+    start = 0
+    for i in range(1, len(ordered) + 1):
+        if i == len(ordered) or ordered[i] != ordered[i-1] + 1:
+            if start == i - 1:
+                conditions.append(SELECTOR + " == " + str(ordered[start]))
+            else:
+                conditions.append("(" + SELECTOR + " >= " + str(ordered[start]) + " && " + SELECTOR + " <= " + str(ordered[i-1]) + ")")
+            start = i
+    if len(conditions) == 1:
+        return conditions[0]
+    return "(" + " || ".join(conditions) + ")"
+
+# Query deciding the query of the family for member k, before the member is selected (SELECTOR == -1) no formula holds
+def selector_query(query: str, k: int) -> str:
+    formula = "(" + query[3:].strip() + ")"
+    member = SELECTOR + " == " + str(k)
+    match query[0:3]:
+        case "E<>":
+            return "E<> " + member + " && " + formula
+        case "A[]":
+            return "A[] " + SELECTOR + " != " + str(k) + " || " + formula
+        case "E[]":
+            return "E[] " + SELECTOR + " == -1 || (" + member + " && " + formula + ")"
+        case "A<>":
+            return "A<> " + SELECTOR + " != -1 && (" + SELECTOR + " != " + str(k) + " || " + formula + ")"
+        case _:
+            raise Exception("Query of the family is not supported for checking all members at once: " + query)
+
+
+# Verdicts of the first query for all members of a family. Backends providing verify_family decide all members at once,
+# otherwise (or if the backend cannot handle the family) the members are verified one by one.
+
+def verify_family(family: SystemFamily) -> list[bool]:
+    verify_members = getattr(backend, "verify_family", None)
+    if verify_members is not None:
+        try:
+            return verify_members(family)
+        except zg.UnsupportedModel:
+            pass
+        except VerificationUnknown:
+            # Verified member by member instead, such that only the members without verdict stay unknown
+            if unknown_policy == "fail":
+                raise
+    return [family.member(k).verify() for k in range(len(family))]
+
+
+# Witness of an existential query as trace of the values of a clock at the transitions of the run (None where the
+# diagnostic trace does not determine them): a lasso trace if the run ends in a cycle and a delay trace otherwise,
+# ending with a value without action if the run stops in a state satisfying an E<> query.
+
+def witness_trace(run: tuple[list[int | None], list[str | None], int | None] | None) -> ts.DelayTrace | ts.DelayTraceLasso | None:
+    if run is None:
+        return None
+    values, actions, loop = run
+    if loop is not None:
+        return ts.DelayTraceLasso(values[:loop], actions[:loop], values[loop:], actions[loop:])
+    return ts.DelayTrace(values, actions)
+
+
+# Symbolic diagnostic trace printed by verifyta (option -t) for the first query: the value of the clock at a transition
+# is determined if the bounds of the clock in the source state and the guard coincide. Steps are the transitions of
+# the first process of the system, whose synchronisation is the action of the step.
+
+CONSTRAINT = re.compile(r"([\w.()\[\]]+?)(?:-([\w.()\[\]]+))?(<=|>=|==|<|>|=)(-?\d+)")
+TRANSITION = re.compile(r"\s*(\w+)\.\S+\s*->\s*\S+\s*\{(.*)\}\s*$")
+FLIPPED_BOUNDS = {"<=": ">=", "<": ">", ">=": "<=", ">": "<", "==": "==", "=": "="}
+
+# Value of the clock if the conjunction of clock constraints determines it
+def determined_value(constraints: str, clock: str) -> int | None:
+    lower = upper = None
+    text = re.sub(r"\s*(<=|>=|==|<|>|=|-)\s*", r"\1", constraints.replace("&&", " ").replace(",", " "))
+    for token in text.split():
+        match = CONSTRAINT.fullmatch(token)
+        if match is None:
+            continue
+        left, right, op, value = match.group(1), match.group(2), match.group(3), int(match.group(4))
+        if left == "t(0)" and right is not None:
+            left, op, value = right, FLIPPED_BOUNDS[op], -value
+        elif right is not None and right != "t(0)":
+            continue
+        if left.split(".")[-1] != clock:
+            continue
+        if op in ("<", ">"):
+            return None
+        if op != ">=":
+            upper = value if upper is None else min(upper, value)
+        if op != "<=":
+            lower = value if lower is None else max(lower, value)
+    if lower is not None and lower == upper:
+        return lower
+    return None
+
+# Least value of the clock in the conjunction of clock constraints (differences included), None if the constraints are
+# unsatisfiable or the least value is excluded by a strict bound
+def lower_bound(constraints: str, clock: str) -> int | None:
+    text = re.sub(r"\s*(<=|>=|==|<|>|=|-)\s*", r"\1", constraints.replace("&&", " ").replace(",", " "))
+    # bounds[(a, b)] = (c, 0) stands for a - b < c and (c, 1) for a - b <= c, "0" is the reference clock
+    bounds: dict[tuple[str, str], tuple[int, int]] = {}
+    def tighten(a: str, b: str, bound: tuple[int, int]) -> None:
+        if (a, b) not in bounds or bound < bounds[(a, b)]:
+            bounds[(a, b)] = bound
+    for token in text.split():
+        match = CONSTRAINT.fullmatch(token.strip("()"))
+        if match is None:
+            continue
+        left, right, op, value = match.group(1), match.group(2), match.group(3), int(match.group(4))
+        left = "0" if left == "t(0)" else left.split(".")[-1]
+        right = "0" if right is None or right == "t(0)" else right.split(".")[-1]
+        if op in ("<=", "<", "==", "="):
+            tighten(left, right, (value, int(op != "<")))
+        if op in (">=", ">", "==", "="):
+            tighten(right, left, (-value, int(op != ">")))
+    names = {name for pair in bounds for name in pair} | {"0", clock}
+    for k in names:
+        for i in names:
+            for j in names:
+                if (i, k) in bounds and (k, j) in bounds:
+                    (c1, weak1), (c2, weak2) = bounds[(i, k)], bounds[(k, j)]
+                    tighten(i, j, (c1 + c2, min(weak1, weak2)))
+    if any(bounds.get((name, name), (0, 1)) < (0, 1) for name in names):
+        return None
+    value, weak = bounds.get(("0", clock), (0, 1))
+    return -value if weak == 1 else None
+
+def parse_witness(output: str, clock: str, stops: bool, stop_formula: str | None = None) -> tuple[list[int | None], list[str | None], None] | None:
+
+    if "State" not in output:
+        return None
+
+    values = []
+    actions = []
+    state = ""
+    process = None
+    block = None
+    last_update = None
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("State"):
+            block = "state"
+            state = ""
+            continue
+        if stripped.startswith("Transition"):
+            block = "transitions"
+            continue
+        if block == "state":
+            if stripped.startswith("(") and process is None:
+                process = stripped.strip("( )").split()[0].split(".")[0]
+            else:
+                state += " " + stripped
+        elif block == "transitions":
+            match = TRANSITION.match(line)
+            if match is None or match.group(1) != process:
+                continue
+            guard, sync, update = (match.group(2).split(", ", 2) + ["", ""])[:3]
+            values.append(determined_value(state + " " + guard, clock))
+            sync = sync.strip()
+            actions.append(None if sync in ("tau", "", "1") else sync)
+            last_update = update
+            block = None
+
+    if stops:
+        if len(values) == 0:
+            stop = 0
+        else:
+            reset = re.search(r"(?:^|[\s,.])" + re.escape(clock) + r"\s*:?=\s*(\d+)", last_update)
+            stop = int(reset.group(1)) if reset is not None else values[-1]
+        # A formula on clocks may only hold after a delay in the last state: the run stops at the least value of the
+        # clock in the last zone satisfying the formula, unless the formula is no conjunction of constraints
+        if stop_formula is not None:
+            conjunction = not any(op in stop_formula for op in ("||", "!", " or ", " not ", "imply"))
+            stop = lower_bound(state + " " + stop_formula + " " + clock + ">=" + str(stop), clock) if stop is not None and conjunction else None
+        values.append(stop)
+    return values, actions, None
+
+# Formula of the query if it constrains one of the clocks, None if it constrains locations and variables only
+def clock_formula(query: str, clocks: list[str]) -> str | None:
+    formula = query.strip()[3:]
+    if any(name.split(".")[-1] in clocks for name in re.findall(r"[A-Za-z_][\w.]*", formula)):
+        return formula
+    return None
+
+
+# Staged verification: the first query is decided by cheap approximate modes of verifyta before exact verification,
+# whose verdicts are only accepted where they carry over to the exact system. The convex-hull over-approximation ("-A")
+# has more runs than the exact system and settles the absence of runs (E<> and E[] not satisfied, A[] and A<> satisfied),
+# bit-state hashing ("-Z") explores a subset of the states and settles reachability (E<> satisfied, A[] not satisfied).
+# Bit-state hashing may take a hash collision for a cycle, it is therefore skipped for E[] and A<> queries.
+
+APPROXIMATIONS = {"over": "-A", "under": "-Z"}
+STAGE_QUANTIFIERS = {"over": ("E<>", "A[]", "E[]", "A<>"), "under": ("E<>", "A[]")}
+
+UPPAAL_BACKENDS = ("pyuppaal", "verifyta", "portfolio")
+
+approximation_stages: list[str] = []
+approximation_stats = {"staged": 0, "settled": 0, "skipped": 0}
+
+def set_approximation_stages(stages: list[str]) -> None:
+    global approximation_stages
+    assert all(stage in APPROXIMATIONS for stage in stages), "Unknown approximation stage in " + str(stages)
+    approximation_stages = stages
+
+def get_approximation_stages() -> list[str]:
+    return approximation_stages
+
+def is_conclusive(stage: str, quantifier: str, verdict: bool | None) -> bool:
+    if verdict is None:
+        return False
+    exists = verdict if quantifier in ("E<>", "E[]") else not verdict
+    return exists if stage == "under" else not exists
+
+def approximation_report() -> str:
+    staged, settled, skipped = approximation_stats["staged"], approximation_stats["settled"], approximation_stats["skipped"]
+    share = 100 * settled / staged if staged > 0 else 0.0
+    res = f"Approximation stages {approximation_stages}: {settled} of {staged} staged verifications settled ({share:.1f}%)"
+    if skipped > 0:
+        res += f", stages skipped for {skipped} verifications of E[] and A<> queries (\"under\" only applies to E<> and A[])"
+    return res
+
+
+# Verification that ended without verdict, because the model checker exceeded its time or memory limit
+
+class VerificationUnknown(Exception):
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return "Verification ended without verdict (" + self.reason + ")"
+
+
+# Handling of verifications ending without verdict: "fail" stops the cause algorithm with the VerificationUnknown error,
+# "retry" verifies again with the retry options of the backend (other search orders of verifyta) before failing and
+# "undecided" lets the cause algorithms treat the condition as undecided (reported and counted as violated)
+
+UNKNOWN_POLICIES = ["fail", "retry", "undecided"]
+
+unknown_policy = "fail"
+
+def set_unknown_policy(policy: str) -> None:
+    global unknown_policy
+    assert policy in UNKNOWN_POLICIES, "Unknown policy for verifications without verdict: " + policy
+    unknown_policy = policy
+
+def get_unknown_policy() -> str:
+    return unknown_policy
+
+# Result of verify(options), retried with the retry options of the backend if it ends without verdict and the policy asks for it
+def verify_retrying(verify: Callable[[str | None], Any], verify_options: str | None) -> Any:
+    try:
+        return verify(verify_options)
+    except VerificationUnknown:
+        if unknown_policy != "retry" or len(getattr(backend, "retry_options", [])) == 0:
+            raise
+    for option in backend.retry_options:
+        try:
+            return verify(str_connect(verify_options, option, " "))
+        except VerificationUnknown as unknown:
+            last = unknown
+    raise last
+
+
+# Verification backends deciding the queries of a system. By default, systems are verified with pyuppaal, the verifyta
+# backend hands the serialised model directly to Uppaal's model checker, the zone graph backend (zone_graph.py) decides
+# the queries natively.
+
+# First line of the version output of verifyta, identifying the model checker for the verdict cache
+@functools.lru_cache(maxsize=None)
+def verifyta_version(executable: str | None) -> str:
+    if executable is None:
+        return "unknown"
+    try:
+        output = subprocess.run([executable, "--version"], stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    lines = output.strip().splitlines()
+    return lines[0].strip() if len(lines) > 0 else "unknown"
+
+def parse_verdicts(verify_str: str) -> list[bool]:
+    verdicts = []
+    for line in verify_str.splitlines():
+        verdict = parse_verdict_line(line)
+        if verdict is not None:
+            verdicts.append(verdict)
+    return verdicts
+
+def parse_verdict_line(line: str) -> bool | None:
+    if "Formula is satisfied" in line:
+        return True
+    elif "Formula is NOT satisfied" in line:
+        return False
+    return None
+
+
+class PyUppaalBackend:
+
+    name = "pyuppaal"
+
+    def __init__(self):
+        self.verifyta_path = None
+
+    # Worker processes started with spawn do not inherit the verifyta path of pyuppaal
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["verifyta_path"] = pyu.Verifyta().verifyta_path
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self.verifyta_path is not None and pyu.Verifyta().verifyta_path is None:
+            pyu.set_verifyta_path(self.verifyta_path)
+
+    def identity(self) -> str:
+        return self.name + " " + verifyta_version(pyu.Verifyta().verifyta_path)
+
+    def verify(self, system: System, trace_path: str = None, verify_options: str = None) -> list[bool]:
+        model_path = ws.get_workspace().model_path(system.model_path)
+        try:
+            verify_str = system.to_UModel(model_path).verify(trace_path, verify_options)
+        finally:
+            ws.get_workspace().release(model_path)
+        # print(verify_str)  # Uncomment for printing the model checking result 
+        return parse_verdicts(verify_str)
+
+    def verify_family(self, family: SystemFamily) -> list[bool]:
+        return verify_selector_system(self, family)
+
+
+class VerifytaBackend:
+
+    name = "verifyta"
+
+    # Search orders (depth-first, random depth-first) tried if a verification ends without verdict
+    retry_options = ["-o1", "-o2"]
+
+    # executable: verifyta or a stand-in accepting the same arguments (by default the verifyta path set for pyuppaal)
+    # pipe: pass the model on standard input ("-" as model file) instead of writing it to the workspace
+    # timeout: seconds after which verifyta is killed and the verification ends without verdict (None for no limit)
+    # memory_limit: bytes of address space verifyta may use (RLIMIT_AS, set by prlimit before verifyta starts or, without
+    # prlimit, right after it has been started), exceeding it ends without verdict
+    def __init__(self, executable: str = None, pipe: bool = False, timeout: float | None = None, memory_limit: int | None = None):
+        self.executable = executable
+        self.pipe = pipe
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.calls = 0
+        self.timings: dict[str, float] = {"serialise": 0.0, "write": 0.0, "verify": 0.0, "parse": 0.0}
+        self.invocations: list[Invocation] = []
+
+    def __repr__(self) -> str:
+        return f"VerifytaBackend(executable: {self.get_executable()}, pipe: {self.pipe}, timeout: {self.timeout}, memory_limit: {self.memory_limit})"
+
+    def get_executable(self) -> str:
+        if self.executable is not None:
+            return self.executable
+        return pyu.Verifyta().verifyta_path
+
+    def identity(self) -> str:
+        return self.name + " " + verifyta_version(self.get_executable())
+
+    def command(self, model_arg: str, trace_path: str = None, verify_options: str = None) -> list[str]:
+        executable = self.get_executable()
+        if executable is None:
+            raise Exception("No verifyta executable is set for the verifyta backend")
+
+        cmd = [executable]
+        options = shlex.split(verify_options or "")
+        if trace_path is not None:
+            if not any(option.startswith("-t") for option in options):
+                options.append("-t1")
+            cmd += ["-f", os.path.splitext(trace_path)[0]]
+        return self.memory_wrapper() + cmd + options + [model_arg]
+
+    # prlimit (util-linux) executing verifyta with the memory limit already in place, empty if there is no limit or no
+    # prlimit, the limit is then set by limit_memory
+    def memory_wrapper(self) -> list[str]:
+        if self.memory_limit is None or PRLIMIT is None:
+            return []
+        return [PRLIMIT, "--as=" + str(self.memory_limit), "--"]
+
+    def serialise(self, system: System) -> bytes:
+        root = system.to_ET()
+        root.append(ufac.queries(system.queries))
+        return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+    def verify(self, system: System, trace_path: str = None, verify_options: str = None) -> list[bool]:
+        return self.execute(system, trace_path, verify_options)[0]
+
+    # Verdict of the first query with the diagnostic trace verifyta prints on standard error
+    def verify_witness(self, system: System, clock: str, verify_options: str = None) -> tuple[bool, tuple[list[int | None], list[str | None], None] | None]:
+        verdicts, errors = self.execute(system, None, str_connect("-t0", verify_options, " "))
+        if len(verdicts) == 0:
+            raise Exception("System verification failed, no result was returned")
+        if not verdicts[0] or system.queries[0].strip()[0:3] not in ("E<>", "E[]"):
+            return verdicts[0], None
+        clocks = system.clocks + [name for template in system.templates for name in get_clocks(template.declaration)]
+        return True, parse_witness(errors, clock, system.queries[0].strip().startswith("E<>"), clock_formula(system.queries[0], clocks))
+
+    # Verdicts of all queries and the standard error output of verifyta. Setting cancel kills verifyta, the verification
+    # then ends without verdict.
+    def execute(self, system: System, trace_path: str = None, verify_options: str = None, cancel: threading.Event | None = None) -> tuple[list[bool], str]:
+
+        start = time.perf_counter()
+        model = self.serialise(system)
+        serialised = time.perf_counter()
+
+        if self.pipe:
+            model_arg = "-"
+        else:
+            model_arg = ws.get_workspace().model_path(system.model_path)
+            with open(model_arg, "wb") as f:
+                f.write(model)
+        written = time.perf_counter()
+
+        env = os.environ.copy()
+        env.pop("UPPAAL_COMPILE_ONLY", None)
+        # Own process group, such that verifyta and all processes it starts are killed together
+        process = subprocess.Popen(self.command(model_arg, trace_path, verify_options), env=env, text=True,
+                                   stdin=subprocess.PIPE if self.pipe else subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   start_new_session=True)
+        conc.register_process_group(process.pid)
+        if len(self.memory_wrapper()) == 0:
+            self.limit_memory(process.pid)
+
+        # Kills verifyta once the timeout has passed or the verification is cancelled
+        stop = cancel if cancel is not None else threading.Event()
+        killed: list[str] = []
+        def watch() -> None:
+            reason = "cancelled" if stop.wait(self.timeout) else "timeout"
+            if process.returncode is None:
+                killed.append(reason)
+                kill_process_group(process.pid)
+        watcher = None
+        if self.timeout is not None or cancel is not None:
+            watcher = threading.Thread(target=watch, daemon=True)
+            watcher.start()
+
+        errors: list[str] = []
+        error_reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+        error_reader.start()
+
+        verdicts = []
+        parse_time = 0.0
+        try:
+            if self.pipe:
+                try:
+                    process.stdin.write(model.decode("utf-8"))
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+            for line in process.stdout:
+                parse_start = time.perf_counter()
+                verdict = parse_verdict_line(line)
+                if verdict is not None:
+                    verdicts.append(verdict)
+                parse_time += time.perf_counter() - parse_start
+            usage = wait_process(process)
+        except BaseException:
+            # Interrupted (e.g., by KeyboardInterrupt), verifyta must not outlive the check
+            kill_process_group(process.pid)
+            process.wait()
+            raise
+        finally:
+            if cancel is None:
+                stop.set()
+            conc.unregister_process_group(process.pid)
+            if not self.pipe:
+                ws.get_workspace().release(model_arg)
+        error_reader.join()
+        finished = time.perf_counter()
+
+        if len(killed) > 0:
+            outcome = killed[0]
+        elif len(verdicts) == 0 and process.returncode != 0:
+            outcome = "memory limit" if self.out_of_memory(process.returncode, "".join(errors), usage) else "error"
+        else:
+            outcome = "verdict"
+        self.record({"serialise": serialised - start, "write": written - serialised, "verify": finished - written - parse_time, "parse": parse_time},
+                    Invocation(finished - written, usage, outcome))
+
+        if outcome in ("timeout", "memory limit", "cancelled"):
+            raise VerificationUnknown(outcome)
+        if outcome == "error":
+            raise Exception("verifyta failed with exit code " + str(process.returncode) + ":\n" + "".join(errors))
+        return verdicts, "".join(errors)
+
+    # Whether a run of verifyta that ended without verdict ran out of memory under the memory limit: it was killed or
+    # aborted, exited with ENOMEM, reported the failed allocation or came close to the limit. Other failures (e.g., syntax
+    # errors in the model) are errors.
+    def out_of_memory(self, returncode: int, errors: str, usage: resource.struct_rusage | None) -> bool:
+        if self.memory_limit is None:
+            return False
+        if returncode in (-signal.SIGKILL, -signal.SIGABRT, errno.ENOMEM):
+            return True
+        if any(message in errors.lower() for message in OUT_OF_MEMORY_MESSAGES):
+            return True
+        if usage is None:
+            return False
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        return peak_rss >= 0.9 * self.memory_limit
+
+    def record(self, timings: dict[str, float], invocation: Invocation) -> None:
+        self.calls += 1
+        for phase in timings:
+            self.timings[phase] += timings[phase]
+        self.invocations.append(invocation)
+
+    # Limits the address space of verifyta where prlimit is not available. The limit is set from the parent once verifyta
+    # has been started (preexec_fn is not safe in the threads of the portfolio race), the allocations of verifyta before are
+    # not limited.
+    def limit_memory(self, pid: int) -> None:
+        if self.memory_limit is None or resource is None or not hasattr(resource, "prlimit"):
+            return
+        try:
+            resource.prlimit(pid, resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+        except ProcessLookupError:
+            pass
+
+    # All members of a family in one run of verifyta, with one query per member
+    def verify_family(self, family: SystemFamily) -> list[bool]:
+        return verify_selector_system(self, family)
+
+    def report(self) -> str:
+        res = f"Verifyta backend: {self.calls} calls"
+        for phase in self.timings:
+            res += f", {phase} {self.timings[phase]:.3f}s"
+        cpu_times = [invocation.cpu_time for invocation in self.invocations if invocation.cpu_time is not None]
+        peak_rss = [invocation.peak_rss for invocation in self.invocations if invocation.peak_rss is not None]
+        if len(cpu_times) > 0:
+            res += f", CPU {sum(cpu_times):.3f}s"
+        if len(peak_rss) > 0:
+            res += f", peak RSS {max(peak_rss) / 1024:.1f}MiB"
+        unknown = sum(1 for invocation in self.invocations if invocation.outcome not in ("verdict", "cancelled"))
+        if unknown > 0:
+            res += f", {unknown} without verdict"
+        return res
+
+
+# Resources used by one run of verifyta: wall-clock and CPU time (user and system) in seconds, peak resident set size in
+# KiB, and whether it ended with a verdict ("verdict", "timeout", "memory limit" or "error"). CPU time and peak RSS are
+# None where the platform does not report them.
+
+class Invocation:
+
+    def __init__(self, wall_time: float, usage: resource.struct_rusage | None, outcome: str):
+        self.wall_time = wall_time
+        self.cpu_time = None
+        self.peak_rss = None
+        if usage is not None:
+            self.cpu_time = usage.ru_utime + usage.ru_stime
+            # ru_maxrss is given in bytes on macOS and in KiB elsewhere
+            self.peak_rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        self.outcome = outcome
+
+    def __repr__(self) -> str:
+        return f"Invocation(wall_time: {self.wall_time:.3f}s, cpu_time: {self.cpu_time}, peak_rss: {self.peak_rss}, outcome: {self.outcome})"
+
+
+# Waits for the process and returns its resource usage (None if the platform does not report it)
+# Messages of failed allocations, of verifyta (C++) and of stand-ins written in Python
+OUT_OF_MEMORY_MESSAGES = ("out of memory", "bad_alloc", "cannot allocate memory", "memoryerror")
+
+def wait_process(process: subprocess.Popen) -> resource.struct_rusage | None:
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return usage
+
+def kill_process_group(pid: int) -> None:
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+# Verifyta backend racing several option sets on the same model: all configurations are started at once, the first
+# verdict is taken and the remaining runs are killed. The winning configurations are counted per model family (the
+# generated models of one system share their model path, e.g. all CF products of a system). After `warmup` races of a
+# family, its most frequent winner runs alone, except for every `rerace`-th verification of the family, which is raced
+# again to follow changes. Runs producing a diagnostic trace file are never raced, as all runs would write it. With a
+# persistent verdict store, the wins are kept in the store and taken over by later runs and other worker processes. At
+# most `width` configurations are raced at once, the ones that won most often for the family.
+
+PORTFOLIO_CONFIGS = ["", "-o1", "-o2", "-S2", "-o1 -S0"]
+
+class PortfolioBackend(VerifytaBackend):
+
+    name = "portfolio"
+
+    # Racing already covers the other search orders
+    retry_options = []
+
+    def __init__(self, executable: str = None, pipe: bool = False, timeout: float | None = None, memory_limit: int | None = None,
+                 configs: list[str] = None, warmup: int = 5, rerace: int = 25, width: int | None = None):
+        super().__init__(executable, pipe, timeout, memory_limit)
+        self.configs = PORTFOLIO_CONFIGS if configs is None else configs
+        self.width = len(self.configs) if width is None else max(1, min(width, len(self.configs)))
+        self.warmup = warmup
+        self.rerace = rerace
+        self.verifications: dict[str, int] = {}
+        self.wins: dict[str, dict[str, int]] = {}
+        self.races = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"PortfolioBackend(executable: {self.get_executable()}, configs: {self.configs}, width: {self.width}, wins: {self.wins})"
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def family(self, system: System) -> str:
+        return os.path.splitext(os.path.basename(system.model_path or ""))[0]
+
+    # Persistent store of the verdict cache, if any, keeping the wins between runs
+    def store(self) -> vc.VerdictStore | None:
+        return getattr(verdict_cache, "store", None)
+
+    # Wins of the configurations for the family, read from the persistent store on the first verification of the family
+    def family_wins(self, family: str) -> dict[str, int]:
+        if family not in self.wins:
+            store = self.store()
+            stored = store.wins(family) if store is not None else {}
+            self.wins[family] = {config: stored[config] for config in self.configs if config in stored}
+        return self.wins[family]
+
+    # Configuration learned for the family, None if the verification should be raced
+    def learned(self, family: str) -> str | None:
+        wins = self.family_wins(family)
+        if sum(wins.values()) < self.warmup or self.verifications[family] % self.rerace == 0:
+            return None
+        return max(wins, key=wins.get)
+
+    # Configurations raced for the family, the most frequent winners first
+    def contenders(self, family: str) -> list[str]:
+        wins = self.family_wins(family)
+        return sorted(self.configs, key=lambda config: -wins.get(config, 0))[:self.width]
+
+    def execute(self, system: System, trace_path: str = None, verify_options: str = None, cancel: threading.Event | None = None) -> tuple[list[bool], str]:
+        family = self.family(system)
+        self.verifications[family] = self.verifications.get(family, 0) + 1
+
+        config = self.configs[0] if trace_path is not None else self.learned(family)
+        if config is not None:
+            try:
+                return super().execute(system, trace_path, str_connect(verify_options, config, " "), cancel)
+            except VerificationUnknown:
+                # The learned configuration did not finish, the others might
+                if trace_path is not None or (cancel is not None and cancel.is_set()):
+                    raise
+
+        winner, result = self.race(system, verify_options, self.contenders(family))
+        family_wins = self.family_wins(family)
+        family_wins[winner] = family_wins.get(winner, 0) + 1
+        store = self.store()
+        if store is not None:
+            store.add_win(family, winner)
+        return result
+
+    # First configuration returning verdicts together with its result
+    def race(self, system: System, verify_options: str | None, configs: list[str]) -> tuple[str, tuple[list[bool], str]]:
+        self.races += 1
+        stop = threading.Event()
+        results: queue.Queue = queue.Queue()
+
+        def run(config: str) -> None:
+            try:
+                results.put((config, VerifytaBackend.execute(self, system, None, str_connect(verify_options, config, " "), stop), None))
+            except Exception as e:
+                results.put((config, None, e))
+
+        threads = [threading.Thread(target=run, args=(config,), daemon=True) for config in configs]
+        for thread in threads:
+            thread.start()
+
+        errors = []
+        try:
+            for _ in threads:
+                config, result, error = results.get()
+                if error is None:
+                    return config, result
+                errors.append(error)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        unknown = [error for error in errors if isinstance(error, VerificationUnknown)]
+        raise unknown[0] if len(unknown) > 0 else errors[0]
+
+    def record(self, timings: dict[str, float], invocation: Invocation) -> None:
+        with self.lock:
+            super().record(timings, invocation)
+
+    def report(self) -> str:
+        res = super().report().replace("Verifyta backend", "Portfolio backend", 1) + f", {self.races} races"
+        for family in [family for family in self.wins if len(self.wins[family]) > 0]:
+            wins = ", ".join(f"\"{config or 'defaults'}\" {count}" for (config, count) in sorted(self.wins[family].items(), key=lambda item: -item[1]))
+            res += f"\n- wins for {family}: {wins}"
+        return res
+
+
+def verify_selector_system(verifier: PyUppaalBackend | VerifytaBackend, family: SystemFamily) -> list[bool]:
+    verdicts = verifier.verify(family.selector_system())
+    if len(verdicts) != len(family):
+        raise Exception("Verification of the family returned " + str(len(verdicts)) + " verdicts for " + str(len(family)) + " members")
+    return verdicts
+
+
+backend: PyUppaalBackend | VerifytaBackend | zg.ZoneGraphBackend = PyUppaalBackend()
+
+def set_backend(new_backend: PyUppaalBackend | VerifytaBackend | zg.ZoneGraphBackend) -> None:
+    global backend
+    backend = new_backend
+
+def get_backend() -> PyUppaalBackend | VerifytaBackend | zg.ZoneGraphBackend:
+    return backend
@@ -8,7 +8,7 @@ import os
 current = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(current)
 
-from typing import NewType
+from typing import Callable, NewType
 import ta_structs as ta 
 import re
 
@@ -101,6 +101,26 @@ def parse_cause(input: str) -> DelayCause | TimestampCause:
 
     raise Exception("Syntax error in cause that was tried to be parsed!")     
 
+def parse_causes_from_file (file_path: str) -> list[DelayCause] | list[TimestampCause]: 
+    #open text file in read mode
+    file = open(file_path, "r")
+ 
+    #read whole file to a string
+    data = file.read()
+    
+    #close file
+    file.close()
+
+    return parse_causes(data)
+
+
+# Several sets of events, each starting with "Delay cause:" or "Timestamp cause:"
+def parse_causes(input: str) -> list[DelayCause] | list[TimestampCause]:
+
+    trace_str = re.sub('(?m)^ *//.*\n?', '', input).replace("\n", "")
+
+    return [parse_cause(cause_str) for cause_str in re.findall('(?:Delay|Timestamp) cause:.*?(?=(?:Delay|Timestamp) cause:|$)', trace_str)]
+
 def parse_raw_cause(input: str) -> tuple[list[tuple[int, int]], list[ActionEvent]]:
     time_events = []
     action_events = []
@@ -116,95 +136,176 @@ def parse_raw_cause(input: str) -> tuple[list[tuple[int, int]], list[ActionEvent
 
 # Configuration class, implementing the necessary functionalities to reconstruct a run from its corresponding trace
 
+# Configurations keep the values of the clocks in a list in the order of the clocks, guards and updates are compiled for
+# this list (see ClockGuard and ClockUpdate) and kept by the transitions (see ta_structs.Transition.compiled)
+
 class Configuration: 
 
     def __init__(self, location: int, clocks: list[str]):
 
         self.location = location
-
-        self.clock_assignment: dict[str, int] = {}
-
-        for clock in clocks:
-            self.clock_assignment[clock] = 0
+        self.clocks = tuple(clocks)
+        self.values = [0] * len(self.clocks)
 
 
     def __repr__(self) -> str:
 
         return "Cofinguration:\nLocation: " + str(self.location) + "\nClock Assignment: " + self.clock_assignment.__str__()
 
-    def update_clocks(self, expression: str | None) -> None:
-        
-        if expression is None:
-            return
+    @property
+    def clock_assignment(self) -> dict[str, int]:
+        return dict(zip(self.clocks, self.values))
 
-        assignments = expression.replace(' ', '').replace('\n', '').split(",") 
-        for exp in assignments:
-            exp_split = exp.split(':=')
-            
-            if len(exp_split) != 2:
-                raise Exception("Invalid Expression in Update")
-            
-            if exp_split[0] in self.clock_assignment:
-                self.clock_assignment[exp_split[0]] = int(exp_split[1])
-            else: 
-                raise Exception("Non existing clock is tried to be updated")
+    def copy(self) -> Configuration:
+        res = Configuration(self.location, [])
+        res.clocks = self.clocks
+        res.values = list(self.values)
+        return res
+
+    def update_clocks(self, expression: str | None) -> None:
+        ClockUpdate(expression, self.clocks).apply(self.values)
 
     def delay(self, delay: int) -> None:
-        
-        for key in self.clock_assignment:    
-            self.clock_assignment[key] = self.clock_assignment[key] + delay
+        self.values = [value + delay for value in self.values]
 
     def satisfies(self, guard: str | None) -> bool:
-
-        if guard is None:
-            return True
-
-        simple_conditions = guard.replace(' ', '').split('&&')
-        
-        for cond in simple_conditions:
-            if not self.satisfies_simple_condition(cond): 
-                return False
-
-        return True
-    
-    def satisfies_simple_condition(self, condition: str) -> bool:
-        
-        if '==' in condition:
-            cond_split = condition.split('==')
-            if cond_split[0] in self.clock_assignment:
-                return self.clock_assignment[cond_split[0]] == int(cond_split[1])
-            
-        elif '<=' in condition:
-            cond_split = condition.split('<=')
-            if cond_split[0] in self.clock_assignment:
-                return self.clock_assignment[cond_split[0]] <= int(cond_split[1])
-            
-        elif '>=' in condition:
-            cond_split = condition.split('>=')
-            if cond_split[0] in self.clock_assignment:
-                return self.clock_assignment[cond_split[0]] >= int(cond_split[1])
-        
-        elif '<' in condition:
-            cond_split = condition.split('<')
-            if cond_split[0] in self.clock_assignment:
-                return self.clock_assignment[cond_split[0]] < int(cond_split[1])
-            
-        elif '>' in condition:
-            cond_split = condition.split('>')
-            if cond_split[0] in self.clock_assignment:
-                return self.clock_assignment[cond_split[0]] > int(cond_split[1])
+        return ClockGuard(guard, self.clocks).holds(self.values)
   
     def setter_expression(self):
-        if len(self.clock_assignment) == 0:
+        if len(self.clocks) == 0:
             return None
         
         res = ""
-        for key in self.clock_assignment:
-            res += ",\n" + key + " := " + str(self.clock_assignment[key]) 
+        for (key, value) in self.clock_assignment.items():
+            res += ",\n" + key + " := " + str(value) 
 
         return res[2:]   
 
 
+# Guard of a transition as conjunction of comparisons of clocks with constants. Conditions on anything else than a clock are
+# never satisfied; conditions with a malformed constant raise their error only once they are evaluated. Compiled guards
+# and updates are evaluated repeatedly, they keep the messages of their errors and raise a new error each time.
+
+GUARD_OPERATORS = ("==", "<=", ">=", "<", ">")
+
+class ClockGuard:
+
+    def __init__(self, guard: str | None, clocks: tuple[str, ...]):
+
+        self.conditions: list[tuple[int, str, int] | str | None] = []
+        if guard is None:
+            return
+
+        clock_index = {clock: index for (index, clock) in enumerate(clocks)}
+        for condition in guard.replace(' ', '').split('&&'):
+            self.conditions.append(compile_condition(condition, clock_index))
+
+    def __repr__(self) -> str:
+        return f"ClockGuard(conditions: {self.conditions})"
+
+    def holds(self, values: list[int]) -> bool:
+        for condition in self.conditions:
+            if condition is None:
+                return False
+            if isinstance(condition, str):
+                raise ValueError(condition)
+            (clock, operator, constant) = condition
+            value = values[clock]
+            match operator:
+                case "==": satisfied = value == constant
+                case "<=": satisfied = value <= constant
+                case ">=": satisfied = value >= constant
+                case "<": satisfied = value < constant
+                case _: satisfied = value > constant
+            if not satisfied:
+                return False
+        return True
+
+# Condition as (index of the clock, operator, constant), the first operator contained in the condition is used. A
+# malformed constant gives the message of its error.
+def compile_condition(condition: str, clock_index: dict[str, int]) -> tuple[int, str, int] | str | None:
+    for operator in GUARD_OPERATORS:
+        if operator in condition:
+            cond_split = condition.split(operator)
+            if cond_split[0] not in clock_index:
+                return None
+            try:
+                return (clock_index[cond_split[0]], operator, int(cond_split[1]))
+            except ValueError as error:
+                return str(error)
+    return None
+
+
+# Update of a transition as assignments of constants to clocks. The assignments before a malformed one are applied
+# before its error is raised.
+
+class ClockUpdate:
+
+    def __init__(self, expression: str | None, clocks: tuple[str, ...]):
+
+        self.assignments: list[tuple[int, int]] = []
+        self.error: tuple[type[Exception], str] | None = None
+        if expression is None:
+            return
+
+        clock_index = {clock: index for (index, clock) in enumerate(clocks)}
+        for exp in expression.replace(' ', '').replace('\n', '').split(","):
+            exp_split = exp.split(':=')
+            if len(exp_split) != 2:
+                self.error = (Exception, "Invalid Expression in Update")
+                return
+            if exp_split[0] not in clock_index:
+                self.error = (Exception, "Non existing clock is tried to be updated")
+                return
+            try:
+                self.assignments.append((clock_index[exp_split[0]], int(exp_split[1])))
+            except ValueError as error:
+                self.error = (ValueError, str(error))
+                return
+
+    def __repr__(self) -> str:
+        return f"ClockUpdate(assignments: {self.assignments}, error: {self.error})"
+
+    def apply(self, values: list[int]) -> None:
+        for (clock, value) in self.assignments:
+            values[clock] = value
+        if self.error is not None:
+            raise self.error[0](self.error[1])
+
+
+# Positions of the time (delay or timestamp) and action events of a trace left unchanged by a counterfactual run, the
+# witness of a CF-check (see ta_structs.System.verify_witness) with the values of the clock of the counterfactual automaton
+# and the actions at its transitions. Step k of the run passes position(k) of the trace, None once the final location of
+# the counterfactual automaton is reached. A run stopping early leaves all later events unchanged, except for the time
+# of its next step, which is only unchanged if the run stops before the original time (of an E<> query).
+def unchanged_positions(times: list[int], actions: list[str], witness: DelayTrace | DelayTraceLasso, position: Callable[[int], int | None]) -> tuple[list[int], list[int]]:
+
+    if isinstance(witness, DelayTraceLasso):
+        steps = list(zip(witness.delays_pre + witness.delays_lasso, witness.actions_pre + witness.actions_lasso))
+        stop = None
+    else:
+        steps = list(zip(witness.delays, witness.actions))
+        stop = witness.delays[-1] if witness.number_delays > witness.number_actions else None
+
+    changed_times = set()
+    changed_actions = set()
+    for (k, (value, action)) in enumerate(steps, 1):
+        p = position(k)
+        if p is None:
+            break
+        if value != times[p-1]:
+            changed_times.add(p)
+        if p <= len(actions) and action != actions[p-1]:
+            changed_actions.add(p)
+    else:
+        p = position(len(steps) + 1)
+        if not isinstance(witness, DelayTraceLasso) and p is not None and (stop is None or stop > times[p-1]):
+            changed_times.add(p)
+
+    return ([p for p in range(1, len(times) + 1) if p not in changed_times],
+            [p for p in range(1, len(actions) + 1) if p not in changed_actions])
+
+
 # Data structures representing the different kinds of traces. Classes also include functionality to construct counterfactual trace automata.       
 
 class DelayTrace:
@@ -278,6 +379,11 @@ class DelayTrace:
         return DelayCause(delay_events, action_events)  
 
 
+    def unchanged_events(self, witness: DelayTrace | DelayTraceLasso) -> DelayCause:
+        delay_positions, action_positions = unchanged_positions(self.delays, self.actions, witness, lambda k: k if k <= self.number_delays else None)
+        return DelayCause([(self.delays[p-1], p) for p in delay_positions], [(self.actions[p-1], p) for p in action_positions])
+
+
     def cf_automaton(self, cause: DelayCause, all_actions: list[str], infinite_cf: bool = True, node_dist: int = 400) -> ta.Template:
 
         max_id = -1
@@ -394,6 +500,15 @@ class DelayTraceLasso:
         return DelayCause(delay_events, action_events)  
     
 
+    # Steps of a run after the last position continue at the first position of the lasso part
+    def unchanged_events(self, witness: DelayTrace | DelayTraceLasso) -> DelayCause:
+        delays = self.delays_pre + self.delays_lasso
+        actions = self.actions_pre + self.actions_lasso
+        position = lambda k: k if k <= len(delays) else self.length_pre + (k - self.length_pre - 1) % self.length_lasso + 1
+        delay_positions, action_positions = unchanged_positions(delays, actions, witness, position)
+        return DelayCause([(delays[p-1], p) for p in delay_positions], [(actions[p-1], p) for p in action_positions])
+
+
     def cf_automaton(self, cause: DelayCause, all_actions: list[str], node_dist: int = 400) -> ta.Template:
 
         max_id = -1
@@ -512,6 +627,12 @@ class TimestampTrace:
             action_events.append((self.actions[i], i+1))
 
         return DelayCause(timestamp_events, action_events)  
+
+
+    # The values of the witness are those of the global clock t, i.e., timestamps
+    def unchanged_events(self, witness: DelayTrace | DelayTraceLasso) -> TimestampCause:
+        timestamp_positions, action_positions = unchanged_positions(self.timestamps, self.actions, witness, lambda k: k if k <= self.number_timestamps else None)
+        return TimestampCause([(self.timestamps[p-1], p) for p in timestamp_positions], [(self.actions[p-1], p) for p in action_positions])
     
 
     #Remark for a possible extension to networks: for non networks, it would be sufficient to only use output actions here --> further arguemnt of cf_automaton
@@ -580,6 +701,10 @@ class DelayCause:
         return "Delay cause: {" + res + "}"
 
 
+    def size (self) -> int:
+        return len(self.delay_events) + len(self.action_events)
+
+
     def get_subsets (self) -> list[DelayCause]:
         
         res = []
@@ -634,6 +759,9 @@ class TimestampCause:
         
         return "Timestamp cause: {" + res + "}"
     
+    def size (self) -> int:
+        return len(self.timestamp_events) + len(self.action_events)
+
     def get_subsets (self) -> list[TimestampCause]:
         
         res = []
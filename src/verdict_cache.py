@@ -0,0 +1,217 @@
+# Cache for model checking verdicts. Generated models are identified by a canonical hash of their
+# serialised form (declarations, templates, system line) together with the checked queries, such that
+# structurally identical models are verified only once. The hash also covers the verification options
+# and the backend (with the version of verifyta), verdicts of other model checkers are not reused.
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections import OrderedDict
+
+
+def model_hash(model: str, queries: list[str], verify_options: str | None = None, backend: str | None = None) -> str:
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    for query in queries:
+        digest.update(b"\0query\0")
+        digest.update(query.strip().encode("utf-8"))
+    digest.update(b"\0options\0")
+    digest.update((verify_options or "").strip().encode("utf-8"))
+    digest.update(b"\0backend\0")
+    digest.update((backend or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+STORE_FILE_NAME = "verdicts.sqlite"
+
+def default_cache_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".cache", "rt-causality")
+
+
+# Persistent verdict store in a single SQLite file, shared between runs of the tool and between worker processes.
+# Every process opens its own connection (also after a fork), concurrent access is serialised by SQLite's
+# write-ahead log and busy timeout.
+
+class VerdictStore:
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.connection()
+
+    @classmethod
+    def in_directory(cls, cache_dir: str) -> VerdictStore:
+        return cls(os.path.join(cache_dir, STORE_FILE_NAME))
+
+    def __repr__(self) -> str:
+        return f"VerdictStore(path: {self.path}, hits: {self.hits}, misses: {self.misses}, writes: {self.writes})"
+
+    # Connections must not be shared with forked or spawned worker processes
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS portfolio_wins (family TEXT NOT NULL, config TEXT NOT NULL, wins INTEGER NOT NULL, PRIMARY KEY (family, config))")
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+    def __len__(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def get(self, key: str) -> bool | None:
+        row = self.connection().execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bool(row[0])
+
+    def put(self, key: str, verdict: bool) -> None:
+        self.connection().execute("INSERT OR REPLACE INTO verdicts (key, verdict) VALUES (?, ?)", (key, int(verdict)))
+        self.writes += 1
+
+    # Races won by each configuration of the portfolio backend for the given model family
+    def wins(self, family: str) -> dict[str, int]:
+        rows = self.connection().execute("SELECT config, wins FROM portfolio_wins WHERE family = ?", (family,)).fetchall()
+        return {config: wins for (config, wins) in rows}
+
+    def add_win(self, family: str, config: str) -> None:
+        self.connection().execute("INSERT INTO portfolio_wins (family, config, wins) VALUES (?, ?, 1) "
+                                  "ON CONFLICT (family, config) DO UPDATE SET wins = wins + 1", (family, config))
+
+    # Writes a consistent snapshot of the store into one self-contained SQLite file
+    def export_to(self, file_path: str) -> None:
+        target_dir = os.path.dirname(os.path.abspath(file_path))
+        fd, tmp_path = tempfile.mkstemp(suffix=".sqlite", dir=target_dir)
+        os.close(fd)
+        target = sqlite3.connect(tmp_path)
+        try:
+            self.connection().backup(target)
+        finally:
+            target.close()
+        shutil.move(tmp_path, file_path)
+
+    # Merges the verdicts of an exported store into this store, returns the number of verdicts read
+    def import_from(self, file_path: str) -> int:
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError("Verdict store to import does not exist: " + file_path)
+        source = sqlite3.connect(file_path)
+        try:
+            rows = source.execute("SELECT key, verdict FROM verdicts").fetchall()
+        finally:
+            source.close()
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("INSERT OR REPLACE INTO verdicts (key, verdict) VALUES (?, ?)", rows)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+
+# In-memory verdict cache with a size bound and least-recently-used eviction, optionally backed by a persistent store
+
+class VerdictCache:
+
+    def __init__(self, max_size: int = 4096, store: VerdictStore | None = None):
+        assert max_size > 0, "The verdict cache must be able to hold at least one verdict."
+
+        self.max_size = max_size
+        self.store = store
+        self.verdicts: OrderedDict[str, bool] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.journal: list[tuple[str, bool]] | None = None
+
+    def __repr__(self) -> str:
+        return f"VerdictCache(size: {len(self.verdicts)}/{self.max_size}, hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions}, store: {self.store})"
+
+    def __len__(self) -> int:
+        return len(self.verdicts)
+
+    def get(self, key: str) -> bool | None:
+        verdict = self.verdicts.get(key)
+        if verdict is None and self.store is not None:
+            verdict = self.store.get(key)
+            if verdict is not None:
+                self.remember(key, verdict)
+        if verdict is None:
+            self.misses += 1
+            return None
+        self.verdicts.move_to_end(key)
+        self.hits += 1
+        return verdict
+
+    def put(self, key: str, verdict: bool) -> None:
+        self.remember(key, verdict)
+        if self.store is not None:
+            self.store.put(key, verdict)
+        if self.journal is not None:
+            self.journal.append((key, verdict))
+
+    def remember(self, key: str, verdict: bool) -> None:
+        self.verdicts[key] = verdict
+        self.verdicts.move_to_end(key)
+        while len(self.verdicts) > self.max_size:
+            self.verdicts.popitem(last=False)
+            self.evictions += 1
+
+    # Journal of the verdicts put from now on, such that a worker process can hand its new verdicts to its parent
+    def keep_journal(self) -> None:
+        self.journal = []
+
+    def take_journal(self) -> list[tuple[str, bool]]:
+        journal = self.journal or []
+        self.journal = None
+        return journal
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def clear(self) -> None:
+        self.verdicts.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def report(self) -> str:
+        lookups = self.hits + self.misses
+        res = f"Verdict cache: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate():.1f}% hit rate of {lookups} lookups)"
+        if self.store is not None:
+            res += f"\nPersistent verdict store {self.store.path}: {self.store.hits} hits, {self.store.writes} new verdicts, {len(self.store)} verdicts stored"
+        return res
@@ -0,0 +1,83 @@
+# Workspace for the models generated during cause checking and computation. All generated models of a run are written to
+# one scratch directory (on tmpfs if available) under unique names, such that concurrent checks never share files. Each
+# model is removed once its verification is done, the directory at the end of the run.
+
+from __future__ import annotations
+
+import atexit
+import itertools
+import os
+import shutil
+import tempfile
+
+TMPFS_DIR = "/dev/shm"
+
+
+def default_root() -> str:
+    if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK | os.X_OK):
+        return TMPFS_DIR
+    return tempfile.gettempdir()
+
+
+class Workspace:
+
+    def __init__(self, root: str = None, keep: bool = False):
+
+        if root is None:
+            root = default_root()
+        elif not os.path.exists(root):
+            os.makedirs(root)
+
+        self.directory = tempfile.mkdtemp(prefix="rt-causality-", dir=root)
+        self.keep = keep
+        self.owner = os.getpid()
+        self.counter = itertools.count()
+
+        atexit.register(self.cleanup)
+
+    def __repr__(self) -> str:
+        return f"Workspace(directory: {self.directory}, keep: {self.keep})"
+
+    # Worker processes use the directory of their parent, only the creating process removes it
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["counter"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.counter = itertools.count()
+
+    # Unique path in the workspace for a model that would otherwise be written to model_path
+    def model_path(self, model_path: str) -> str:
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        return os.path.join(self.directory, name + "_" + str(os.getpid()) + "_" + str(next(self.counter)) + ".xml")
+
+    # Removes a model of the workspace once it has been verified, unless generated models are kept
+    def release(self, path: str) -> None:
+        if self.keep:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self) -> None:
+        if self.keep or os.getpid() != self.owner:
+            return
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# Workspace of the current run, created on first use
+
+workspace: Workspace | None = None
+
+def get_workspace() -> Workspace:
+    global workspace
+    if workspace is None:
+        workspace = Workspace()
+    return workspace
+
+def set_workspace(new_workspace: Workspace) -> None:
+    global workspace
+    workspace = new_workspace
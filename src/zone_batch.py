@@ -0,0 +1,428 @@
+# Batched zone graph exploration for families of systems (see ta_structs.SystemFamily), e.g. the counterfactual products of
+# all candidate causes of one level of cause computation. The members of a family are explored in lockstep: every
+# symbolic state holds the zones of all members reaching its discrete part as one NumPy array, such that guards, resets,
+# invariants, delays, extrapolation and canonicalisation are applied to all members at once. Verdicts are the same as
+# those of the zone graph engine (zone_graph.py) for every member on its own.
+#
+# NumPy is optional, without it families are verified member by member.
+
+from __future__ import annotations
+
+import time
+from collections import deque
+
+import ta_structs as ta
+import zone_graph as zg
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def available() -> bool:
+    return np is not None
+
+
+# DBM operations on arrays of zones with shape (members, dim, dim), bounds encoded as in zone_graph
+
+def add_bounds(b1: np.ndarray, b2: np.ndarray) -> np.ndarray:
+    res = (((b1 >> 1) + (b2 >> 1)) << 1) | (b1 & b2 & 1)
+    return np.where((b1 == zg.INF) | (b2 == zg.INF), zg.INF, res)
+
+# Floyd-Warshall closure of all zones, returns the closed zones and which of them are non-empty
+def close(zones: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    dim = zones.shape[1]
+    for k in range(dim):
+        zones = np.minimum(zones, add_bounds(zones[:, :, k:k+1], zones[:, k:k+1, :]))
+    diagonal = zones[:, np.arange(dim), np.arange(dim)]
+    return zones, np.all(diagonal >= zg.LE_ZERO, axis=1)
+
+def up(zones: np.ndarray) -> None:
+    zones[:, 1:, 0] = zg.INF
+
+def down(zones: np.ndarray) -> None:
+    lower = np.minimum(zones[:, 1:, 1:].min(axis=1), zg.LE_ZERO)
+    zones[:, 0, 1:] = lower
+
+def reset(zones: np.ndarray, x: int, value: int) -> None:
+    row = add_bounds(np.full_like(zones[:, 0, :], zg.bound(value, False)), zones[:, 0, :])
+    column = add_bounds(zones[:, :, 0], np.full_like(zones[:, :, 0], zg.bound(-value, False)))
+    zones[:, x, :] = row
+    zones[:, :, x] = column
+    zones[:, x, x] = zg.LE_ZERO
+
+def extrapolate(zones: np.ndarray, max_constants: list[int]) -> np.ndarray:
+    dim = zones.shape[1]
+    upper = np.array([zg.INF] + [zg.bound(m, False) for m in max_constants[1:]], dtype=np.int64)
+    lower = np.array([-zg.INF] + [zg.bound(-m, True) for m in max_constants[1:]], dtype=np.int64)
+    off_diagonal = ~np.eye(dim, dtype=bool)
+    finite = (zones != zg.INF) & off_diagonal
+    above = finite & (zones > upper[None, :, None])
+    below = finite & ~above & (zones < lower[None, None, :])
+    if not above.any() and not below.any():
+        return zones
+    zones = np.where(above, zg.INF, zones)
+    zones = np.where(below, np.broadcast_to(lower[None, None, :], zones.shape), zones)
+    return close(zones)[0]
+
+
+# Clock constraints of one edge or location for all members of a family. Members that do not have the edge are disabled,
+# all members must agree on the conditions on variables.
+
+class ConstraintBatch:
+
+    def __init__(self, constraints: list[zg.Constraint | None], dim: int):
+        present = [constraint for constraint in constraints if constraint is not None]
+        if any(constraint.conditions != present[0].conditions for constraint in present):
+            raise zg.UnsupportedModel("Members of the family differ in conditions on variables")
+        self.constraints = constraints
+        self.dim = dim
+        self.enabled = np.array([constraint is not None for constraint in constraints], dtype=bool)
+        self.conditions = present[0] if len(present) > 0 else None
+        self.matrices: dict[tuple[int, ...], np.ndarray] = {}
+
+    def holds(self, env: dict) -> bool:
+        return self.conditions is None or self.conditions.holds(env)
+
+    def matrix(self, values: tuple[int, ...], env: dict) -> np.ndarray:
+        if values not in self.matrices:
+            res = np.full((len(self.constraints), self.dim, self.dim), zg.INF, dtype=np.int64)
+            for (k, constraint) in enumerate(self.constraints):
+                if constraint is None:
+                    continue
+                for (i, j, b) in constraint.bounds(env):
+                    res[k, i, j] = min(res[k, i, j], b)
+            self.matrices[values] = res
+        return self.matrices[values]
+
+
+# Symbolic state of a batch: locations, variable values, zones of the members in it and the indices of these members
+BatchState = tuple[tuple[int, ...], tuple[int, ...], np.ndarray, np.ndarray]
+
+class BatchZoneGraph(zg.ZoneGraph):
+
+    def __init__(self, family: ta.SystemFamily):
+        if np is None:
+            raise zg.UnsupportedModel("Batched verification needs numpy")
+        super().__init__(family.system)
+
+        self.family = family
+        self.size = len(family)
+        self.family_process = next(p for (p, process) in enumerate(self.processes) if process.template is family.system.templates[0])
+        self.edge_indices = {id(edge): i for (i, edge) in enumerate(self.processes[self.family_process].edges)}
+        self.guard_batches: dict[int, ConstraintBatch] = {}
+        self.invariant_batches: dict[tuple[int, int], ConstraintBatch] = {}
+        self.invariant_matrices: dict[tuple, np.ndarray] = {}
+
+        # constants of all members, not only of the union of the family (guards and invariants of the family system are
+        # conjunctions of those of the base system and of the variants)
+        for variant in family.variants:
+            for trans in variant.transitions:
+                self.labels.constraint(trans.guard)
+            for loc in variant.locations:
+                self.labels.constraint(loc.inv)
+        self.max_constants = self.compute_max_constants()
+
+    def guard_batch(self, p: int, edge: zg.Edge) -> ConstraintBatch:
+        if id(edge) not in self.guard_batches:
+            if p == self.family_process:
+                i = self.edge_indices[id(edge)]
+                constraints = [self.labels.constraint(self.family.guard(k, i)) if self.family.is_enabled(k, i) else None for k in range(self.size)]
+            else:
+                constraints = [edge.guard] * self.size
+            self.guard_batches[id(edge)] = ConstraintBatch(constraints, self.dim)
+        return self.guard_batches[id(edge)]
+
+    def invariant_batch(self, p: int, location: int) -> ConstraintBatch:
+        if (p, location) not in self.invariant_batches:
+            if p == self.family_process:
+                constraints = [self.labels.constraint(self.family.invariant(k, location)) for k in range(self.size)]
+            else:
+                constraints = [self.processes[p].invariants[location]] * self.size
+            self.invariant_batches[(p, location)] = ConstraintBatch(constraints, self.dim)
+        return self.invariant_batches[(p, location)]
+
+    def invariant_matrix(self, locations: tuple[int, ...], values: tuple[int, ...], env: dict) -> np.ndarray:
+        key = (locations, values)
+        if key not in self.invariant_matrices:
+            res = np.full((self.size, self.dim, self.dim), zg.INF, dtype=np.int64)
+            for p in range(len(self.processes)):
+                res = np.minimum(res, self.invariant_batch(p, locations[p]).matrix(values, env))
+            self.invariant_matrices[key] = res
+        return self.invariant_matrices[key]
+
+    # Conditions on variables of the invariants, equal for all members
+    def invariants_hold(self, locations: tuple[int, ...], env: dict) -> bool:
+        return all(self.invariant_batch(p, locations[p]).holds(env) for p in range(len(self.processes)))
+
+    def constrain_batch(self, zones: np.ndarray, members: np.ndarray, matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        zones, nonempty = close(np.minimum(zones, matrix[members]))
+        return zones[nonempty], members[nonempty]
+
+    def delay_batch(self, zones: np.ndarray, members: np.ndarray, locations: tuple[int, ...], values: tuple[int, ...], env: dict) -> tuple[np.ndarray, np.ndarray]:
+        if not self.is_committed(locations):
+            up(zones)
+            zones, members = self.constrain_batch(zones, members, self.invariant_matrix(locations, values, env))
+        return extrapolate(zones, self.max_constants), members
+
+    def initial_batch(self) -> BatchState | None:
+        locations = tuple(process.init for process in self.processes)
+        values = tuple(self.declarations.initial)
+        env = self.environment(values)
+        if not self.invariants_hold(locations, env):
+            return None
+        zones = np.full((self.size, self.dim, self.dim), zg.LE_ZERO, dtype=np.int64)
+        zones, members = self.constrain_batch(zones, np.arange(self.size), self.invariant_matrix(locations, values, env))
+        zones, members = self.delay_batch(zones, members, locations, values, env)
+        if len(members) == 0:
+            return None
+        return (locations, values, zones, members)
+
+    def guard_batch_zones(self, zones: np.ndarray, members: np.ndarray, values: tuple[int, ...], env: dict, combination: tuple[tuple[int, zg.Edge], ...]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        enabled = np.ones(len(members), dtype=bool)
+        for (p, edge) in combination:
+            batch = self.guard_batch(p, edge)
+            if not batch.holds(env):
+                enabled[:] = False
+            enabled &= batch.enabled[members]
+            zones = np.minimum(zones, batch.matrix(values, env)[members])
+        zones, nonempty = close(zones[enabled])
+        rows = np.flatnonzero(enabled)[nonempty]
+        return zones[nonempty], members[rows], rows
+
+    def successors_batch(self, state: BatchState) -> list[BatchState]:
+        locations, values, zones, members = state
+        env = self.environment(values)
+        res = []
+        for combination in self.transitions(locations, env):
+            succ_zones, succ_members, rows = self.guard_batch_zones(zones, members, values, env, combination)
+            if len(succ_members) == 0:
+                continue
+            new_locations, new_values, resets, new_env = self.fire(locations, env, combination)
+            if not self.invariants_hold(new_locations, new_env):
+                continue
+            for (x, value) in resets:
+                reset(succ_zones, x, value)
+            succ_zones, succ_members = self.constrain_batch(succ_zones, succ_members, self.invariant_matrix(new_locations, new_values, new_env))
+            succ_zones, succ_members = self.delay_batch(succ_zones, succ_members, new_locations, new_values, new_env)
+            if len(succ_members) > 0:
+                res.append((new_locations, new_values, succ_zones, succ_members))
+        return res
+
+    # Zones of the members from which the combination can be taken (possibly after a delay), see ZoneGraph.enabling_zone
+    def enabling_batch(self, state: BatchState, env: dict, combination: tuple[tuple[int, zg.Edge], ...]) -> tuple[np.ndarray, np.ndarray]:
+        locations, values, zones, members = state
+        enabled_zones, enabled_members, rows = self.guard_batch_zones(zones, members, values, env, combination)
+        new_locations, new_values, resets, new_env = self.fire(locations, env, combination)
+        if len(rows) == 0 or not self.invariants_hold(new_locations, new_env):
+            return enabled_zones[:0], rows[:0]
+
+        # invariants are diagonal-free, constraints on reset clocks are decided by the value they are set to
+        invariants = self.invariant_matrix(new_locations, new_values, new_env)[enabled_members].copy()
+        satisfied = np.ones(len(rows), dtype=bool)
+        for (x, value) in dict(resets).items():
+            satisfied &= (zg.bound(value, False) <= invariants[:, x, 0]) & (zg.bound(-value, False) <= invariants[:, 0, x])
+            invariants[:, x, :] = zg.INF
+            invariants[:, :, x] = zg.INF
+        enabled_zones, nonempty = close(np.minimum(enabled_zones, invariants))
+        keep = satisfied & nonempty
+        enabled_zones, rows = enabled_zones[keep], rows[keep]
+
+        if not self.is_committed(locations):
+            down(enabled_zones)
+            enabled_zones = close(enabled_zones)[0]
+            enabled_zones, nonempty = close(np.minimum(enabled_zones, zones[rows]))
+            enabled_zones, rows = enabled_zones[nonempty], rows[nonempty]
+        return enabled_zones, rows
+
+    # Members for which the state ends a maximal path (time can diverge or the zone contains a deadlock)
+    def maximal_batch(self, state: BatchState) -> np.ndarray:
+        locations, values, zones, members = state
+        if self.is_committed(locations):
+            res = np.zeros(len(members), dtype=bool)
+        else:
+            res = np.all(zones[:, 1:, 0] == zg.INF, axis=1)
+
+        remaining = {row: [zones[row].ravel().tolist()] for row in np.flatnonzero(~res)}
+        env = self.environment(values)
+        for combination in self.transitions(locations, env):
+            if len(remaining) == 0:
+                break
+            enabled_zones, rows = self.enabling_batch(state, env, combination)
+            for (enabled_zone, row) in zip(enabled_zones, rows):
+                if row not in remaining:
+                    continue
+                enabled = enabled_zone.ravel().tolist()
+                remaining[row] = [piece for part in remaining[row] for piece in zg.subtract(part, enabled, self.dim)]
+                if len(remaining[row]) == 0:
+                    del remaining[row]
+        for row in remaining:
+            res[row] = True
+        return res
+
+    def holds_batch(self, formula: tuple, state: BatchState) -> bool:
+        return bool(zg.evaluate(formula, self.environment(state[1]), state[0]))
+
+    def check_family(self, query: str) -> np.ndarray:
+        query = query.strip()
+        quantifier = query[0:3]
+        if quantifier not in ("E<>", "A[]", "E[]", "A<>") or "-->" in query:
+            raise zg.UnsupportedModel("Unsupported query: " + query)
+        formula = self.resolve(zg.parse_expression(query[3:]))
+        negation = ("unary", "!", formula)
+        match quantifier:
+            case "E<>":
+                return self.exists_eventually_batch(formula)
+            case "A[]":
+                return ~self.exists_eventually_batch(negation)
+            case "E[]":
+                return self.exists_always_batch(formula)
+            case "A<>":
+                return ~self.exists_always_batch(negation)
+
+    # Reachability with inclusion checking, per member and discrete state
+    def exists_eventually_batch(self, formula: tuple) -> np.ndarray:
+        found = np.zeros(self.size, dtype=bool)
+        init = self.initial_batch()
+        if init is None:
+            return found
+
+        passed: dict[tuple, dict[int, np.ndarray]] = {}
+        self.store(passed, init, np.ones(len(init[3]), dtype=bool))
+        waiting = deque([init])
+        while len(waiting) > 0:
+            locations, values, zones, members = waiting.popleft()
+            undecided = ~found[members]
+            if not undecided.any():
+                continue
+            state = (locations, values, zones[undecided], members[undecided])
+            self.explored(len(state[3]))
+            if self.holds_batch(formula, state):
+                found[state[3]] = True
+                continue
+            for successor in self.successors_batch(state):
+                new = np.array([not found[member] for member in successor[3]], dtype=bool)
+                new &= self.store(passed, successor, new)
+                if new.any():
+                    waiting.append((successor[0], successor[1], successor[2][new], successor[3][new]))
+        return found
+
+    # Stores the zones of the state that are not included in a stored zone of their member, returns which were stored
+    def store(self, passed: dict[tuple, dict[int, np.ndarray]], state: BatchState, candidates: np.ndarray) -> np.ndarray:
+        locations, values, zones, members = state
+        stored = passed.setdefault((locations, values), {})
+        res = np.zeros(len(members), dtype=bool)
+        for row in np.flatnonzero(candidates):
+            zone = zones[row].ravel()
+            member_zones = stored.get(members[row])
+            if member_zones is not None and np.any(np.all(zone <= member_zones, axis=1)):
+                continue
+            stored[members[row]] = zone[None, :] if member_zones is None else np.vstack((member_zones, zone))
+            res[row] = True
+        return res
+
+    # Search for maximal paths on which the formula always holds: the zone graphs of the members restricted to formula states
+    # are built in lockstep, a member is decided once it reaches a state ending a maximal path, otherwise by a cycle check
+    def exists_always_batch(self, formula: tuple) -> np.ndarray:
+        res = np.zeros(self.size, dtype=bool)
+        init = self.initial_batch()
+        if init is None or not self.holds_batch(formula, init):
+            return res
+
+        ids: dict[tuple, int] = {}
+        nodes: dict[int, list[int]] = {}
+        edges: dict[int, list[tuple[int, int]]] = {}
+
+        def add_nodes(state: BatchState) -> tuple[BatchState, list[int]]:
+            locations, values, zones, members = state
+            new = np.zeros(len(members), dtype=bool)
+            node_ids = []
+            for row in range(len(members)):
+                key = (members[row], locations, values, zones[row].tobytes())
+                if key not in ids:
+                    ids[key] = len(ids)
+                    nodes.setdefault(members[row], []).append(ids[key])
+                    new[row] = True
+                node_ids.append(ids[key])
+            new_state = (locations, values, zones[new], members[new])
+            self.explored(int(new.sum()))
+            res[new_state[3][self.maximal_batch(new_state)]] = True
+            return new_state, node_ids
+
+        init, init_ids = add_nodes(init)
+        waiting = deque([(init, init_ids)])
+        while len(waiting) > 0:
+            (locations, values, zones, members), node_ids = waiting.popleft()
+            undecided = ~res[members]
+            if not undecided.any():
+                continue
+            state = (locations, values, zones[undecided], members[undecided])
+            source_ids = dict(zip(members[undecided], np.array(node_ids)[undecided]))
+            for successor in self.successors_batch(state):
+                if not self.holds_batch(formula, successor):
+                    continue
+                keep = ~res[successor[3]]
+                successor = (successor[0], successor[1], successor[2][keep], successor[3][keep])
+                if len(successor[3]) == 0:
+                    continue
+                successor_ids = [ids.get((member, successor[0], successor[1], zone.tobytes())) for (member, zone) in zip(successor[3], successor[2])]
+                for (member, target) in zip(successor[3], successor_ids):
+                    if target is not None:
+                        edges.setdefault(member, []).append((source_ids[member], target))
+                new_rows = np.array([target is None for target in successor_ids], dtype=bool)
+                if not new_rows.any():
+                    continue
+                new_state, new_ids = add_nodes((successor[0], successor[1], successor[2][new_rows], successor[3][new_rows]))
+                for (member, target) in zip(successor[3][new_rows], new_ids):
+                    edges.setdefault(member, []).append((source_ids[member], target))
+                waiting.append((new_state, new_ids))
+
+        for member in nodes:
+            if not res[member] and has_cycle(nodes[member], edges.get(member, [])):
+                res[member] = True
+        return res
+
+
+# Kahn's algorithm: the graph has a cycle iff not all nodes can be removed in topological order
+def has_cycle(nodes: list[int], edges: list[tuple[int, int]]) -> bool:
+    in_degree = {node: 0 for node in nodes}
+    successors: dict[int, list[int]] = {node: [] for node in nodes}
+    for (source, target) in edges:
+        successors[source].append(target)
+        in_degree[target] += 1
+    ready = [node for node in nodes if in_degree[node] == 0]
+    removed = 0
+    while len(ready) > 0:
+        node = ready.pop()
+        removed += 1
+        for target in successors[node]:
+            in_degree[target] -= 1
+            if in_degree[target] == 0:
+                ready.append(target)
+    return removed < len(nodes)
+
+
+# Zone graph backend verifying families in batches, all other systems are verified as by the zone graph backend
+
+class BatchZoneGraphBackend(zg.ZoneGraphBackend):
+
+    def __init__(self, timeout: float | None = None):
+        super().__init__(timeout)
+        self.families = 0
+
+    def __repr__(self) -> str:
+        return f"BatchZoneGraphBackend(calls: {self.calls}, families: {self.families}, states: {self.states})"
+
+    def verify_family(self, family: ta.SystemFamily) -> list[bool]:
+        graph = BatchZoneGraph(family)
+        if self.timeout is not None:
+            graph.deadline = time.monotonic() + self.timeout
+        verdicts = graph.check_family(family.system.queries[0])
+        self.families += 1
+        self.calls += len(family)
+        self.states += graph.states
+        return [bool(verdict) for verdict in verdicts]
+
+    def report(self) -> str:
+        return f"Zone graph backend: {self.calls} calls ({self.families} batched families), {self.states} symbolic states explored"
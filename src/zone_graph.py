@@ -0,0 +1,1069 @@
+# Native zone graph engine deciding the queries of a system without Uppaal. Clock valuations are represented
+# symbolically by difference bound matrices (DBMs), the reachable zone graph is explored with maximal-constant
+# extrapolation, which is exact for the diagonal-free automata used by the tool.
+#
+# Supported: clocks, binary channels, integer and boolean variables (with ranges), constants and constant arrays,
+# committed locations and queries E<>, A[], E[], A<> over locations and variables.
+
+from __future__ import annotations
+
+import functools
+import re
+import time
+from collections import deque
+from typing import Iterator
+
+import ta_structs as ta
+
+
+class UnsupportedModel(Exception):
+    pass
+
+
+# Difference bound matrices. Entry D[i * dim + j] bounds x_i - x_j with clock 0 being the constant zero, bounds are
+# encoded as integers (c << 1) | 1 for "<= c" and c << 1 for "< c", such that tighter bounds compare smaller.
+
+INF = 1 << 62
+LE_ZERO = 1
+
+def bound(c: int, strict: bool) -> int:
+    return (c << 1) | (0 if strict else 1)
+
+def add_bounds(b1: int, b2: int) -> int:
+    if b1 == INF or b2 == INF:
+        return INF
+    return (((b1 >> 1) + (b2 >> 1)) << 1) | (b1 & b2 & 1)
+
+def negate_bound(b: int) -> int:
+    return bound(-(b >> 1), (b & 1) == 1)
+
+def zero_zone(dim: int) -> list[int]:
+    return [LE_ZERO] * (dim * dim)
+
+def close(zone: list[int], dim: int) -> bool:
+    for k in range(dim):
+        for i in range(dim):
+            d_ik = zone[i * dim + k]
+            if d_ik == INF:
+                continue
+            row = i * dim
+            for j in range(dim):
+                via = add_bounds(d_ik, zone[k * dim + j])
+                if via < zone[row + j]:
+                    zone[row + j] = via
+        if zone[k * dim + k] < LE_ZERO:
+            return False
+    return all(zone[i * dim + i] >= LE_ZERO for i in range(dim))
+
+# Adds x_i - x_j (b) to a canonical zone, returns False if the zone becomes empty
+def constrain(zone: list[int], dim: int, i: int, j: int, b: int) -> bool:
+    if add_bounds(b, zone[j * dim + i]) < LE_ZERO:
+        return False
+    if b >= zone[i * dim + j]:
+        return True
+    zone[i * dim + j] = b
+    for k in range(dim):
+        d_ki = add_bounds(zone[k * dim + i], b)
+        if d_ki == INF:
+            continue
+        row = k * dim
+        for l in range(dim):
+            via = add_bounds(d_ki, zone[j * dim + l])
+            if via < zone[row + l]:
+                zone[row + l] = via
+    return True
+
+def up(zone: list[int], dim: int) -> None:
+    for i in range(1, dim):
+        zone[i * dim] = INF
+
+def down(zone: list[int], dim: int) -> None:
+    for j in range(1, dim):
+        lower = LE_ZERO
+        for i in range(1, dim):
+            if zone[i * dim + j] < lower:
+                lower = zone[i * dim + j]
+        zone[j] = lower
+
+def reset(zone: list[int], dim: int, x: int, value: int) -> None:
+    for j in range(dim):
+        zone[x * dim + j] = add_bounds(bound(value, False), zone[j])
+        zone[j * dim + x] = add_bounds(zone[j * dim], bound(-value, False))
+    zone[x * dim + x] = LE_ZERO
+
+def extrapolate(zone: list[int], dim: int, max_constants: list[int]) -> None:
+    changed = False
+    for i in range(dim):
+        for j in range(dim):
+            if i == j or zone[i * dim + j] == INF:
+                continue
+            if i != 0 and zone[i * dim + j] > bound(max_constants[i], False):
+                zone[i * dim + j] = INF
+                changed = True
+            elif j != 0 and zone[i * dim + j] < bound(-max_constants[j], True):
+                zone[i * dim + j] = bound(-max_constants[j], True)
+                changed = True
+    if changed:
+        close(zone, dim)
+
+def is_included(zone: list[int] | tuple, other: list[int] | tuple) -> bool:
+    return all(b1 <= b2 for b1, b2 in zip(zone, other))
+
+def is_unbounded(zone: list[int] | tuple, dim: int) -> bool:
+    return all(zone[i * dim] == INF for i in range(1, dim))
+
+# Zones covering zone \ other, not necessarily disjoint
+def subtract(zone: list[int], other: list[int], dim: int) -> list[list[int]]:
+    pieces = []
+    rest = list(zone)
+    for i in range(dim):
+        for j in range(dim):
+            b = other[i * dim + j]
+            if i == j or b == INF or b >= rest[i * dim + j]:
+                continue
+            piece = list(rest)
+            if constrain(piece, dim, j, i, negate_bound(b)):
+                pieces.append(piece)
+            if not constrain(rest, dim, i, j, b):
+                return pieces
+    return pieces
+
+
+# Expressions of guards, invariants, updates and queries in Uppaal's C-like syntax, parsed into tuples:
+# ("const", v), ("var", name), ("loc", process, location), ("index", array, index), ("unary", op, e),
+# ("binary", op, e1, e2), ("cond", c, e1, e2)
+
+TOKEN = re.compile(r"\s*(?:(\d+)|([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?)|(:=|==|!=|<=|>=|&&|\|\||\+=|-=|\+\+|--|[-+*/%<>!?:(),\[\]{}=;]))")
+COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+COMPARISONS = ("<", "<=", "==", "!=", ">=", ">")
+FLIPPED = {"<": ">", "<=": ">=", "==": "==", "!=": "!=", ">=": "<=", ">": "<"}
+INT_MIN = -32768
+INT_MAX = 32767
+
+def tokenize(text: str) -> list[str]:
+    text = COMMENT.sub(" ", text).strip()
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            if text[pos:].strip() == "":
+                break
+            raise UnsupportedModel("Cannot parse \"" + text + "\" at: " + text[pos:])
+        tokens.append(match.group(match.lastindex))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+
+    def __init__(self, tokens: list[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> str | None:
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def next(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise UnsupportedModel("Unexpected end of expression: " + " ".join(self.tokens))
+        self.pos += 1
+        return token
+
+    def expect(self, token: str) -> None:
+        found = self.next()
+        if found != token:
+            raise UnsupportedModel("Expected \"" + token + "\" but found \"" + found + "\" in: " + " ".join(self.tokens))
+
+    def at_end(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    def expression(self) -> tuple:
+        cond = self.implication()
+        if self.peek() == "?":
+            self.next()
+            e1 = self.expression()
+            self.expect(":")
+            return ("cond", cond, e1, self.expression())
+        return cond
+
+    def implication(self) -> tuple:
+        left = self.disjunction()
+        while self.peek() == "imply":
+            self.next()
+            left = ("binary", "||", ("unary", "!", left), self.disjunction())
+        return left
+
+    def disjunction(self) -> tuple:
+        left = self.conjunction()
+        while self.peek() in ("||", "or"):
+            self.next()
+            left = ("binary", "||", left, self.conjunction())
+        return left
+
+    def conjunction(self) -> tuple:
+        left = self.negation()
+        while self.peek() in ("&&", "and"):
+            self.next()
+            left = ("binary", "&&", left, self.negation())
+        return left
+
+    def negation(self) -> tuple:
+        if self.peek() == "not":
+            self.next()
+            return ("unary", "!", self.negation())
+        return self.equality()
+
+    def equality(self) -> tuple:
+        left = self.relation()
+        while self.peek() in ("==", "!="):
+            left = ("binary", self.next(), left, self.relation())
+        return left
+
+    def relation(self) -> tuple:
+        left = self.additive()
+        while self.peek() in ("<", "<=", ">=", ">"):
+            left = ("binary", self.next(), left, self.additive())
+        return left
+
+    def additive(self) -> tuple:
+        left = self.multiplicative()
+        while self.peek() in ("+", "-"):
+            left = ("binary", self.next(), left, self.multiplicative())
+        return left
+
+    def multiplicative(self) -> tuple:
+        left = self.unary()
+        while self.peek() in ("*", "/", "%"):
+            left = ("binary", self.next(), left, self.unary())
+        return left
+
+    def unary(self) -> tuple:
+        if self.peek() in ("-", "!", "+"):
+            op = self.next()
+            operand = self.unary()
+            return operand if op == "+" else ("unary", op, operand)
+        return self.postfix()
+
+    def postfix(self) -> tuple:
+        expr = self.primary()
+        while self.peek() == "[":
+            self.next()
+            expr = ("index", expr, self.expression())
+            self.expect("]")
+        return expr
+
+    def primary(self) -> tuple:
+        token = self.next()
+        if token == "(":
+            expr = self.expression()
+            self.expect(")")
+            return expr
+        if token.isdigit():
+            return ("const", int(token))
+        if token == "true":
+            return ("const", 1)
+        if token == "false":
+            return ("const", 0)
+        if token[0].isalpha() or token[0] == "_":
+            return ("var", token)
+        raise UnsupportedModel("Unexpected \"" + token + "\" in: " + " ".join(self.tokens))
+
+    # Comma separated updates "v := e", "v = e", "v += e", "v -= e", "v++", "v--"
+    def updates(self) -> list[tuple[tuple, str, tuple | None]]:
+        res = []
+        while not self.at_end():
+            target = self.postfix()
+            op = self.next()
+            if op in ("++", "--"):
+                res.append((target, op, None))
+            elif op in (":=", "=", "+=", "-="):
+                res.append((target, op, self.expression()))
+            else:
+                raise UnsupportedModel("Unsupported update operator \"" + op + "\" in: " + " ".join(self.tokens))
+            if not self.at_end():
+                self.expect(",")
+        return res
+
+    # Initialiser of a declaration: expression or (nested) list in braces
+    def initialiser(self) -> tuple | list:
+        if self.peek() == "{":
+            self.next()
+            res = [self.initialiser()]
+            while self.peek() == ",":
+                self.next()
+                res.append(self.initialiser())
+            self.expect("}")
+            return res
+        return self.expression()
+
+
+# Generated systems repeat the same labels on many edges, parse trees are immutable and shared between them
+
+@functools.lru_cache(maxsize=65536)
+def parse_expression(text: str) -> tuple:
+    parser = Parser(tokenize(text))
+    expr = parser.expression()
+    if not parser.at_end():
+        raise UnsupportedModel("Unexpected \"" + parser.peek() + "\" in: " + text)
+    return expr
+
+@functools.lru_cache(maxsize=65536)
+def parse_updates(text: str) -> tuple[tuple[tuple, str, tuple | None], ...]:
+    return tuple(Parser(tokenize(text)).updates())
+
+def conjuncts(expr: tuple) -> list[tuple]:
+    if expr[0] == "binary" and expr[1] == "&&":
+        return conjuncts(expr[2]) + conjuncts(expr[3])
+    return [expr]
+
+def c_division(a: int, b: int) -> int:
+    if b == 0:
+        raise Exception("Division by zero")
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+def evaluate(expr: tuple, env: dict, locations: tuple = None) -> int:
+    kind = expr[0]
+    if kind == "const":
+        return expr[1]
+    if kind == "var":
+        try:
+            return env[expr[1]]
+        except KeyError:
+            raise UnsupportedModel("Unknown identifier " + expr[1])
+    if kind == "binary":
+        op = expr[1]
+        if op == "&&":
+            return int(bool(evaluate(expr[2], env, locations)) and bool(evaluate(expr[3], env, locations)))
+        if op == "||":
+            return int(bool(evaluate(expr[2], env, locations)) or bool(evaluate(expr[3], env, locations)))
+        a = evaluate(expr[2], env, locations)
+        b = evaluate(expr[3], env, locations)
+        match op:
+            case "+": return a + b
+            case "-": return a - b
+            case "*": return a * b
+            case "/": return c_division(a, b)
+            case "%": return a - b * c_division(a, b)
+            case "<": return int(a < b)
+            case "<=": return int(a <= b)
+            case "==": return int(a == b)
+            case "!=": return int(a != b)
+            case ">=": return int(a >= b)
+            case ">": return int(a > b)
+    if kind == "unary":
+        value = evaluate(expr[2], env, locations)
+        return -value if expr[1] == "-" else int(not value)
+    if kind == "index":
+        array = evaluate(expr[1], env, locations)
+        index = evaluate(expr[2], env, locations)
+        if not isinstance(array, list) or not 0 <= index < len(array):
+            raise Exception("Array index out of range: " + str(index))
+        return array[index]
+    if kind == "cond":
+        return evaluate(expr[2] if evaluate(expr[1], env, locations) else expr[3], env, locations)
+    if kind == "loc":
+        return int(locations[expr[1]] == expr[2])
+    raise UnsupportedModel("Unsupported expression " + str(expr))
+
+def identifiers(expr: tuple) -> set[str]:
+    if expr[0] == "var":
+        return {expr[1]}
+    res = set()
+    for sub in expr[1:]:
+        if isinstance(sub, tuple):
+            res |= identifiers(sub)
+    return res
+
+def flatten(value: int | list) -> list[int]:
+    if isinstance(value, list):
+        return [item for sub in value for item in flatten(sub)]
+    return [value]
+
+
+# Declarations of all templates. Template-local declarations share the global namespace, which is sufficient for the
+# generated product systems (a single product template and the dummy handshaker).
+
+class Declarations:
+
+    def __init__(self):
+        self.clocks: list[str] = []
+        self.channels: list[str] = []
+        self.variables: list[str] = []
+        self.initial: list[int] = []
+        self.ranges: dict[str, tuple[int, int]] = {}
+        self.constants: dict[str, int | list] = {}
+
+    def names(self) -> set[str]:
+        return set(self.clocks) | set(self.channels) | set(self.variables) | set(self.constants)
+
+    def declare(self, name: str) -> None:
+        if name in self.names():
+            raise UnsupportedModel("Identifier declared twice: " + name)
+
+    def parse(self, text: str | None) -> None:
+        if text is None:
+            return
+        tokens = tokenize(text)
+        start = 0
+        for pos in range(len(tokens)):
+            if tokens[pos] == ";":
+                if pos > start:
+                    self.parse_statement(tokens[start:pos])
+                start = pos + 1
+        if start < len(tokens):
+            raise UnsupportedModel("Declaration is not terminated by \";\": " + " ".join(tokens[start:]))
+
+    def parse_statement(self, tokens: list[str]) -> None:
+        parser = Parser(tokens)
+        keyword = parser.next()
+
+        if keyword in ("clock", "chan"):
+            names = self.clocks if keyword == "clock" else self.channels
+            while True:
+                name = parser.next()
+                self.declare(name)
+                names.append(name)
+                if parser.at_end():
+                    return
+                parser.expect(",")
+
+        constant = keyword == "const"
+        if constant:
+            keyword = parser.next()
+        if keyword not in ("int", "bool"):
+            raise UnsupportedModel("Unsupported declaration: " + " ".join(tokens))
+
+        value_range = (0, 1) if keyword == "bool" else (INT_MIN, INT_MAX)
+        if keyword == "int" and parser.peek() == "[":
+            parser.next()
+            lower = evaluate(parser.expression(), self.constants)
+            parser.expect(",")
+            upper = evaluate(parser.expression(), self.constants)
+            parser.expect("]")
+            value_range = (lower, upper)
+
+        while True:
+            name = parser.next()
+            self.declare(name)
+            dimensions = []
+            while parser.peek() == "[":
+                parser.next()
+                dimensions.append(evaluate(parser.expression(), self.constants))
+                parser.expect("]")
+            value: int | list = 0
+            if parser.peek() in ("=", ":="):
+                parser.next()
+                value = self.initial_value(parser.initialiser())
+            elif len(dimensions) > 0:
+                value = self.zero_array(dimensions)
+
+            if constant:
+                self.constants[name] = value
+            elif len(dimensions) > 0:
+                raise UnsupportedModel("Only constant arrays are supported: " + name)
+            else:
+                self.variables.append(name)
+                self.initial.append(value)
+                self.ranges[name] = value_range
+
+            if parser.at_end():
+                return
+            parser.expect(",")
+
+    def initial_value(self, initialiser: tuple | list) -> int | list:
+        if isinstance(initialiser, list):
+            return [self.initial_value(item) for item in initialiser]
+        return evaluate(initialiser, self.constants)
+
+    def zero_array(self, dimensions: list[int]) -> list:
+        if len(dimensions) == 1:
+            return [0] * dimensions[0]
+        return [self.zero_array(dimensions[1:]) for i in range(dimensions[0])]
+
+    # Interval of the values an expression over constants and (ranged) variables can take
+    def interval(self, expr: tuple) -> tuple[int, int]:
+        kind = expr[0]
+        if kind == "const":
+            return (expr[1], expr[1])
+        if kind == "var":
+            name = expr[1]
+            if name in self.ranges:
+                return self.ranges[name]
+            if name in self.constants:
+                values = flatten(self.constants[name])
+                return (min(values), max(values))
+            raise UnsupportedModel("Unknown identifier " + name)
+        if kind == "index":
+            return self.interval(expr[1])
+        if kind == "unary" and expr[1] == "-":
+            lower, upper = self.interval(expr[2])
+            return (-upper, -lower)
+        if kind == "binary" and expr[1] in ("+", "-", "*"):
+            l1, u1 = self.interval(expr[2])
+            l2, u2 = self.interval(expr[3])
+            if expr[1] == "+":
+                return (l1 + l2, u1 + u2)
+            if expr[1] == "-":
+                return (l1 - u2, u1 - l2)
+            products = [l1 * l2, l1 * u2, u1 * l2, u1 * u2]
+            return (min(products), max(products))
+        if kind == "cond":
+            l1, u1 = self.interval(expr[2])
+            l2, u2 = self.interval(expr[3])
+            return (min(l1, l2), max(u1, u2))
+        raise UnsupportedModel("Cannot bound the values of " + str(expr))
+
+
+# Compiled labels of the automata. Clock constraints are triples (i, j, (strict, expression)) standing for
+# x_i - x_j < / <= expression, with index 0 for the constant zero.
+
+class Constraint:
+
+    def __init__(self, expr: tuple | None, declarations: Declarations, clock_index: dict[str, int]):
+        self.clock_constraints: list[tuple[int, int, bool, tuple]] = []
+        self.conditions: list[tuple] = []
+        if expr is None:
+            return
+        for atom in conjuncts(expr):
+            if not (identifiers(atom) & clock_index.keys()):
+                self.conditions.append(atom)
+                continue
+            if atom[0] != "binary" or atom[1] not in COMPARISONS or atom[1] == "!=":
+                raise UnsupportedModel("Unsupported clock constraint " + str(atom))
+            op, left, right = atom[1], atom[2], atom[3]
+            if not (left[0] == "var" and left[1] in clock_index):
+                op, left, right = FLIPPED[op], right, left
+            if not (left[0] == "var" and left[1] in clock_index) or identifiers(right) & clock_index.keys():
+                raise UnsupportedModel("Only constraints comparing a clock with an expression are supported: " + str(atom))
+            x = clock_index[left[1]]
+            if op in ("<", "<=", "=="):
+                self.clock_constraints.append((x, 0, op == "<", right))
+            if op in (">", ">=", "=="):
+                self.clock_constraints.append((0, x, op == ">", ("unary", "-", right)))
+
+    def holds(self, env: dict) -> bool:
+        return all(evaluate(condition, env) for condition in self.conditions)
+
+    def bounds(self, env: dict) -> list[tuple[int, int, int]]:
+        return [(i, j, bound(evaluate(expr, env), strict)) for (i, j, strict, expr) in self.clock_constraints]
+
+
+class Edge:
+
+    def __init__(self, transition: ta.Transition, location_index: dict[int, int], labels: Labels):
+        self.source = location_index[transition.source]
+        self.target = location_index[transition.target]
+        self.channel, self.sending = labels.sync(transition.sync)
+        self.guard = labels.constraint(transition.guard)
+        self.updates = labels.updates(transition.assignment)
+
+
+class Process:
+
+    def __init__(self, name: str, template: ta.Template, labels: Labels):
+        self.name = name
+        self.template = template
+        location_index = {loc.id: index for (index, loc) in enumerate(template.locations)}
+        self.location_names = [loc.name for loc in template.locations]
+        self.committed = [loc.commited for loc in template.locations]
+        self.invariants = [labels.constraint(loc.inv) for loc in template.locations]
+        self.init = location_index[template.init]
+
+        self.edges = [Edge(trans, location_index, labels) for trans in template.transitions]
+        self.outgoing: list[list[Edge]] = [[] for loc in template.locations]
+        self.receiving: list[dict[str, list[Edge]]] = [{} for loc in template.locations]
+        for edge in self.edges:
+            if edge.channel is not None and not edge.sending:
+                self.receiving[edge.source].setdefault(edge.channel, []).append(edge)
+            else:
+                self.outgoing[edge.source].append(edge)
+
+
+# Labels compiled once per system, such that edges with the same label share the compiled form
+
+class Labels:
+
+    def __init__(self, declarations: Declarations, clock_index: dict[str, int]):
+        self.declarations = declarations
+        self.clock_index = clock_index
+        self.constraints: dict[str | None, Constraint] = {}
+        self.update_lists: dict[str | None, tuple] = {}
+        self.syncs: dict[str | None, tuple[str | None, bool]] = {}
+
+    def constraint(self, text: str | None) -> Constraint:
+        if text not in self.constraints:
+            expr = None
+            if text is not None and text.strip() != "":
+                expr = parse_expression(text)
+            self.constraints[text] = Constraint(expr, self.declarations, self.clock_index)
+        return self.constraints[text]
+
+    def sync(self, text: str | None) -> tuple[str | None, bool]:
+        if text not in self.syncs:
+            channel, sending = None, False
+            if text is not None and text.strip() != "":
+                sync = text.strip()
+                channel = sync[:-1].strip()
+                sending = sync[-1] == "!"
+                if sync[-1] not in "!?" or channel not in self.declarations.channels:
+                    raise UnsupportedModel("Unsupported synchronisation " + sync)
+            self.syncs[text] = (channel, sending)
+        return self.syncs[text]
+
+    def updates(self, text: str | None) -> tuple[tuple[bool, str | int, str, tuple | None], ...]:
+        if text not in self.update_lists:
+            updates = []
+            if text is not None and text.strip() != "":
+                for (target, op, expr) in parse_updates(text):
+                    if target[0] != "var":
+                        raise UnsupportedModel("Unsupported assignment target " + str(target))
+                    name = target[1]
+                    if name in self.clock_index:
+                        if op not in (":=", "="):
+                            raise UnsupportedModel("Unsupported clock update " + name + " " + op)
+                        updates.append((True, self.clock_index[name], op, expr))
+                    elif name in self.declarations.variables:
+                        updates.append((False, name, op, expr))
+                    else:
+                        raise UnsupportedModel("Assignment to unknown or constant identifier " + name)
+            self.update_lists[text] = tuple(updates)
+        return self.update_lists[text]
+
+
+# Symbolic state: locations of all processes, values of all variables and a canonical zone
+State = tuple[tuple[int, ...], tuple[int, ...], tuple[int, ...]]
+
+# Run satisfying an existential query: the steps (source state, combination of edges) of a path of the zone graph, for a
+# path ending in a cycle the index of the step the cycle returns to, and whether the run stops in the last state (E<>)
+Witness = tuple[list[tuple[State, tuple]], int | None, bool]
+
+class ZoneGraph:
+
+    def __init__(self, system: ta.System):
+        self.declarations = Declarations()
+        self.declarations.parse(system.declaration)
+        for template in system.templates:
+            self.declarations.parse(template.declaration)
+
+        self.dim = len(self.declarations.clocks) + 1
+        self.clock_index = {clock: index + 1 for (index, clock) in enumerate(self.declarations.clocks)}
+
+        self.labels = Labels(self.declarations, self.clock_index)
+        templates = {template.name: template for template in system.templates}
+        self.processes = [Process(name, templates[temp_name], self.labels)
+                          for (name, temp_name) in self.instantiation(system.system, templates)]
+
+        self.location_refs: dict[str, tuple[int, int]] = {}
+        for (p, process) in enumerate(self.processes):
+            for (index, name) in enumerate(process.location_names):
+                if name is not None:
+                    self.location_refs[process.name + "." + name] = (p, index)
+
+        self.max_constants = self.compute_max_constants()
+        self.states = 0
+        self.deadline: float | None = None
+        self.witness: Witness | None = None
+
+    # Processes (name, template name) of the system declaration, without parameters or priorities
+    def instantiation(self, system_decl: str | None, templates: dict[str, ta.Template]) -> list[tuple[str, str]]:
+        if system_decl is None:
+            return [(name, name) for name in templates]
+        text = COMMENT.sub(" ", system_decl)
+        assignments = dict(re.findall(r"(\w+)\s*=\s*(\w+)\s*\(\s*\)\s*;", text))
+        match = re.search(r"\bsystem\s+([^;]*);", text)
+        if match is None:
+            raise UnsupportedModel("System declaration without system line: " + system_decl)
+        processes = []
+        for name in match.group(1).split(","):
+            name = name.strip()
+            if not re.fullmatch(r"\w+", name):
+                raise UnsupportedModel("Unsupported system line: " + match.group(0))
+            temp_name = assignments.get(name, name)
+            if temp_name not in templates:
+                raise UnsupportedModel("Process " + name + " instantiates unknown template " + temp_name)
+            processes.append((name, temp_name))
+        return processes
+
+    # Largest constant each clock is compared with or set to, needed for the extrapolation of zones
+    def compute_max_constants(self) -> list[int]:
+        max_constants = [0] * self.dim
+        for constraint in self.labels.constraints.values():
+            for (i, j, strict, expr) in constraint.clock_constraints:
+                lower, upper = self.declarations.interval(expr)
+                x = i if i != 0 else j
+                max_constants[x] = max(max_constants[x], abs(lower), abs(upper))
+        for updates in self.labels.update_lists.values():
+            for (is_clock, target, op, expr) in updates:
+                if is_clock:
+                    lower, upper = self.declarations.interval(expr)
+                    max_constants[target] = max(max_constants[target], abs(lower), abs(upper))
+        return max_constants
+
+    def environment(self, values: tuple[int, ...]) -> dict:
+        env = dict(self.declarations.constants)
+        env.update(zip(self.declarations.variables, values))
+        return env
+
+    def is_committed(self, locations: tuple[int, ...]) -> bool:
+        return any(process.committed[locations[p]] for (p, process) in enumerate(self.processes))
+
+    # Restricts the zone to the invariants of the locations, returns False if it becomes empty
+    def apply_invariants(self, zone: list[int], locations: tuple[int, ...], env: dict) -> bool:
+        for (p, process) in enumerate(self.processes):
+            invariant = process.invariants[locations[p]]
+            if not invariant.holds(env):
+                return False
+            for (i, j, b) in invariant.bounds(env):
+                if not constrain(zone, self.dim, i, j, b):
+                    return False
+        return True
+
+    def delay(self, zone: list[int], locations: tuple[int, ...], env: dict) -> bool:
+        if not self.is_committed(locations):
+            up(zone, self.dim)
+            if not self.apply_invariants(zone, locations, env):
+                return False
+        extrapolate(zone, self.dim, self.max_constants)
+        return True
+
+    def initial_state(self) -> State | None:
+        locations = tuple(process.init for process in self.processes)
+        values = tuple(self.declarations.initial)
+        env = self.environment(values)
+        zone = zero_zone(self.dim)
+        if not self.apply_invariants(zone, locations, env) or not self.delay(zone, locations, env):
+            return None
+        return (locations, values, tuple(zone))
+
+    # Enabled combinations of edges (single internal edges or sender and receiver) with respect to locations and variables
+    def transitions(self, locations: tuple[int, ...], env: dict) -> Iterator[tuple[tuple[int, Edge], ...]]:
+        committed = self.is_committed(locations)
+        for (p, process) in enumerate(self.processes):
+            for edge in process.outgoing[locations[p]]:
+                if not edge.guard.holds(env):
+                    continue
+                if edge.channel is None:
+                    if not committed or process.committed[locations[p]]:
+                        yield ((p, edge),)
+                    continue
+                for (q, other) in enumerate(self.processes):
+                    if q == p:
+                        continue
+                    if committed and not (process.committed[locations[p]] or other.committed[locations[q]]):
+                        continue
+                    for receiver in other.receiving[locations[q]].get(edge.channel, []):
+                        if receiver.guard.holds(env):
+                            yield ((p, edge), (q, receiver))
+
+    # Effect of a combination of edges on the discrete part: target locations, variable values and clock resets
+    def fire(self, locations: tuple[int, ...], env: dict, combination: tuple[tuple[int, Edge], ...]) -> tuple[tuple[int, ...], tuple[int, ...], list[tuple[int, int]], dict]:
+        new_locations = list(locations)
+        new_env = dict(env)
+        resets = []
+        for (p, edge) in combination:
+            new_locations[p] = edge.target
+            for (is_clock, target, op, expr) in edge.updates:
+                if is_clock:
+                    resets.append((target, evaluate(expr, new_env)))
+                    continue
+                match op:
+                    case "++": value = new_env[target] + 1
+                    case "--": value = new_env[target] - 1
+                    case "+=": value = new_env[target] + evaluate(expr, new_env)
+                    case "-=": value = new_env[target] - evaluate(expr, new_env)
+                    case _: value = evaluate(expr, new_env)
+                lower, upper = self.declarations.ranges[target]
+                if not lower <= value <= upper:
+                    raise Exception("Value " + str(value) + " assigned to " + target + " is out of range")
+                new_env[target] = value
+        values = tuple(new_env[name] for name in self.declarations.variables)
+        return tuple(new_locations), values, resets, new_env
+
+    def guard_zone(self, zone: tuple[int, ...], env: dict, combination: tuple[tuple[int, Edge], ...]) -> list[int] | None:
+        res = list(zone)
+        for (p, edge) in combination:
+            for (i, j, b) in edge.guard.bounds(env):
+                if not constrain(res, self.dim, i, j, b):
+                    return None
+        return res
+
+    def successors(self, state: State) -> Iterator[State]:
+        for (combination, successor) in self.labelled_successors(state):
+            yield successor
+
+    def labelled_successors(self, state: State) -> Iterator[tuple[tuple[tuple[int, Edge], ...], State]]:
+        locations, values, zone = state
+        env = self.environment(values)
+        for combination in self.transitions(locations, env):
+            successor = self.successor(zone, locations, env, combination)
+            if successor is not None:
+                yield (combination, successor)
+
+    def successor(self, zone: tuple[int, ...], locations: tuple[int, ...], env: dict, combination: tuple[tuple[int, Edge], ...]) -> State | None:
+        res = self.guard_zone(zone, env, combination)
+        if res is None:
+            return None
+        new_locations, new_values, resets, new_env = self.fire(locations, env, combination)
+        for (x, value) in resets:
+            reset(res, self.dim, x, value)
+        if not self.apply_invariants(res, new_locations, new_env) or not self.delay(res, new_locations, new_env):
+            return None
+        return (new_locations, new_values, tuple(res))
+
+    # Valuations of the zone from which the combination can be taken (possibly after a delay)
+    def enabling_zone(self, zone: tuple[int, ...], locations: tuple[int, ...], env: dict, combination: tuple[tuple[int, Edge], ...]) -> list[int] | None:
+        res = self.guard_zone(zone, env, combination)
+        if res is None:
+            return None
+        new_locations, new_values, resets, new_env = self.fire(locations, env, combination)
+        reset_values = dict(resets)
+        for (p, process) in enumerate(self.processes):
+            invariant = process.invariants[new_locations[p]]
+            if not invariant.holds(new_env):
+                return None
+            for (i, j, b) in invariant.bounds(new_env):
+                # invariants are diagonal-free, constraints on reset clocks are decided by the value they are set to
+                if i in reset_values or j in reset_values:
+                    value = reset_values.get(i, 0) - reset_values.get(j, 0)
+                    if bound(value, False) > b:
+                        return None
+                elif not constrain(res, self.dim, i, j, b):
+                    return None
+        if not self.is_committed(locations):
+            down(res, self.dim)
+            close(res, self.dim)
+            for (i, value) in enumerate(zone):
+                if value < res[i] and not constrain(res, self.dim, i // self.dim, i % self.dim, value):
+                    return None
+        return res
+
+    # A state is deadlocked if it contains a valuation from which no transition can ever be taken
+    def has_deadlock(self, state: State) -> bool:
+        locations, values, zone = state
+        env = self.environment(values)
+        remaining = [list(zone)]
+        for combination in self.transitions(locations, env):
+            enabled = self.enabling_zone(zone, locations, env, combination)
+            if enabled is None:
+                continue
+            remaining = [piece for part in remaining for piece in subtract(part, enabled, self.dim)]
+            if len(remaining) == 0:
+                return False
+        return True
+
+    # A state ends a maximal path if time can diverge in it or if it contains a deadlock
+    def is_maximal(self, state: State) -> bool:
+        locations, values, zone = state
+        if not self.is_committed(locations) and is_unbounded(zone, self.dim):
+            return True
+        return self.has_deadlock(state)
+
+    def holds(self, formula: tuple, state: State) -> bool:
+        return bool(evaluate(formula, self.environment(state[1]), state[0]))
+
+    # Resolves references to locations (Process.location) and process variables (Process.variable) in a query
+    def resolve(self, expr: tuple) -> tuple:
+        if expr[0] == "var":
+            name = expr[1]
+            if name in self.location_refs:
+                return ("loc",) + self.location_refs[name]
+            if name == "deadlock":
+                raise UnsupportedModel("The deadlock predicate is not supported in queries")
+            if "." in name:
+                process_name, variable = name.split(".", 1)
+                if any(process.name == process_name for process in self.processes):
+                    name = variable
+            if name in self.clock_index:
+                raise UnsupportedModel("Clock constraints are not supported in queries: " + name)
+            if name not in self.declarations.variables and name not in self.declarations.constants:
+                raise UnsupportedModel("Unknown identifier in query: " + expr[1])
+            return ("var", name)
+        return tuple(self.resolve(sub) if isinstance(sub, tuple) else sub for sub in expr)
+
+    # Counts explored symbolic states, the exploration is abandoned once the deadline (of time.monotonic) has passed
+    def explored(self, count: int) -> None:
+        self.states += count
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise ta.VerificationUnknown("timeout")
+
+    # Decides the query; with witness, the run found for a satisfied E<> or E[] query is kept in self.witness
+    def check(self, query: str, witness: bool = False) -> bool:
+        self.witness = None
+        query = query.strip()
+        quantifier = query[0:3]
+        if quantifier not in ("E<>", "A[]", "E[]", "A<>") or "-->" in query:
+            raise UnsupportedModel("Unsupported query: " + query)
+        formula = self.resolve(parse_expression(query[3:]))
+        negation = ("unary", "!", formula)
+        match quantifier:
+            case "E<>":
+                return self.exists_eventually(formula, witness)
+            case "A[]":
+                return not self.exists_eventually(negation)
+            case "E[]":
+                return self.exists_always(formula, witness)
+            case "A<>":
+                return not self.exists_always(negation)
+
+    # Reachability with inclusion checking between the zones of the same discrete state
+    def exists_eventually(self, formula: tuple, witness: bool = False) -> bool:
+        init = self.initial_state()
+        if init is None:
+            return False
+        passed: dict[tuple, list[tuple[int, ...]]] = {(init[0], init[1]): [init[2]]}
+        parents: dict[State, tuple[State, tuple]] = {}
+        waiting = deque([init])
+        while len(waiting) > 0:
+            state = waiting.popleft()
+            self.explored(1)
+            if self.holds(formula, state):
+                if witness:
+                    steps = []
+                    target = state
+                    while target in parents:
+                        steps.append(parents[target])
+                        target = parents[target][0]
+                    self.witness = (steps[::-1], None, True)
+                return True
+            for (combination, successor) in self.labelled_successors(state):
+                zones = passed.setdefault((successor[0], successor[1]), [])
+                if any(is_included(successor[2], zone) for zone in zones):
+                    continue
+                zones[:] = [zone for zone in zones if not is_included(zone, successor[2])]
+                zones.append(successor[2])
+                if witness:
+                    parents[successor] = (state, combination)
+                waiting.append(successor)
+        return False
+
+    # Search for a maximal path on which the formula always holds: a reachable cycle of formula states or a formula state
+    # ending a maximal path, found by a depth-first search of the zone graph (with maximal-constant extrapolation, ExtraM)
+    # restricted to formula states
+    def exists_always(self, formula: tuple, witness: bool = False) -> bool:
+        init = self.initial_state()
+        if init is None or not self.holds(formula, init):
+            return False
+        self.explored(1)
+        if self.is_maximal(init):
+            if witness:
+                self.witness = ([], None, False)
+            return True
+
+        on_stack = {init: True}
+        stack = [(init, self.labelled_successors(init))]
+        path: list[tuple[State, tuple]] = []
+        while len(stack) > 0:
+            state, successors = stack[-1]
+            combination, successor = next(successors, (None, None))
+            if successor is None:
+                on_stack[state] = False
+                stack.pop()
+                if len(path) > 0:
+                    path.pop()
+                continue
+            if not self.holds(formula, successor):
+                continue
+            if successor in on_stack:
+                if on_stack[successor]:
+                    if witness:
+                        loop = next(index for (index, (entry, _)) in enumerate(stack) if entry == successor)
+                        self.witness = (path + [(state, combination)], loop, False)
+                    return True
+                continue
+            self.explored(1)
+            if self.is_maximal(successor):
+                if witness:
+                    self.witness = (path + [(state, combination)], None, False)
+                return True
+            on_stack[successor] = True
+            stack.append((successor, self.labelled_successors(successor)))
+            path.append((state, combination))
+        return False
+
+    # Values of a clock at the steps of the witness, as far as they are determined by the zones of the path (None
+    # otherwise), and the actions of the first process. For a path ending in a state satisfying an E<> query, the value
+    # of the clock on entering it is appended. Every concrete run along the path has the determined values.
+    def witness_values(self, clock: str) -> tuple[list[int | None], list[str | None], int | None]:
+        steps, loop, stops = self.witness
+        if clock not in self.clock_index:
+            raise UnsupportedModel("Unknown clock for the witness: " + clock)
+        x = self.clock_index[clock]
+
+        values = []
+        actions = []
+        for ((locations, state_values, zone), combination) in steps:
+            env = self.environment(state_values)
+            guarded = self.guard_zone(zone, env, combination)
+            upper, lower = guarded[x * self.dim], guarded[x]
+            if upper & lower & 1 and upper >> 1 == -(lower >> 1):
+                values.append(upper >> 1)
+            else:
+                values.append(None)
+            action = None
+            for (p, edge) in combination:
+                if p == 0 and edge.channel is not None:
+                    action = edge.channel + ("!" if edge.sending else "?")
+            actions.append(action)
+
+        if stops and len(steps) > 0:
+            (locations, state_values, zone), combination = steps[-1]
+            resets = dict(self.fire(locations, self.environment(state_values), combination)[2])
+            values.append(resets.get(x, values[-1]))
+        elif stops:
+            values.append(0)
+        return values, actions, loop
+
+
+# Verification backend deciding the queries with the native zone graph engine instead of Uppaal
+
+class ZoneGraphBackend:
+
+    name = "zones"
+
+    # timeout: seconds after which a verification is abandoned without verdict (None for no limit)
+    def __init__(self, timeout: float | None = None):
+        self.timeout = timeout
+        self.calls = 0
+        self.states = 0
+
+    def __repr__(self) -> str:
+        return f"ZoneGraphBackend(calls: {self.calls}, states: {self.states}, timeout: {self.timeout})"
+
+    # Identifies the backend in the keys of the verdict cache
+    def identity(self) -> str:
+        return self.name
+
+    def graph(self, system: ta.System) -> ZoneGraph:
+        graph = ZoneGraph(system)
+        if self.timeout is not None:
+            graph.deadline = time.monotonic() + self.timeout
+        return graph
+
+    def verify(self, system: ta.System, trace_path: str = None, verify_options: str = None) -> list[bool]:
+        if trace_path is not None:
+            raise UnsupportedModel("The zone graph backend does not produce diagnostic traces")
+        graph = self.graph(system)
+        verdicts = [graph.check(query) for query in system.queries]
+        self.calls += 1
+        self.states += graph.states
+        return verdicts
+
+    # Verdict of the first query and, if it is an existential query that is satisfied, the values of the clock and the
+    # actions along the run found (see ZoneGraph.witness_values)
+    def verify_witness(self, system: ta.System, clock: str, verify_options: str = None) -> tuple[bool, tuple[list[int | None], list[str | None], int | None] | None]:
+        graph = self.graph(system)
+        verdict = graph.check(system.queries[0], True)
+        self.calls += 1
+        self.states += graph.states
+        if graph.witness is None:
+            return verdict, None
+        return verdict, graph.witness_values(clock)
+
+    def report(self) -> str:
+        return f"Zone graph backend: {self.calls} calls, {self.states} symbolic states explored"
@@ -0,0 +1,32 @@
+# Shared setup of the tests: the modules of the tool import each other by their plain names from src, and the settings of
+# the tool are module-level state, which every test gets back unchanged.
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+try:
+    import ta_structs as ta
+except Exception:       # pyuppaal refuses to import on unsupported Python versions, the test modules skip themselves
+    ta = None
+
+
+@pytest.fixture(autouse=True)
+def tool_settings():
+    if ta is None:
+        yield
+        return
+    saved = (ta.get_backend(), ta.get_verdict_cache(), ta.get_unknown_policy(), ta.get_approximation_stages(),
+             ta.get_product_pruning(), ta.get_compact_contingency())
+    yield
+    (backend, verdict_cache, unknown_policy, approximation_stages, product_pruning, compact_contingency) = saved
+    ta.set_backend(backend)
+    ta.set_verdict_cache(verdict_cache)
+    ta.set_unknown_policy(unknown_policy)
+    ta.set_approximation_stages(approximation_stages)
+    ta.set_product_pruning(product_pruning)
+    ta.set_compact_contingency(compact_contingency)
@@ -0,0 +1,112 @@
+# Regression tests of cause computation on the examples of the thesis: every enumeration, encoding and parallelisation
+# computes the same causes. The zone graph backend decides all checks, such that no installation of Uppaal is needed.
+
+import contextlib
+import io
+import os
+
+import pytest
+
+try:
+    import ta_structs as ta
+    import cause_checker as cc
+    import zone_graph as zg
+except Exception as error:      # pyuppaal refuses to import on unsupported Python versions
+    pytest.skip("pyuppaal is not available: " + str(error), allow_module_level=True)
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Thesis_Examples")
+
+
+# Causes of the examples as sets of events, delay and timestamp events as (position, value) and action events as
+# (action, position), for minimal but-for causality and, where they differ, actual causality
+
+PUSH = ("push!", 1)
+
+CASES = [
+    ("Example_3_1_1", "TA.xml", "Trace.txt", [{("a!", 2)}, {(3, 1)}], None),
+    ("Example_3_1_2", "TA.xml", "Trace.txt", [{("a!", 2)}, {(3, 1)}], None),
+    ("Example_3_1_3", "TA.xml", "Trace.txt", [{("a!", 2), (2, 1)}], None),
+    ("Example_3_1_4", "TA.xml", "Trace.txt", [{("a!", 1), (2, 1)}], None),
+    ("Example_3_1_5", "TA.xml", "Trace.txt", [{(4, 1)}], None),
+    ("Example_3_1_6", "Coffee_TA.xml", "Trace.txt", [{PUSH}, {(2, 2)}, {(3, 3)}, {(4, 1)}], None),
+    ("Example_3_1_7", "Coffee_TA.xml", "Trace.txt", [{PUSH, ("push!", 2)}, {PUSH, (5, 3)}, {(2, 1)}, {(5, 2)}], [{PUSH}, {(2, 1)}, {(5, 2)}]),
+    ("Example_3_1_8", "Coffee_TA.xml", "Trace.txt", [{PUSH, ("push!", 2)}, {PUSH, (5, 3)}, {(2, 1)}, {(5, 2)}], [{PUSH}, {(2, 1)}, {(5, 2)}]),
+    ("Example_3_1_9", "TA.xml", "Trace.txt", [{(3, 1), (4, 3)}], [{(3, 1)}]),
+    ("Example_3_2_1", "Field_TA.xml", "Trace.txt", [{(1, 3), (3, 2)}], None),
+    ("Example_3_2_2", "Field_TA.xml", "Trace.txt", [{(6, 2)}], None),
+    ("Example_3_2_3", "TA1.xml", "Trace1_Delay.txt", [{(3, 1), (3, 2)}], None),
+    ("Example_3_2_3", "TA1.xml", "Trace1_Timestamp.txt", [{(3, 1)}], None),
+    ("Example_3_2_3", "TA2.xml", "Trace2_Delay.txt", [{(3, 1)}], None),
+    ("Example_3_2_3", "TA2.xml", "Trace2_Timestamp.txt", [{(3, 1), (5, 2)}], None),
+    ("Example_4_2_1", "TA.xml", "Trace.txt", [{("a!", 2), (2, 1)}, {(5, 2)}], None),
+    ("Fischer", "Fischer_TA.xml", "Fischer_Trace1.txt",
+     [{("tau_1!", 1), ("tau_1!", 2), ("tau_1!", 3)}, {("tau_1!", 1), ("tau_1!", 4), (1, 1), (8, 3)}, {("tau_1!", 2), ("tau_1!", 3), (1, 1), (8, 3)}], None),
+]
+
+# Options of cause computation: arguments of get_cause_computer and settings of ta_structs
+
+CONFIGS = {
+    "default": ({}, {}),
+    "marco": ({"enumeration": "marco"}, {}),
+    "compact": ({}, {"compact_contingency": True}),
+    "prune": ({}, {"product_pruning": True}),
+    "batch": ({"batch": True}, {}),
+    "workers": ({"workers": 2}, {}),
+}
+
+
+def events(cause) -> frozenset:
+    time_events = cause.timestamp_events if hasattr(cause, "timestamp_events") else cause.delay_events
+    return frozenset(time_events | cause.action_events)
+
+def compute(case: tuple, actual: bool, arguments: dict, settings: dict) -> set[frozenset]:
+    (example, system, trace, _, _) = case
+    ta.set_verdict_cache(None)
+    ta.set_backend(zg.ZoneGraphBackend())
+    ta.set_compact_contingency(settings.get("compact_contingency", False))
+    ta.set_product_pruning(settings.get("product_pruning", False))
+    computer = cc.get_cause_computer(os.path.join(EXAMPLES, example, system), os.path.join(EXAMPLES, example, trace), **arguments)
+    with contextlib.redirect_stdout(io.StringIO()):
+        causes = computer.compute_Cause(actual, False)
+    return {events(cause) for cause in causes}
+
+def expected(case: tuple, actual: bool) -> set[frozenset]:
+    (_, _, _, but_for, actual_causes) = case
+    return {frozenset(cause) for cause in (actual_causes if actual and actual_causes is not None else but_for)}
+
+
+@pytest.mark.parametrize("config", list(CONFIGS))
+@pytest.mark.parametrize("actual", [False, True], ids=["but-for", "actual"])
+@pytest.mark.parametrize("case", CASES, ids=[case[0] + "-" + case[2] for case in CASES])
+def test_computed_causes(case, actual, config):
+    (arguments, settings) = CONFIGS[config]
+    assert compute(case, actual, arguments, settings) == expected(case, actual)
+
+
+@pytest.mark.parametrize("max_size", [1, 2, 100])
+@pytest.mark.parametrize("enumeration", ["apriori", "marco"])
+def test_bounded_computation(enumeration, max_size):
+    case = CASES[6]
+    ta.set_verdict_cache(None)
+    ta.set_backend(zg.ZoneGraphBackend())
+    (example, system, trace, but_for, _) = case
+    computer = cc.get_cause_computer(os.path.join(EXAMPLES, example, system), os.path.join(EXAMPLES, example, trace), 1, False, enumeration)
+    with contextlib.redirect_stdout(io.StringIO()):
+        causes = {events(cause) for (cause, _) in computer.iter_causes(False, False, cc.Budget(max_size=max_size))}
+    assert causes == {frozenset(cause) for cause in but_for if len(cause) <= max_size}
+    # Sets of three events are explored unless the bound excludes them, which stops the computation early
+    assert computer.progress.stopped == (None if max_size > 2 else "maximal size of causes")
+
+
+def test_cause_checking():
+    ta.set_verdict_cache(None)
+    ta.set_backend(zg.ZoneGraphBackend())
+    directory = os.path.join(EXAMPLES, "Example_3_1_9")
+    results = []
+    for speculative in (False, True):
+        checker = cc.get_cause_checker(os.path.join(directory, "TA.xml"), os.path.join(directory, "Trace.txt"), os.path.join(directory, "Cause.txt"), 2 if speculative else 1, speculative)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results.append((checker.check_Min_But_For_Cause(), checker.check_Actual_Cause(), output.getvalue()))
+    assert results[0][:2] == (False, True)
+    assert results[0] == results[1]
@@ -0,0 +1,137 @@
+# Unit tests of the enumerators of minimal causes on monotone conditions given by their minimal satisfying sets, compared
+# with the minimal sets found by brute force.
+
+import itertools
+import random
+
+import pytest
+
+try:
+    import cause_lattice as cl
+except Exception as error:      # pyuppaal refuses to import on unsupported Python versions
+    pytest.skip("pyuppaal is not available: " + str(error), allow_module_level=True)
+
+
+def mask(events: tuple[int, ...]) -> int:
+    res = 0
+    for event in events:
+        res |= 1 << event
+    return res
+
+# Monotone condition satisfied by the supersets of the given sets, counting its checks
+class Condition:
+
+    def __init__(self, minimal: list[int]):
+        self.minimal = minimal
+        self.checks = 0
+
+    def __call__(self, candidate: int) -> bool:
+        self.checks += 1
+        return any(cl.is_subset(cause, candidate) for cause in self.minimal)
+
+def minimal_sets(condition: Condition, number_events: int, max_size: int | None = None) -> set[int]:
+    satisfying = [candidate for candidate in range(1 << number_events) if condition(candidate)]
+    res = {candidate for candidate in satisfying if not any(other != candidate and cl.is_subset(other, candidate) for other in satisfying)}
+    return {cause for cause in res if max_size is None or cl.size(cause) <= max_size}
+
+def random_conditions(count: int) -> list[tuple[int, Condition]]:
+    generator = random.Random(17)
+    res = []
+    for _ in range(count):
+        number_events = generator.randint(1, 7)
+        minimal = [mask(tuple(generator.sample(range(number_events), generator.randint(1, number_events)))) for _ in range(generator.randint(0, 4))]
+        res.append((number_events, Condition(minimal)))
+    return res
+
+CONDITIONS = random_conditions(60)
+
+def apriori(condition: Condition, number_events: int) -> set[int]:
+    enumerator = cl.AprioriEnumerator(number_events)
+    candidates = enumerator.next_level()
+    while len(candidates) > 0:
+        enumerator.add_verdicts(candidates, [condition(candidate) for candidate in candidates])
+        candidates = enumerator.next_level()
+    return set(enumerator.causes)
+
+
+def test_members_and_size():
+    assert cl.members(0b101001) == [0, 3, 5]
+    assert cl.size(0b101001) == 3
+    assert cl.is_subset(0b1001, 0b1101) and not cl.is_subset(0b1011, 0b1101)
+
+
+@pytest.mark.parametrize("number_events, condition", CONDITIONS)
+def test_apriori(number_events, condition):
+    assert apriori(condition, number_events) == minimal_sets(condition, number_events)
+
+
+def test_apriori_generates_each_set_once():
+    condition = Condition([mask((0, 1)), mask((2,))])
+    enumerator = cl.AprioriEnumerator(4)
+    generated = []
+    candidates = enumerator.next_level()
+    while len(candidates) > 0:
+        generated += candidates
+        enumerator.add_verdicts(candidates, [condition(candidate) for candidate in candidates])
+        candidates = enumerator.next_level()
+    assert len(generated) == len(set(generated))
+    assert not any(cl.is_subset(mask((2,)), candidate) for candidate in generated if candidate != mask((2,)))
+
+
+@pytest.mark.parametrize("number_events, condition", CONDITIONS)
+def test_quickxplain(number_events, condition):
+    everything = (1 << number_events) - 1
+    if not condition(everything):
+        return
+    cause = cl.quickxplain(condition, 0, list(range(number_events)))
+    assert cause in minimal_sets(condition, number_events)
+
+
+def test_quickxplain_without_candidates():
+    assert cl.quickxplain(Condition([0]), 0, []) == 0
+
+
+@pytest.mark.parametrize("number_events, condition", CONDITIONS)
+def test_marco(number_events, condition):
+    non_causes: list[int] = []
+    causes = list(cl.marco(cl.MonotoneOracle(condition), number_events, non_causes))
+    assert len(causes) == len(set(causes))
+    assert set(causes) == minimal_sets(condition, number_events)
+    # The maximal non-causes are the maximal sets containing no cause
+    violating = [candidate for candidate in range(1 << number_events) if not condition(candidate)]
+    maximal = {candidate for candidate in violating if not any(other != candidate and cl.is_subset(candidate, other) for other in violating)}
+    assert set(non_causes) == maximal
+
+
+@pytest.mark.parametrize("max_size", [1, 2, 3])
+@pytest.mark.parametrize("number_events, condition", CONDITIONS[:20])
+def test_bounded_marco(number_events, condition, max_size):
+    causes = list(cl.marco(cl.MonotoneOracle(condition), number_events, [], max_size))
+    assert set(causes) == minimal_sets(condition, number_events, max_size)
+
+
+def test_exploration_map():
+    exploration = cl.ExplorationMap(3)
+    exploration.block_up(mask((0,)))
+    exploration.block_down(mask((1, 2)))
+    assert exploration.seed() is None
+
+    bounded = cl.ExplorationMap(3, 1)
+    seeds = set()
+    seed = bounded.seed()
+    while seed is not None:
+        assert cl.size(seed) <= 1
+        seeds.add(seed)
+        bounded.block_down(seed)
+        seed = bounded.seed()
+    assert seeds == {mask((0,)), mask((1,)), mask((2,))}
+
+
+def test_monotone_oracle_infers_verdicts():
+    condition = Condition([mask((0,))])
+    oracle = cl.MonotoneOracle(condition)
+    masks = [mask(events) for size in range(4) for events in itertools.combinations(range(3), size)]
+    assert oracle.decide(masks) == [condition.minimal[0] & ~candidate == 0 for candidate in masks]
+    assert oracle.checked < len(masks)
+    checks = condition.checks
+    assert oracle(mask((0, 1, 2))) and condition.checks == checks
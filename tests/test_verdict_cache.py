@@ -0,0 +1,79 @@
+# Tests of the keys and the bookkeeping of the verdict cache: verdicts are only reused for the same model, queries,
+# verification options and backend (including the version of verifyta).
+
+import os
+import stat
+
+import pytest
+
+import verdict_cache as vc
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Thesis_Examples")
+
+
+def test_model_hash_covers_queries_options_and_backend():
+    key = vc.model_hash("<nta/>", ["E<> Proc.l"], "-o1", "verifyta 5.0")
+    assert key == vc.model_hash("<nta/>", [" E<> Proc.l "], " -o1", "verifyta 5.0")
+    assert key != vc.model_hash("<nta></nta>", ["E<> Proc.l"], "-o1", "verifyta 5.0")
+    assert key != vc.model_hash("<nta/>", ["A[] Proc.l"], "-o1", "verifyta 5.0")
+    assert key != vc.model_hash("<nta/>", ["E<> Proc.l"], None, "verifyta 5.0")
+    assert key != vc.model_hash("<nta/>", ["E<> Proc.l"], "-o1", "verifyta 5.1")
+    assert key != vc.model_hash("<nta/>", ["E<> Proc.l"], "-o1", "zones")
+
+
+def test_lru_eviction():
+    cache = vc.VerdictCache(max_size=2)
+    cache.put("a", True)
+    cache.put("b", False)
+    assert cache.get("a") is True
+    cache.put("c", True)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (True, True)
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_store_backs_cache(tmp_path):
+    store = vc.VerdictStore.in_directory(str(tmp_path))
+    vc.VerdictCache(store=store).put("a", False)
+    cache = vc.VerdictCache(store=vc.VerdictStore.in_directory(str(tmp_path)))
+    assert cache.get("a") is False
+    assert cache.get("b") is None
+
+    store.export_to(str(tmp_path / "export.sqlite"))
+    other = vc.VerdictStore(str(tmp_path / "other" / "verdicts.sqlite"))
+    assert other.import_from(str(tmp_path / "export.sqlite")) == 1
+    assert other.get("a") is False
+
+
+def test_journal_of_new_verdicts():
+    cache = vc.VerdictCache()
+    cache.put("a", True)
+    cache.keep_journal()
+    cache.put("b", False)
+    cache.get("a")
+    assert cache.take_journal() == [("b", False)]
+    cache.put("c", True)
+    assert cache.take_journal() == []
+
+
+def stand_in(tmp_path, name: str, version: str) -> str:
+    path = tmp_path / name
+    path.write_text("#!/bin/sh\necho \"UPPAAL " + version + "\"\n")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+@pytest.mark.skipif(os.name != "posix", reason="stand-ins for verifyta are shell scripts")
+def test_system_key_covers_verifyta_version(tmp_path):
+    try:
+        import pyuppaal as pyu
+        import ta_structs as ta
+    except Exception as error:      # pyuppaal refuses to import on unsupported Python versions
+        pytest.skip("pyuppaal is not available: " + str(error))
+
+    system = ta.System(pyu.UModel(os.path.join(EXAMPLES, "Example_3_1_1", "TA.xml")))
+    keys = []
+    for (name, version) in (("old", "5.0"), ("same", "5.0"), ("new", "5.1")):
+        ta.set_backend(ta.VerifytaBackend(executable=stand_in(tmp_path, name, version)))
+        keys.append(system.model_hash())
+    assert keys[0] == keys[1] != keys[2]
+    assert system.model_hash() != system.model_hash("-o1")
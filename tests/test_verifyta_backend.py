@@ -0,0 +1,77 @@
+# Tests of the verifyta backend with stand-ins for verifyta: shell scripts that accept the arguments of verifyta and print
+# a verdict, fail, run into the timeout or exceed the memory limit.
+
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+try:
+    import pyuppaal as pyu
+    import ta_structs as ta
+except Exception as error:      # pyuppaal refuses to import on unsupported Python versions
+    pytest.skip("pyuppaal is not available: " + str(error), allow_module_level=True)
+
+if os.name != "posix":
+    pytest.skip("stand-ins for verifyta are shell scripts", allow_module_level=True)
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Thesis_Examples")
+
+MIB = 1024 * 1024
+
+
+def stand_in(tmp_path, script: str) -> str:
+    path = tmp_path / "verifyta.sh"
+    path.write_text("#!/bin/sh\n" + script + "\n")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+def verify(executable: str, **limits) -> tuple[list[bool], ta.VerifytaBackend]:
+    ta.set_verdict_cache(None)
+    backend = ta.VerifytaBackend(executable=executable, **limits)
+    system = ta.System(pyu.UModel(os.path.join(EXAMPLES, "Example_3_1_1", "TA.xml")))
+    return backend.verify(system), backend
+
+
+@pytest.mark.parametrize("output, verdict", [(" -- Formula is satisfied.", True), (" -- Formula is NOT satisfied.", False)])
+def test_verdict(tmp_path, output, verdict):
+    (verdicts, backend) = verify(stand_in(tmp_path, 'echo "' + output + '"'), timeout=30, memory_limit=1024 * MIB)
+    assert verdicts == [verdict]
+    assert [invocation.outcome for invocation in backend.invocations] == ["verdict"]
+
+
+def test_error_exit(tmp_path):
+    executable = stand_in(tmp_path, 'echo "model.xml:12: [error] syntax error: unexpected T_ID." >&2\nexit 1')
+    with pytest.raises(Exception, match="verifyta failed"):
+        verify(executable, memory_limit=256 * MIB)
+
+
+def test_timeout(tmp_path):
+    start = time.monotonic()
+    with pytest.raises(ta.VerificationUnknown) as unknown:
+        verify(stand_in(tmp_path, "sleep 30"), timeout=0.5)
+    assert unknown.value.reason == "timeout"
+    assert time.monotonic() - start < 10
+
+
+def test_memory_limit(tmp_path):
+    # The stand-in waits before allocating, such that the limit holds even if it is only set after the start
+    script = 'exec "' + sys.executable + '" -c "import time; time.sleep(0.2); x = bytearray(2048 * 1024 * 1024); print(\' -- Formula is satisfied.\')"'
+    with pytest.raises(ta.VerificationUnknown) as unknown:
+        verify(stand_in(tmp_path, script), memory_limit=256 * MIB)
+    assert unknown.value.reason == "memory limit"
+
+
+def test_retry_policy(tmp_path):
+    ta.set_unknown_policy("retry")
+    ta.set_verdict_cache(None)
+    backend = ta.VerifytaBackend(executable=stand_in(tmp_path, "sleep 30"), timeout=0.3)
+    ta.set_backend(backend)
+    system = ta.System(pyu.UModel(os.path.join(EXAMPLES, "Example_3_1_1", "TA.xml")))
+    start = time.monotonic()
+    with pytest.raises(ta.VerificationUnknown):
+        system.verify()
+    assert len(backend.invocations) > 1
+    assert time.monotonic() - start < 20
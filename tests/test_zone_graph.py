@@ -0,0 +1,87 @@
+# Tests of the zone graph backend on small automata with known verdicts: a location Idle with an optional invariant and a
+# transition to a location Done with a guard. The untimed abstraction of cause_checker must never contradict them.
+
+import pytest
+
+try:
+    import pyuppaal as pyu
+    import ta_structs as ta
+    import cause_checker as cc
+    import zone_graph as zg
+except Exception as error:      # pyuppaal refuses to import on unsupported Python versions
+    pytest.skip("pyuppaal is not available: " + str(error), allow_module_level=True)
+
+
+MODEL = """<?xml version="1.0" encoding="utf-8"?>
+<nta>
+	<declaration>clock x;</declaration>
+	<template>
+		<name>Template</name>
+		<location id="id0" x="0" y="0">
+			<name x="0" y="-20">Idle</name>{invariant}
+		</location>
+		<location id="id1" x="200" y="0">
+			<name x="200" y="-20">Done</name>
+		</location>
+		<init ref="id0"/>
+		<transition>
+			<source ref="id0"/>
+			<target ref="id1"/>
+			<label kind="guard" x="100" y="-20">{guard}</label>
+		</transition>
+	</template>
+	<system>Proc_Template = Template();
+system Proc_Template;</system>
+	<queries>
+		<query>
+			<formula>{query}</formula>
+			<comment></comment>
+		</query>
+	</queries>
+</nta>
+"""
+
+# (invariant of Idle, guard to Done, query, verdict). Location names must not occur elsewhere in the queries, since
+# ta_structs.add_spaces separates every occurrence of a location name.
+CASES = [
+    (None, "x &gt;= 3", "E&lt;&gt; Proc_Template.Done", True),
+    (None, "x &gt;= 3 &amp;&amp; x &lt; 2", "E&lt;&gt; Proc_Template.Done", False),
+    ("x &lt;= 5", "x &gt;= 7", "E&lt;&gt; Proc_Template.Done", False),
+    (None, "x &gt;= 3 &amp;&amp; x &lt; 2", "A[] not Proc_Template.Done", True),
+    (None, "x &gt;= 3", "A[] not Proc_Template.Done", False),
+    ("x &lt;= 5", "x &gt;= 3", "A&lt;&gt; Proc_Template.Done", True),
+    (None, "x &gt;= 3", "A&lt;&gt; Proc_Template.Done", False),
+    (None, "x &gt;= 3", "E[] not Proc_Template.Done", True),
+    ("x &lt;= 5", "x &gt;= 3", "E[] not Proc_Template.Done", False),
+    ("x &lt;= 5", "x &gt;= 7", "E[] not Proc_Template.Done", True),
+    ("x &lt;= 5", "x &gt;= 7", "A&lt;&gt; Proc_Template.Done", False),
+    (None, "x &gt;= 3", "E[] Proc_Template.Idle or Proc_Template.Done", True),
+]
+
+def system(tmp_path, invariant: str | None, guard: str, query: str) -> ta.System:
+    label = "" if invariant is None else '\n\t\t\t<label kind="invariant" x="0" y="20">' + invariant + "</label>"
+    path = tmp_path / "model.xml"
+    path.write_text(MODEL.replace("{invariant}", label).replace("{guard}", guard).replace("{query}", query))
+    return ta.System(pyu.UModel(str(path)))
+
+
+@pytest.mark.parametrize("invariant, guard, query, verdict", CASES)
+def test_zone_graph_verdicts(tmp_path, invariant, guard, query, verdict):
+    assert zg.ZoneGraphBackend().verify(system(tmp_path, invariant, guard, query)) == [verdict]
+
+
+@pytest.mark.parametrize("invariant, guard, query, verdict", CASES)
+def test_untimed_abstraction_is_sound(tmp_path, invariant, guard, query, verdict):
+    assert cc.untimed_verdict(system(tmp_path, invariant, guard, query)) in (None, verdict)
+
+
+def test_untimed_abstraction_decides_location_queries(tmp_path):
+    assert cc.untimed_verdict(system(tmp_path, None, "x &gt;= 3", "A[] Proc_Template.Idle or Proc_Template.Done")) is True
+    assert cc.untimed_verdict(system(tmp_path, None, "x &gt;= 3", "E&lt;&gt; Proc_Template.Idle and Proc_Template.Done")) is False
+    assert cc.untimed_verdict(system(tmp_path, None, "x &gt;= 3", "E&lt;&gt; Proc_Template.Done")) is None
+
+
+def test_timeout_gives_no_verdict(tmp_path):
+    backend = zg.ZoneGraphBackend(timeout=0.0)
+    with pytest.raises(ta.VerificationUnknown):
+        backend.verify(system(tmp_path, None, "x &gt;= 3", "E&lt;&gt; Proc_Template.Done"))